@@ -0,0 +1,59 @@
+"""
+Enqueue pipeline tasks by name.
+
+The API process only needs the Celery app to publish a message; importing
+api.tasks would drag in torch, ultralytics, transformers and UMAP.
+
+A job is a chain: the inference task runs the model stages and saves their
+outputs next to the job (intermediates.npz), then hands a reference to them
+to the render task. CELERY_TASK_ROUTES sends each to its own queue.
+
+Videos longer than PIPELINE_SEGMENT_SECONDS are split into overlapping
+segments (processingVideo.pipeline.segments):
+
+    segment tasks (inference, in parallel)
+      -> stitch task (track ids and teams joined over the overlaps)
+      -> render segment tasks (in parallel)
+      -> concat task (videos joined, data products, job finalized)
+"""
+from celery import chain, chord, group
+from django.conf import settings
+
+from config.celery import app
+from processingVideo.pipeline.segments import plan_segments
+
+PROCESS_VIDEO_TASK = "api.tasks.process_video_task"
+INFERENCE_TASK = "api.tasks.run_inference_task"
+RENDER_TASK = "api.tasks.run_render_task"
+SEGMENT_TASK = "api.tasks.run_segment_task"
+STITCH_TASK = "api.tasks.run_stitch_task"
+RENDER_SEGMENT_TASK = "api.tasks.run_render_segment_task"
+CONCAT_TASK = "api.tasks.run_concat_task"
+
+
+def enqueue_process_video(job_id: int, requested_outputs: list[str], n_frames: int = None, fps: float = None):
+    segments = [(0, None)]
+    if n_frames and fps:
+        segments = plan_segments(
+            n_frames,
+            max(1, int(settings.PIPELINE_SEGMENT_SECONDS * fps)),
+            int(settings.PIPELINE_SEGMENT_OVERLAP_SECONDS * fps),
+        )
+
+    if len(segments) == 1:
+        return chain(
+            app.signature(INFERENCE_TASK, args=[job_id, requested_outputs]),
+            app.signature(RENDER_TASK),
+        ).apply_async()
+
+    return chain(
+        chord(
+            [
+                app.signature(SEGMENT_TASK, args=[job_id, requested_outputs, i, list(frame_range)])
+                for i, frame_range in enumerate(segments)
+            ],
+            app.signature(STITCH_TASK, args=[job_id, requested_outputs]),
+        ),
+        group([app.signature(RENDER_SEGMENT_TASK, args=[i]) for i in range(len(segments))]),
+        app.signature(CONCAT_TASK),
+    ).apply_async()
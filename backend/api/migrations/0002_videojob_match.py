@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videojob',
+            name='match',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.7 on 2026-10-18 10:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_videojob_match'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videojob',
+            name='metrics',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
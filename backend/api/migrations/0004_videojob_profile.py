@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 01:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_videojob_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videojob',
+            name='profile',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -13,6 +13,12 @@ class VideoJob(models.Model):
     original = models.FileField(upload_to="uploads/")
     outputs = models.JSONField(default=dict, blank=True)
     error = models.TextField(blank=True, default="")
+    # clips uploaded with the same match key share one fitted team model
+    match = models.CharField(max_length=64, blank=True, default="", db_index=True)
+    # run statistics reported by the pipeline (e.g. crops skipped by team assignment)
+    metrics = models.JSONField(default=dict, blank=True)
+    # run under the sampling profiler (?profile=1), reports in outputs/<id>/profile/
+    profile = models.BooleanField(default=False)
 
     def __str__(self):
         return f"VideoJob #{self.id} ({self.status})"
\ No newline at end of file
@@ -4,5 +4,5 @@ from .models import VideoJob
 class VideoJobSerializer(serializers.ModelSerializer):
     class Meta:
         model = VideoJob
-        fields = ["id","status","original","outputs","error","created_at"]
-        read_only_fields = ["status","outputs","error","created_at"]
+        fields = ["id","status","original","outputs","error","created_at","match","metrics","profile"]
+        read_only_fields = ["status","outputs","error","created_at","match","metrics","profile"]
\ No newline at end of file
@@ -1,24 +1,33 @@
 import os
-import torch
 import logging
+from contextlib import contextmanager
 from celery import shared_task
 from pathlib import Path
 from django.conf import settings
 from django.db import transaction
 from .models import VideoJob
-
-# === your pipeline modules ===
-from processingVideo.utils import read_video, save_video
-from processingVideo.tracker import Tracker
-from processingVideo.team_assigner import TeamAssigner
-from processingVideo.pitch import PitchAnnotator, SoccerPitchConfiguration
+from .dispatch import (
+    CONCAT_TASK, INFERENCE_TASK, PROCESS_VIDEO_TASK, RENDER_SEGMENT_TASK, RENDER_TASK, SEGMENT_TASK, STITCH_TASK,
+)
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
+# NOTE: torch and the processingVideo pipeline are imported inside the task so
+# that importing this module (Celery autodiscovery, Django checks) stays cheap.
+
 logger = logging.getLogger(__name__)
 
-# Detect Device
-DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+
+def get_device() -> str:
+    import torch
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+def render_workers() -> int:
+    # 0 = auto: the fused render stage runs last, on its own, so it gets every core
+    if settings.PIPELINE_RENDER_WORKERS > 0:
+        return settings.PIPELINE_RENDER_WORKERS
+    return settings.PIPELINE_CPU_THREADS or os.cpu_count() or 1
+
 
 def send_status(job_id, status, progress, outputs=None):
     channel_layer = get_channel_layer()
@@ -37,119 +46,423 @@ def verify_file_exists(file_path):
         raise RuntimeError(f"FILE SYSTEM ERROR: File was not created at {file_path}. Check permissions or OpenCV codec.")
     if p.stat().st_size == 0:
         raise RuntimeError(f"FILE SYSTEM ERROR: File at {file_path} is empty (0 bytes).")
-    print(f"DEBUG: Successfully verified file: {file_path} ({p.stat().st_size} bytes)")
+    logger.debug("verified file %s (%d bytes)", file_path, p.stat().st_size)
 
-@shared_task
-def process_video_task(job_id: int, requested_outputs: list[str]):
-    try:
-        job = VideoJob.objects.get(id=job_id)
-    except VideoJob.DoesNotExist:
-        return f"Job {job_id} not found"
+class JobRun:
+    """
+    What one task of a job needs: its output directory, the pipeline inputs
+    (with the intermediates saved by earlier tasks of the job) and the cache.
+    Tasks of one segment of a long video pass its `frame_range` and work in
+    outputs/<id>/segments/<segment>.
+    """
+    def __init__(self, job: VideoJob, segment: int = None, frame_range=None, intermediates_path=None):
+        from processingVideo.pitch import SoccerPitchConfiguration
+        from processingVideo.pipeline import StageCache, build_video_pipeline, load_artifacts
+        from processingVideo.utils.instrument import Recorder
+        from processingVideo.pipeline.profiler import SamplingProfiler
 
-    print(f"PyTorch device configured for Celery worker: {DEVICE}")
+        self.job = job
 
-    try:
         # 1. Initialization & Directory Creation
-        CONFIG = SoccerPitchConfiguration()
-        player_model_path = "processingVideo/models/player_detection.pt"
-        field_model_path  = "processingVideo/models/field_detection.pt"
-        
         # Ensure absolute pathing for Docker Volume
         # We use Path(settings.MEDIA_ROOT).resolve() to ensure we aren't using relative paths
-        base_media = Path(settings.MEDIA_ROOT).resolve()
-        job_output_dir = base_media / "outputs" / str(job.id)
-        
-        print(f"DEBUG: MEDIA_ROOT is {base_media}")
-        print(f"DEBUG: Attempting to create directory: {job_output_dir}")
-        
-        job_output_dir.mkdir(parents=True, exist_ok=True)
-        
+        self.base_media = Path(settings.MEDIA_ROOT).resolve()
+        self.job_dir = self.base_media / "outputs" / str(job.id)
+        self.output_dir = self.job_dir if segment is None else self.job_dir / "segments" / str(segment)
+
+        logger.debug("job %s: MEDIA_ROOT is %s, output directory %s", job.id, self.base_media, self.output_dir)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+
         # Verification of Directory
-        if not job_output_dir.exists():
-            raise RuntimeError(f"Could not create or find directory: {job_output_dir}")
-        
+        if not self.output_dir.exists():
+            raise RuntimeError(f"Could not create or find directory: {self.output_dir}")
+
+        # clips of the same match share one team model
+        team_model_path = None
+        team_model_update = settings.TEAM_MODEL_INCREMENTAL_UPDATE
+        if job.match:
+            team_model_path = self.base_media / "matches" / job.match / "team_model.pkl"
+        if segment is not None:
+            # segments share one model (the match's, else the job's): the first one
+            # fits it (TeamAssigner serialises the fit), the others load it, none refines it
+            team_model_update = False
+            if team_model_path is None:
+                team_model_path = self.job_dir / "team_model.pkl"
+
+        device = get_device()
+        logger.debug("job %s: PyTorch device %s", job.id, device)
+
+        self.artifacts = {
+            "video_path": job.original.path,
+            "frame_range": tuple(frame_range) if frame_range is not None else None,
+            "output_dir": self.output_dir,
+            "config": SoccerPitchConfiguration(),
+            "device": device,
+            "player_model_path": "processingVideo/models/player_detection.pt",
+            "field_model_path": "processingVideo/models/field_detection.pt",
+            "team_model_path": team_model_path,
+            "team_model_update": team_model_update,
+            "render_workers": render_workers(),
+            "render_incremental": settings.PIPELINE_RENDER_INCREMENTAL,
+        }
+
+        # tracks, team labels and keypoints of an earlier task or run of this job
+        self.intermediates_path = Path(intermediates_path or self.output_dir / "intermediates.npz")
+        self.saved = {}
+        if self.intermediates_path.exists():
+            try:
+                self.saved = load_artifacts(self.intermediates_path)
+            except Exception as e:
+                logger.warning("job %s: ignoring unreadable intermediates %s (%s)", job.id, self.intermediates_path, e)
+        self.artifacts.update(self.saved)
+
+        # model outputs of clips seen before (same file, same weights) are reused
+        self.cache = None
+        if settings.PIPELINE_CACHE_MAX_BYTES > 0:
+            self.cache = StageCache(self.base_media / "cache" / "stages", settings.PIPELINE_CACHE_MAX_BYTES)
+
+        self.pipeline = build_video_pipeline()
+        # per-stage time, throughput and memory of this task (metrics["timing"])
+        self.recorder = Recorder()
+        # profiled jobs: call tree and flame graph stacks of this task in outputs/<id>/profile/
+        self.profiler = None
+        if job.profile or settings.PIPELINE_PROFILE:
+            self.profiler = SamplingProfiler(settings.PIPELINE_PROFILE_INTERVAL_MS / 1000.0)
+
+    def run(self, wanted, progress_from: int, progress_to: int) -> dict:
+        def on_stage_done(stage, done, total):
+            logger.debug("job %s: stage %s done (%d/%d)", self.job.id, stage.name, done, total)
+            send_status(self.job.id, "processing", progress_from + int((progress_to - progress_from) * done / total))
+
+        with self.measured():
+            self.pipeline.run(
+                wanted, self.artifacts,
+                on_stage_done=on_stage_done,
+                max_parallel=settings.PIPELINE_MAX_PARALLEL_STAGES,
+                cpu_threads=settings.PIPELINE_CPU_THREADS or None,
+                cache=self.cache,
+            )
+        return self.artifacts
+
+    @contextmanager
+    def measured(self):
+        """Records the timing of the block, and samples it when the job is profiled."""
+        from processingVideo.utils.instrument import recording
+        from processingVideo.pipeline.profiler import profiling
+
+        with recording(self.recorder):
+            if self.profiler is None:
+                yield
+            else:
+                with profiling(self.profiler):
+                    yield
+
+    def report(self, task: str) -> dict:
+        """Timing of this task (for metrics["timing"]); profiled jobs also get its profile written."""
+        if self.profiler is not None:
+            self.profiler.write_report(self.job_dir / "profile", task.replace(" ", "-"))
+        return {"task": task, **self.recorder.summary()}
+
+    def relative(self, path) -> str:
+        return Path(path).relative_to(self.base_media).as_posix()
+
+    def save_intermediates(self) -> None:
+        """Keeps what this task computed for the next task, or products added later."""
+        from processingVideo.pipeline import INTERMEDIATES, save_artifacts
+
+        kept = {name: self.artifacts[name] for name in INTERMEDIATES if name in self.artifacts}
+        if kept.keys() - self.saved.keys():
+            self.saved = {**self.saved, **kept}
+            save_artifacts(self.intermediates_path, self.saved)
+
+
+def fail_job(job: VideoJob, e: Exception, adding: bool) -> None:
+    """Products added to a finished job fail alone: the earlier ones stay available."""
+    logger.error("pipeline task of job %s failed: %s", job.id, e, exc_info=e)
+    job.status = "done" if adding else "failed"
+    if adding:
+        send_status(job.id, "done", 100, outputs=job.outputs)
+    else:
+        send_status(job.id, "failed", 0)
+    job.error = str(e)
+    job.save(update_fields=["status", "error"])
+
+
+def finish_job(job: VideoJob, run: JobRun, products, adding: bool, ref: dict, timings, extra_metrics=None) -> None:
+    """Records the products (paths in run.artifacts), the metrics and the done status."""
+    from processingVideo.utils.instrument import merge_summaries
+    from processingVideo.pipeline.profiler import merge_reports
+
+    artifacts = run.artifacts
+    metrics = dict(job.metrics or {}) if adding else {}
+    if "team_stats" in artifacts:
+        metrics["team_assignment"] = artifacts["team_stats"]
+    if artifacts.get("render_stats"):
+        metrics["render"] = artifacts["render_stats"]
+    if run.cache is not None:
+        stats = dict(run.cache.stats)
+        for name, value in (ref.get("cache") or {}).items():
+            stats[name] = stats.get(name, 0) + value
+        metrics["cache"] = stats
+    metrics["timing"] = merge_summaries(timings)
+    if run.profiler is not None:
+        profile_dir = run.job_dir / "profile"
+        metrics["profile"] = {
+            **merge_reports(profile_dir),
+            "files": sorted(run.relative(path) for path in profile_dir.iterdir()),
+        }
+    else:
+        metrics.pop("profile", None)  # of an earlier, profiled run
+    metrics.update(extra_metrics or {})
+
+    # 3. Collect Requested Outputs
+    # Logic: Save using ABSOLUTE path, store using RELATIVE path
+    outputs_map: dict[str, str] = dict(job.outputs or {})
+    for product in products:
+        abs_path = Path(artifacts[product])
+        verify_file_exists(abs_path) # Verification step
+        outputs_map[product] = run.relative(abs_path)
+
+    if not outputs_map:
+        raise RuntimeError("No valid outputs requested/produced")
+
+    # 4. Finalize Job
+    with transaction.atomic():
+        job.outputs = outputs_map
+        job.metrics = metrics
+        job.status = "done"
+        job.error = ""
+        job.save(update_fields=["outputs", "metrics", "status", "error"])
+
+    # Notify via Websocket
+    send_status(job.id, "done", 100, outputs=outputs_map)
+
+
+def sum_cache_stats(refs):
+    total = {}
+    for ref in refs:
+        for name, value in (ref.get("cache") or {}).items():
+            total[name] = total.get(name, 0) + value
+    return total or None
+
+
+def requested_products(requested_outputs):
+    from processingVideo.pipeline import PRODUCTS
+    return [p for p in requested_outputs if p in PRODUCTS]
+
+
+@shared_task(name=INFERENCE_TASK)
+def run_inference_task(job_id: int, requested_outputs: list[str]):
+    """
+    First task of a job: the model stages the requested products depend on.
+    Returns a reference to their saved outputs for run_render_task.
+    """
+    try:
+        job = VideoJob.objects.get(id=job_id)
+    except VideoJob.DoesNotExist:
+        return None
+
+    adding = bool(job.outputs)
+    try:
+        run = JobRun(job)
         send_status(job_id, "processing", 10)
 
-        # 2. Reading Video
-        video_frames = read_video(job.original.path)
-        send_status(job_id, "processing", 20)
+        # 2. Run only the model stages the requested products depend on
+        #    (e.g. pitch_edges skips tracking and team assignment entirely)
+        products = requested_products(requested_outputs)
+        handover = run.pipeline.phase_outputs(products, run.artifacts.keys(), "inference")
+        if handover:
+            run.run(handover, 10, 50)
+        run.save_intermediates()
+    except Exception as e:
+        fail_job(job, e, adding)
+        raise e
+
+    return {
+        "job_id": job_id,
+        "products": products,
+        "intermediates": run.relative(run.intermediates_path),
+        "cache": dict(run.cache.stats) if run.cache is not None else None,
+        "timings": [run.report("inference")],
+    }
+
+
+@shared_task(name=RENDER_TASK)
+def run_render_task(ref: dict):
+    """
+    Second task of a job: renders and data products from the intermediates
+    the inference task saved (`ref`), then finalizes the job.
+    """
+    if ref is None:
+        return "Job not found"
+    job_id = ref["job_id"]
+    try:
+        job = VideoJob.objects.get(id=job_id)
+    except VideoJob.DoesNotExist:
+        return f"Job {job_id} not found"
+
+    adding = bool(job.outputs)
+    run = None
+    try:
+        run = JobRun(job)
+        products = ref["products"]
+        run.run(products, 50, 90)
+        run.save_intermediates()
+
+        finish_job(job, run, products, adding, ref, ref.get("timings", []) + [run.report("render")])
+
+    except Exception as e:
+        fail_job(job, e, adding)
+        raise e
+
+    finally:
+        # decoded frames shared with the render workers, if any
+        if run is not None:
+            (run.output_dir / "frames.npy").unlink(missing_ok=True)
+
+
+@shared_task(name=PROCESS_VIDEO_TASK)
+def process_video_task(job_id: int, requested_outputs: list[str]):
+    """Both tasks of a job in one worker (messages queued before the split)."""
+    return run_render_task(run_inference_task(job_id, requested_outputs))
+
+
+# --- long videos, in overlapping segments (see api.dispatch) ------------------
+
+@shared_task(name=SEGMENT_TASK)
+def run_segment_task(job_id: int, requested_outputs: list[str], index: int, frame_range):
+    """Model stages of one segment; its outputs are kept in the segment's directory."""
+    try:
+        job = VideoJob.objects.get(id=job_id)
+    except VideoJob.DoesNotExist:
+        return None
+    adding = bool(job.outputs)
+    try:
+        run = JobRun(job, segment=index, frame_range=frame_range)
+        products = requested_products(requested_outputs)
+        handover = run.pipeline.phase_outputs(products, run.artifacts.keys(), "inference")
+        if handover:
+            run.run(handover, 10, 50)
+        run.save_intermediates()
+    except Exception as e:
+        fail_job(job, e, adding)
+        raise e
+
+    return {
+        "job_id": job_id,
+        "index": index,
+        "start": frame_range[0],
+        "intermediates": run.relative(run.intermediates_path),
+        "cache": dict(run.cache.stats) if run.cache is not None else None,
+        "timings": [run.report(f"segment {index}")],
+    }
+
 
-        # 3. Tracking
-        tracker = Tracker(player_model_path)
-        tracks = tracker.get_object_tracks(video_frames)
-        tracker.add_position_to_track(tracks)
-        send_status(job_id, "processing", 40)
+@shared_task(name=STITCH_TASK)
+def run_stitch_task(refs: list, job_id: int, requested_outputs: list[str]):
+    """Joins the segments' tracks (ids, teams), possession and keypoints into the job's intermediates."""
+    from processingVideo.pipeline import load_artifacts, save_artifacts
+    from processingVideo.utils.instrument import Recorder, recording, span
+    from processingVideo.pipeline.segments import stitch_segments
 
-        # 4. Team Assignment
-        team_assigner = TeamAssigner(device=DEVICE)
-        team_assigner.assign_teams(tracks, video_frames)
+    # a segment of a deleted job hands over None
+    if any(ref is None for ref in refs):
+        return None
+    try:
+        job = VideoJob.objects.get(id=job_id)
+    except VideoJob.DoesNotExist:
+        return None
+    adding = bool(job.outputs)
+    try:
         send_status(job_id, "processing", 50)
+        refs = sorted(refs, key=lambda ref: ref["index"])
+        base_media = Path(settings.MEDIA_ROOT).resolve()
+        recorder = Recorder()
+        with recording(recorder), span("stitch", items=len(refs)):
+            parts = [(ref["start"], load_artifacts(base_media / ref["intermediates"])) for ref in refs]
+            intermediates, cuts, stats = stitch_segments(parts)
+            save_artifacts(base_media / "outputs" / str(job_id) / "intermediates.npz", intermediates)
+    except Exception as e:
+        fail_job(job, e, adding)
+        raise e
+
+    return {
+        "job_id": job_id,
+        "products": requested_products(requested_outputs),
+        "cuts": cuts,
+        "segments": stats,
+        "cache": sum_cache_stats(refs),
+        "timings": [t for ref in refs for t in ref["timings"]] + [{"task": "stitch", **recorder.summary()}],
+    }
 
-        # 5. Pitch Analysis
-        pitch_ann = PitchAnnotator(CONFIG=CONFIG, model_path=field_model_path)
-        pitch_results = pitch_ann.annotate_video_batched(video_frames=video_frames, batch_size=8)
-        send_status(job_id, "processing", 70)
-
-        outputs_map: dict[str, str] = {}
-
-        # 6. Generate Requested Outputs
-        # Logic: Save using ABSOLUTE path, store using RELATIVE path
-        
-        if "detections" in requested_outputs:
-            det_frames = tracker.draw_annotations(video_frames, tracks)
-            rel_path = f"outputs/{job.id}/detections.mp4"
-            abs_path = job_output_dir / "detections.mp4"
-            save_video(det_frames, str(abs_path))
-            verify_file_exists(abs_path) # Verification step
-            outputs_map["detections"] = rel_path
-
-        if "pitch_edges" in requested_outputs:
-            pe_frames = [pitch_ann.annotate_frame_from_result(f, r) for f, r in zip(video_frames, pitch_results)]
-            rel_path = f"outputs/{job.id}/pitch_edges.mp4"
-            abs_path = job_output_dir / "pitch_edges.mp4"
-            save_video(pe_frames, str(abs_path))
-            verify_file_exists(abs_path)
-            outputs_map["pitch_edges"] = rel_path
-
-        if "tactical_board" in requested_outputs:
-            tb_frames = [
-                pitch_ann.annotate_tactical_board_from_result(f, tracks, i, CONFIG, r, kp_thresh=0.5)
-                for i, (f, r) in enumerate(zip(video_frames, pitch_results))
-            ]
-            rel_path = f"outputs/{job.id}/tactical_board.mp4"
-            abs_path = job_output_dir / "tactical_board.mp4"
-            save_video(tb_frames, str(abs_path))
-            verify_file_exists(abs_path)
-            outputs_map["tactical_board"] = rel_path
-
-        if "voronoi" in requested_outputs:
-            vb_frames = [
-                pitch_ann.annotate_voronoi_from_result(f, tracks, i, CONFIG, r, kp_thresh=0.5, vor_step=3)
-                for i, (f, r) in enumerate(zip(video_frames, pitch_results))
-            ]
-            rel_path = f"outputs/{job.id}/voronoi.mp4"
-            abs_path = job_output_dir / "voronoi.mp4"
-            save_video(vb_frames, str(abs_path))
-            verify_file_exists(abs_path)
-            outputs_map["voronoi"] = rel_path
-
-        if not outputs_map:
-            raise RuntimeError("No valid outputs requested/produced")
-
-        # 7. Finalize Job
-        with transaction.atomic():
-            job.outputs = outputs_map
-            job.status = "done"
-            job.error = ""
-            job.save(update_fields=["outputs", "status", "error"])
-
-        # Notify via Websocket
-        send_status(job_id, "done", 100, outputs=outputs_map)
 
+@shared_task(name=RENDER_SEGMENT_TASK)
+def run_render_segment_task(ref: dict, index: int):
+    """Videos of one segment's frames from the stitched intermediates."""
+    from processingVideo.pipeline import VIDEO_PRODUCTS
+
+    if ref is None:
+        return None
+    try:
+        job = VideoJob.objects.get(id=ref["job_id"])
+    except VideoJob.DoesNotExist:
+        return None
+    adding = bool(job.outputs)
+    run = None
+    try:
+        run = JobRun(
+            job, segment=index, frame_range=ref["cuts"][index],
+            intermediates_path=Path(settings.MEDIA_ROOT).resolve() / "outputs" / str(job.id) / "intermediates.npz",
+        )
+        videos = [p for p in ref["products"] if p in VIDEO_PRODUCTS]
+        if videos:
+            run.run(videos, 50, 90)
+        return {
+            **ref,
+            "index": index,
+            "videos": {p: run.relative(run.artifacts[p]) for p in videos},
+            "render_timings": [run.report(f"render {index}")],
+        }
+    except Exception as e:
+        fail_job(job, e, adding)
+        raise e
+    finally:
+        if run is not None:
+            (run.output_dir / "frames.npy").unlink(missing_ok=True)
+
+
+@shared_task(name=CONCAT_TASK)
+def run_concat_task(refs: list):
+    """Joins the segment videos, computes the data products over the whole match and finalizes the job."""
+    from processingVideo.pipeline import DATA_PRODUCTS
+    from processingVideo.utils.instrument import span
+    from processingVideo.pipeline.segments import concat_videos
+
+    if not refs or any(ref is None for ref in refs):
+        return "Job not found"
+    refs = sorted(refs, key=lambda ref: ref["index"])
+    ref = refs[0]
+    try:
+        job = VideoJob.objects.get(id=ref["job_id"])
+    except VideoJob.DoesNotExist:
+        return f"Job {ref['job_id']} not found"
+    adding = bool(job.outputs)
+    try:
+        run = JobRun(job)
+        products = ref["products"]
+        with run.measured(), span("concat"):
+            for product in ref["videos"]:
+                with span(product):
+                    run.artifacts[product] = concat_videos(
+                        [run.base_media / r["videos"][product] for r in refs], run.output_dir / f"{product}.mp4",
+                    )
+        data = [p for p in products if p in DATA_PRODUCTS]
+        if data:
+            run.run(data, 90, 95)
+        run.save_intermediates()
+        timings = ref["timings"] + [t for r in refs for t in r["render_timings"]] + [run.report("concat")]
+        finish_job(job, run, products, adding, ref, timings, extra_metrics={"segments": ref["segments"]})
     except Exception as e:
-        print(f"CRITICAL ERROR in process_video_task: {e}")
-        send_status(job_id, "failed", 0)
-        job.status = "failed"
-        job.error = str(e)
-        job.save(update_fields=["status", "error"])
-        raise e
\ No newline at end of file
+        fail_job(job, e, adding)
+        raise e
@@ -4,7 +4,7 @@ Action: Upload a valid 10-second video.
 Expect: Success (201), Job saved in DB, and AI worker started.
 
 test_upload_video_too_long:
-Action: Upload a 40-second video (Limit is 30s).
+Action: Upload a video 10 seconds longer than MAX_VIDEO_SECONDS.
 Expect: Rejection (400 Error) and NO data saved to DB.
 
 test_upload_video_missing_file:
@@ -14,11 +14,123 @@ Expect: Rejection (400 Error) saying "file required".
 test_list_and_retrieve:
 Action: Request the list of jobs and a specific job ID.
 Expect: The server returns the correct data (200 OK).
+
+test_upload_video_with_match / test_upload_video_invalid_match:
+Action: Upload with ?match=<key> (valid and path-like).
+Expect: The key is stored on the job, or the upload is rejected (400).
+
+test_pitch_control / test_pitch_control_not_produced:
+Action: Request the pitch control numbers of a finished job (with ?every=2).
+Expect: Per-frame lists with null for unknown frames, or 404 without the product.
+
+test_physical_metrics:
+Action: Request the physical metrics of a finished job.
+Expect: The stored per-player metrics (200 OK).
+
+test_heatmap:
+Action: Request a team and a track heatmap of a finished job, and an unknown track.
+Expect: PNG images (200 OK), 404 for the unknown track, 400 without team/track.
+
+test_pressure:
+Action: Request the pressing / marking numbers of a finished job.
+Expect: Integer columns as stored, null for unknown distances.
+
+test_events:
+Action: Request the possession spells and events of a finished job.
+Expect: One row per spell / event, kinds by name, ball travel in metres.
+
+test_add_products:
+Action: Add products to a finished job, to a running one, and ones it already has.
+Expect: Only the missing products are queued (202), 409 while running, 200 with nothing queued.
+
+test_add_products_unreadable_video:
+Action: Add products to a finished job whose video can no longer be probed.
+Expect: A warning logged and 400; nothing queued (no unsegmented run of a long video), the job stays done.
+
+test_pipeline_chain_eager:
+Action: Run the inference -> render chain of a profiled job eagerly (in-memory broker) with stub stages.
+Expect: Each task routed to its queue, only references handed over, the job done with its outputs,
+per-stage timings of both tasks served by the metrics action, and a profile report per task.
+
+test_long_video_segments_eager:
+Action: Run a 20-frame video as two overlapping segments whose tracker ids and team labels differ.
+Expect: Ids and teams stitched over the overlap, the segment videos joined, the job done.
+
+test_long_video_detections_only_eager:
+Action: Run the same video in segments for detections only (no pitch keypoints kept).
+Expect: The tracks stitched without keypoints, all frames joined, the job done.
+
+AnalyticsTests.test_physical_metrics_constant_run:
+Action: Compute physical metrics of a player running 8 m/s for 2 s and one standing still with a glitch.
+Expect: 16 m, one sprint and 28.8 km/h top speed; the glitch dropped, so 0 m for the other.
+With the default smoothing and a break in the track: the exact distance, no acceleration at the segment ends.
+
+AnalyticsTests.test_heatmaps_accumulate_and_merge:
+Action: Accumulate 2 s of two players (one with unknown frames) in blocks, merge two jobs, save and load.
+Expect: Seconds in the players' cells per team and track, unknown rows left out, sums after merging, a lossless round trip.
+
+AnalyticsTests.test_pressure_metrics:
+Action: Index four frames of two players per team and compute pressure with the tracker's possessors.
+Expect: FrameIndex finds the nearest player and opponents; the carrier is the possessor even where another
+player is closer to the ball; pressure, blocked / open lanes, players near the ball and marking in metres.
+
+AnalyticsTests.test_possession_spells_and_events:
+Action: Build spells from per-frame possessors with a one-frame flicker and free-ball gaps, then their events.
+Expect: The flicker merged into the spell around it, chains per team, a pass within the team, and the turnover
+an interception when the ball travelled far enough, a loss when its travel is unknown.
+
+MatchTeamModelTests.test_first_fit_is_serialised:
+Action: Assign teams for two clips of a new match at the same time (stub embedder, stub clustering).
+Expect: The match model fitted and saved once; the other clip waits and loads it.
+
+RenderTests.test_pooled_render_matches_serial:
+Action: Render the detections of a small full-HD clip in this process and on a two-worker pool.
+Expect: Both files byte-identical to the frames of Tracker.draw_annotations, whose ball control box
+shows the whole clip's shares on every frame.
+
+VoronoiTests.test_edt_engine_within_tolerance:
+Action: Draw the Voronoi board of random line-ups with the distance-transform engine and the exact one.
+Expect: Nearest distances never shorter and at most step * sqrt(2) longer; under 1% of the pixels
+differ, none by more than half the overlay (opacity * 128).
+
+RenderTests.test_incremental_boards_within_bound:
+Action: Render Voronoi boards of moving players exactly, incrementally in order, and incrementally in
+alternating chunks like a two-worker pool (each worker's board restarts at every chunk).
+Expect: Both incremental renders reuse frames; their distance fields within max_error plus one grid
+cell of the exact ones, and under 1% of each board's pixels off by more than 16 levels.
+
+StageCacheTests.test_hits_and_misses:
+Action: Run a cacheable stage twice on the same video, then with other weights and another parameter.
+Expect: The second run loaded from the cache; changed weights or parameters run the stage again.
+
+StageCacheTests.test_lru_eviction_and_unreadable_entries:
+Action: Fill a small cache past max_bytes after reading its oldest entry; read an entry pickled by a missing module.
+Expect: The least recently used entry evicted and the cache within max_bytes; the unreadable entry a miss, deleted.
+
+CropDeduplicatorTests.test_static_crops_reuse_embeddings:
+Action: Deduplicate crops of two tracks that stand still, move, change appearance or share a crop.
+Expect: A still, unchanged crop reuses its track's last embedding; a moved or changed crop, or another track, gets its own.
+
+StageGraphTests.test_plan_per_product:
+Action: Plan the video pipeline for single products, with saved intermediates, per queue, and with inputs missing.
+Expect: Each product plans only its own stages (the renderer only the inputs it needs), saved intermediates
+skip the model stages, the inference phase hands over what the render stages use, missing inputs raise.
+
+StageGraphTests.test_parallel_branches:
+Action: Run three independent branches and a join with max_parallel=2 on a budget of 4 CPU threads.
+Expect: Two branches run at the same time (they meet at a barrier), never more than two, each with
+2 threads unless it sets its own; the join runs after all of them.
 """
 
+import json
 import shutil
 import tempfile
-from django.test import override_settings
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.test import SimpleTestCase, override_settings
 from rest_framework.test import APITestCase
 from django.urls import reverse
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -37,6 +149,8 @@ class JobEndpointTests(APITestCase):
         super().tearDownClass()
 
     def setUp(self):
+        # job ids restart with every test: no outputs of an earlier test's job
+        shutil.rmtree(Path(MEDIA_ROOT) / "outputs", ignore_errors=True)
         self.job = VideoJob.objects.create(
             status="pending",
             original="videos/test_existing.mp4"
@@ -44,8 +158,17 @@ class JobEndpointTests(APITestCase):
         self.list_url = reverse('jobs-list')
         self.detail_url = reverse('jobs-detail', args=[self.job.id])
 
+    def finish_with(self, product: str, filename: str) -> Path:
+        """Marks the job done with `product` stored as `filename`; returns the path to write it to."""
+        out_dir = Path(MEDIA_ROOT) / "outputs" / str(self.job.id)
+        out_dir.mkdir(parents=True, exist_ok=True)
+        self.job.status = "done"
+        self.job.outputs = {product: f"outputs/{self.job.id}/{filename}"}
+        self.job.save()
+        return out_dir / filename
+
     @patch("api.views.VideoFileClip")
-    @patch("api.views.process_video_task.delay")
+    @patch("api.views.enqueue_process_video")
     def test_upload_video_success(self, mock_task, mock_video_clip):
         mock_clip_instance = MagicMock()
         mock_clip_instance.duration = 10.0
@@ -75,7 +198,7 @@ class JobEndpointTests(APITestCase):
     @patch("api.views.VideoFileClip")
     def test_upload_video_too_long(self, mock_video_clip):
         mock_clip_instance = MagicMock()
-        mock_clip_instance.duration = 40.0
+        mock_clip_instance.duration = settings.MAX_VIDEO_SECONDS + 10.0
         mock_video_clip.return_value.__enter__.return_value = mock_clip_instance
 
         video_file = SimpleUploadedFile("long_video.mp4", b"content", content_type="video/mp4")
@@ -84,7 +207,7 @@ class JobEndpointTests(APITestCase):
         response = self.client.post(self.list_url, payload, format='multipart')
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertEqual(response.data['detail'], "video longer than 30 seconds")
+        self.assertEqual(response.data['detail'], f"video longer than {settings.MAX_VIDEO_SECONDS:g} seconds")
         self.assertEqual(VideoJob.objects.count(), 1)
 
     def test_upload_video_missing_file(self):
@@ -104,4 +227,821 @@ class JobEndpointTests(APITestCase):
     def test_retrieve_job(self):
         response = self.client.get(self.detail_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(response.data['id'], self.job.id)
\ No newline at end of file
+        self.assertEqual(response.data['id'], self.job.id)
+
+    @patch("api.views.VideoFileClip")
+    @patch("api.views.enqueue_process_video")
+    def test_upload_video_with_match(self, mock_task, mock_video_clip):
+        mock_clip_instance = MagicMock()
+        mock_clip_instance.duration = 10.0
+        mock_video_clip.return_value.__enter__.return_value = mock_clip_instance
+
+        video_file = SimpleUploadedFile("clip.mp4", b"content", content_type="video/mp4")
+        response = self.client.post(self.list_url + "?match=derby-2024_1", {"file": video_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['match'], "derby-2024_1")
+        self.assertEqual(VideoJob.objects.latest('created_at').match, "derby-2024_1")
+        mock_task.assert_called_once()
+
+    def test_upload_video_invalid_match(self):
+        video_file = SimpleUploadedFile("clip.mp4", b"content", content_type="video/mp4")
+        response = self.client.post(self.list_url + "?match=../etc", {"file": video_file}, format='multipart')
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(VideoJob.objects.count(), 1)
+
+    def test_pitch_control(self):
+        np.savez_compressed(
+            self.finish_with("pitch_control", "pitch_control.npz"),
+            share=np.array([0.5, 0.25, np.nan, 0.75], np.float32),
+            thirds=np.full((4, 3), 0.5, np.float32),
+            zones=np.full((4, 3, 6), 0.5, np.float32),
+            ball=np.array([1.0, np.nan, np.nan, 0.0], np.float32),
+        )
+
+        url = reverse('jobs-pitch-control', args=[self.job.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['share'], [0.5, 0.25, None, 0.75])
+        self.assertEqual(response.data['frames'], [0, 1, 2, 3])
+        self.assertEqual(len(response.data['zones'][0]), 3)
+
+        response = self.client.get(url + "?every=2")
+        self.assertEqual(response.data['ball'], [1.0, None])
+        self.assertEqual(response.data['frames'], [0, 2])
+
+    def test_pitch_control_not_produced(self):
+        self.job.status = "done"
+        self.job.outputs = {"detections": "outputs/x/detections.mp4"}
+        self.job.save()
+
+        response = self.client.get(reverse('jobs-pitch-control', args=[self.job.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_physical_metrics(self):
+        stored = {"fps": 25.0, "players": [{"track_id": 7, "team": 0, "distance_m": 120.5, "sprints": 2}]}
+        self.finish_with("physical_metrics", "physical_metrics.json").write_text(json.dumps(stored))
+
+        response = self.client.get(reverse('jobs-physical-metrics', args=[self.job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, stored)
+
+    def test_heatmap(self):
+        from processingVideo.analytics import HeatmapAccumulator
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+
+        heatmaps = HeatmapAccumulator(SoccerPitchConfiguration())
+        heatmaps.update([[1000, 2000], [1050, 2000], [6000, 3500]], [7, 7, 9], [0, 0, 1], weight=0.04)
+        heatmaps.save(self.finish_with("heatmaps", "heatmaps.npz"))
+
+        url = reverse('jobs-heatmap', args=[self.job.id])
+        for query in ("?team=0", "?track=9"):
+            response = self.client.get(url + query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response['Content-Type'], "image/png")
+        self.assertEqual(self.client.get(url + "?track=3").status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_pressure(self):
+        np.savez_compressed(
+            self.finish_with("pressure", "pressure.npz"),
+            carrier=np.array([7, -1, 9], np.int64),
+            pressure=np.array([2.5, np.nan, 1.25], np.float32),
+            near_ball=np.array([[1, 2], [0, 0], [3, 1]], np.int16),
+        )
+
+        response = self.client.get(reverse('jobs-pressure', args=[self.job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['carrier'], [7, -1, 9])
+        self.assertEqual(response.data['pressure'], [2.5, None, 1.25])
+        self.assertEqual(response.data['near_ball'][2], [3, 1])
+        self.assertEqual(response.data['frames'], [0, 1, 2])
+
+    def test_events(self):
+        np.savez_compressed(
+            self.finish_with("events", "events.npz"),
+            kinds=np.array(["pass", "interception", "loss"]),
+            spell_track=np.array([4, 5, 9]), spell_team=np.array([0, 0, 1]),
+            spell_start=np.array([0, 12, 30]), spell_stop=np.array([8, 20, 41]),
+            spell_chain=np.array([0, 0, 1]),
+            event_kind=np.array([0, 2], np.int8), event_start=np.array([7, 19]), event_end=np.array([12, 30]),
+            event_from_track=np.array([4, 5]), event_to_track=np.array([5, 9]),
+            event_from_team=np.array([0, 0]), event_to_team=np.array([0, 1]),
+            event_distance=np.array([1250.0, np.nan], np.float32),
+        )
+
+        response = self.client.get(reverse('jobs-events', args=[self.job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['spells']), 3)
+        self.assertEqual(response.data['spells'][1], {"track": 5, "team": 0, "start": 12, "stop": 20, "chain": 0})
+        self.assertEqual([e['kind'] for e in response.data['events']], ["pass", "loss"])
+        self.assertEqual(response.data['events'][0]['distance'], 12.5)
+        self.assertIsNone(response.data['events'][1]['distance'])
+
+    @patch("api.views.VideoFileClip")
+    @patch("api.views.enqueue_process_video")
+    def test_add_products(self, mock_task, mock_video_clip):
+        mock_clip_instance = MagicMock()
+        mock_clip_instance.duration, mock_clip_instance.fps = 10.0, 25.0
+        mock_video_clip.return_value.__enter__.return_value = mock_clip_instance
+
+        url = reverse('jobs-products', args=[self.job.id])
+        self.job.status = "processing"
+        self.job.save()
+        response = self.client.post(url + "?produce=voronoi")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+        self.job.status = "done"
+        self.job.outputs = {"detections": "outputs/x/detections.mp4"}
+        self.job.save()
+        response = self.client.post(url + "?produce=bogus")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(url + "?produce=detections,voronoi")
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        mock_task.assert_called_once()
+        self.assertEqual(mock_task.call_args.args, (self.job.id, ["voronoi"]))
+        self.assertEqual(mock_task.call_args.kwargs, {"n_frames": 250, "fps": 25.0})
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "processing")
+
+        self.job.status = "done"
+        self.job.save()
+        mock_task.reset_mock()
+        response = self.client.post(url + "?produce=detections")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_task.assert_not_called()
+
+    @patch("api.views.VideoFileClip", side_effect=OSError("failed to read the duration"))
+    @patch("api.views.enqueue_process_video")
+    def test_add_products_unreadable_video(self, mock_task, _video_clip):
+        self.job.status = "done"
+        self.job.outputs = {"detections": "outputs/x/detections.mp4"}
+        self.job.save()
+
+        with self.assertLogs("api.views", level="WARNING"):
+            response = self.client.post(reverse('jobs-products', args=[self.job.id]) + "?produce=voronoi")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        mock_task.assert_not_called()
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done")
+
+    @contextmanager
+    def eager_pipeline(self, graph, **overrides):
+        """Celery tasks run in-process (in-memory broker) on `graph`, without the stage cache."""
+        from config.celery import app
+        keys = ("task_always_eager", "task_eager_propagates", "broker_url", "result_backend")
+        saved = {key: app.conf[key] for key in keys}
+        app.conf.update(task_always_eager=True, task_eager_propagates=True,
+                        broker_url="memory://", result_backend="cache+memory://")
+        try:
+            with patch("processingVideo.pipeline.build_video_pipeline", return_value=graph), \
+                    override_settings(PIPELINE_CACHE_MAX_BYTES=0, **overrides):
+                yield
+        finally:
+            app.conf.update(saved)
+
+    @patch("api.tasks.send_status")
+    @patch("api.tasks.get_device", return_value="cpu")
+    def test_pipeline_chain_eager(self, _device, _send_status):
+        from config.celery import app
+        from api import tasks  # registers the pipeline tasks
+        from api.dispatch import INFERENCE_TASK, RENDER_TASK, enqueue_process_video
+        from processingVideo.pipeline import Stage, StageGraph
+
+        self.assertEqual(app.amqp.router.route({}, INFERENCE_TASK)['queue'].name, "inference")
+        self.assertEqual(app.amqp.router.route({}, RENDER_TASK)['queue'].name, "render")
+
+        ran = []
+
+        def track(video_path):
+            ran.append("track")
+            return {"render_tracks": {"players": [{7: {"team": 1}}]}, "team_stats": {"clusters": 2}}
+
+        def render(render_tracks, output_dir):
+            ran.append("render")
+            path = Path(output_dir) / "detections.mp4"
+            path.write_bytes(b"video" * len(render_tracks["players"]))
+            return {"detections": str(path)}
+
+        graph = StageGraph([
+            Stage("track", ("video_path",), ("render_tracks", "team_stats"), track, queue="inference"),
+            Stage("render", ("render_tracks", "output_dir"), ("detections",), render),
+        ])
+        handed_over = []
+        original = tasks.run_render_task.run
+
+        def spy_render(ref):
+            handed_over.append(ref)
+            return original(ref)
+
+        self.job.status = "processing"
+        self.job.profile = True
+        self.job.save()
+        with self.eager_pipeline(graph), patch.object(tasks.run_render_task, "run", spy_render):
+            enqueue_process_video(self.job.id, ["detections"])
+
+        self.assertEqual(ran, ["track", "render"])
+        self.assertEqual(handed_over[0]["products"], ["detections"])
+        self.assertEqual(handed_over[0]["intermediates"], f"outputs/{self.job.id}/intermediates.npz")
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done")
+        self.assertEqual(self.job.outputs, {"detections": f"outputs/{self.job.id}/detections.mp4"})
+        self.assertEqual(self.job.metrics["team_assignment"], {"clusters": 2})
+
+        response = self.client.get(reverse('jobs-metrics', args=[self.job.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response.data["timing"]
+        self.assertEqual([t["task"] for t in timing["tasks"]], ["inference", "render"])
+        stages = {row["name"]: row for row in timing["stages"]}
+        self.assertEqual(set(stages), {"track", "render"})
+        self.assertEqual(stages["render"]["calls"], 1)
+        self.assertGreater(stages["render"]["peak_rss_mb"], 0)
+
+        profile = response.data["profile"]
+        self.assertEqual(set(profile["tasks"]), {"inference", "render"})
+        self.assertIn(f"outputs/{self.job.id}/profile/render.collapsed", profile["files"])
+        self.assertTrue((Path(MEDIA_ROOT) / f"outputs/{self.job.id}/profile/inference.txt").exists())
+
+    @staticmethod
+    def segmented_graph(n_frames: int, keypoints: bool = True):
+        """
+        Stub stages for a video of `n_frames` run in segments: the second segment
+        has its own tracker ids and swapped team labels. Without `keypoints` the
+        track stage emits what a detections-only job keeps (no pitch_keypoints).
+        """
+        from processingVideo.pipeline import Stage, StageGraph
+        from processingVideo.utils import open_video_writer
+
+        def decode(video_path, frame_range):
+            start, stop = frame_range or (0, None)
+            return {"video_frames": [np.full((48, 64, 3), k, np.uint8) for k in range(start, stop or n_frames)]}
+
+        def track(video_frames, frame_range):
+            start = (frame_range or (0, None))[0]
+            (a, b), (team_a, team_b) = ((1, 2), (0, 1)) if start == 0 else ((7, 8), (1, 0))
+            frames = range(start, start + len(video_frames))
+            players = [{
+                a: {"bbox": [10 + k, 10, 20 + k, 30], "team": team_a, "team_color": (team_a,) * 3},
+                b: {"bbox": [40, 10, 50, 30], "team": team_b, "team_color": (team_b,) * 3},
+            } for k in frames]
+            out = {
+                "render_tracks": {"players": players, "goalkeepers": [{} for _ in frames],
+                                  "referees": [{} for _ in frames],
+                                  "ball": [{1: {"bbox": [12 + k, 28, 14 + k, 30]}} for k in frames]},
+                "team_ball_control": [team_a for _ in frames],
+                "team_stats": {"start": start},
+            }
+            if keypoints:
+                out["pitch_keypoints"] = [None for _ in frames]
+            return out
+
+        def render(video_frames, frame_range, render_tracks, output_dir):
+            path = Path(output_dir) / "detections.mp4"
+            writer = open_video_writer(str(path), video_frames[0].shape)
+            for frame in video_frames:
+                writer.write(frame)
+            writer.release()
+            return {"detections": str(path)}
+
+        def summary(render_tracks, output_dir):
+            teams = {}
+            for frame in render_tracks["players"]:
+                for track_id, info in frame.items():
+                    teams.setdefault(str(track_id), set()).add(info["team"])
+            path = Path(output_dir) / "physical_metrics.json"
+            path.write_text(json.dumps({key: sorted(value) for key, value in teams.items()}))
+            return {"physical_metrics": str(path)}
+
+        track_outputs = ("render_tracks", "team_ball_control", "team_stats") + (("pitch_keypoints",) if keypoints else ())
+        return StageGraph([
+            Stage("decode", ("video_path", "frame_range"), ("video_frames",), decode),
+            Stage("track", ("video_frames", "frame_range"), track_outputs, track, queue="inference"),
+            Stage("summary", ("render_tracks", "output_dir"), ("physical_metrics",), summary),
+            Stage("render", ("video_frames", "frame_range", "render_tracks", "output_dir"), ("detections",), render),
+        ])
+
+    def video_frame_values(self, product: str):
+        import cv2
+        cap = cv2.VideoCapture(str(Path(MEDIA_ROOT) / self.job.outputs[product]))
+        frames = []
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            frames.append(int(frame[0, 0, 0]))
+        cap.release()
+        return frames
+
+    @patch("api.tasks.send_status")
+    @patch("api.tasks.get_device", return_value="cpu")
+    def test_long_video_segments_eager(self, _device, _send_status):
+        from api import tasks  # registers the pipeline tasks
+        from api.dispatch import enqueue_process_video
+
+        n_frames = 20
+        self.job.status = "processing"
+        self.job.save()
+        with self.eager_pipeline(self.segmented_graph(n_frames),
+                                 PIPELINE_SEGMENT_SECONDS=0.4, PIPELINE_SEGMENT_OVERLAP_SECONDS=0.2):
+            enqueue_process_video(self.job.id, ["detections", "physical_metrics"], n_frames=n_frames, fps=25.0)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done", self.job.error)
+        self.assertEqual(self.job.metrics["segments"], {"segments": 2, "matched": 2, "new": 0, "flipped": 1})
+        teams = json.loads((Path(MEDIA_ROOT) / self.job.outputs["physical_metrics"]).read_text())
+        self.assertEqual(teams, {"1": [0], "2": [1]})
+        self.assertEqual(len(self.video_frame_values("detections")), n_frames)
+
+    @patch("api.tasks.send_status")
+    @patch("api.tasks.get_device", return_value="cpu")
+    def test_long_video_detections_only_eager(self, _device, _send_status):
+        from api import tasks  # registers the pipeline tasks
+        from api.dispatch import enqueue_process_video
+
+        n_frames = 20
+        self.job.status = "processing"
+        self.job.save()
+        with self.eager_pipeline(self.segmented_graph(n_frames, keypoints=False),
+                                 PIPELINE_SEGMENT_SECONDS=0.4, PIPELINE_SEGMENT_OVERLAP_SECONDS=0.2):
+            enqueue_process_video(self.job.id, ["detections"], n_frames=n_frames, fps=25.0)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "done", self.job.error)
+        self.assertEqual(self.job.metrics["segments"]["matched"], 2)
+        self.assertEqual(len(self.video_frame_values("detections")), n_frames)
+
+
+class AnalyticsTests(SimpleTestCase):
+    """The analytics functions behind the data products, on hand-made positions."""
+
+    fps = 25.0
+
+    def columns(self, tracks: dict) -> dict:
+        """analytics.positions columns of {track id: (team, (F, 2) positions in cm)}, one row per frame."""
+        rows = [(np.arange(len(xy)), np.full(len(xy), track_id), np.full(len(xy), team), np.asarray(xy, float))
+                for track_id, (team, xy) in tracks.items()]
+        frame, track_id, team, xy = (np.concatenate(column) for column in zip(*rows))
+        return {"frame": frame, "track_id": track_id, "team": team, "xy": xy}
+
+    def test_physical_metrics_constant_run(self):
+        from processingVideo.analytics import physical_metrics
+
+        t = np.arange(51) / self.fps
+        runner = np.stack([1000 + 800 * t, np.full_like(t, 3000)], axis=1)
+        still = np.tile([5000.0, 3000.0], (51, 1))
+        still[25] = [7000.0, 3000.0]  # 20 m in one frame: a detection glitch
+        rows = physical_metrics(self.columns({7: (0, runner), 9: (1, still)}), self.fps, smooth=0)
+
+        run, stand = rows
+        self.assertEqual((run["track_id"], run["team"], stand["team"]), (7, 0, 1))
+        self.assertAlmostEqual(run["distance_m"], 16.0)
+        self.assertAlmostEqual(run["max_speed_kmh"], 28.8)
+        self.assertEqual(run["sprints"], 1)
+        self.assertAlmostEqual(run["sprint_distance_m"], 16.0)
+        self.assertEqual(stand["distance_m"], 0.0)
+        self.assertEqual(stand["sprints"], 0)
+
+        # default smoothing, 10 s with the track lost for a second: steady running on both sides of the break
+        t = np.arange(251) / self.fps
+        runner = np.stack([1000 + 800 * t, np.full_like(t, 3000)], axis=1)
+        runner[100:125] = np.nan
+        (run,) = physical_metrics(self.columns({7: (0, runner)}), self.fps)
+        self.assertAlmostEqual(run["distance_m"], (99 + 125) * 0.32)
+        self.assertAlmostEqual(run["max_speed_kmh"], 28.8)
+        self.assertAlmostEqual(run["max_accel"], 0.0, places=6)
+        self.assertAlmostEqual(run["max_decel"], 0.0, places=6)
+        self.assertEqual(run["sprints"], 2)
+        self.assertAlmostEqual(run["accel_seconds"]["-1..1"], run["seconds"] - 1 / self.fps * 2)
+
+    def test_heatmaps_accumulate_and_merge(self):
+        from processingVideo.analytics import HeatmapAccumulator, accumulate_heatmaps
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+
+        config = SoccerPitchConfiguration()
+        first = np.tile([1050.0, 2050.0], (50, 1))
+        second = np.tile([6020.0, 3510.0], (50, 1))
+        second[:10] = np.nan  # not on the pitch map yet
+        columns = self.columns({7: (0, first), 9: (1, second)})
+        heatmaps = accumulate_heatmaps(columns, self.fps, config, block_frames=16)
+
+        self.assertAlmostEqual(float(heatmaps.team[0, 20, 10]), 2.0, places=5)
+        self.assertAlmostEqual(float(heatmaps.team[1, 35, 60]), 1.6, places=5)
+        self.assertAlmostEqual(float(heatmaps.team.sum()), 3.6, places=4)
+        self.assertEqual(sorted(heatmaps.tracks), [7, 9])
+        self.assertAlmostEqual(float(heatmaps.tracks[9].sum()), 1.6, places=5)
+
+        total = heatmaps + accumulate_heatmaps(columns, self.fps, config)
+        self.assertAlmostEqual(float(total.tracks[7][20, 10]), 4.0, places=5)
+        with tempfile.TemporaryDirectory() as tmp:
+            loaded = HeatmapAccumulator.load(total.save(Path(tmp) / "heatmaps.npz"))
+        np.testing.assert_array_equal(loaded.team, total.team)
+        np.testing.assert_array_equal(loaded.tracks[9], total.tracks[9])
+
+    def test_pressure_metrics(self):
+        from processingVideo.analytics import FrameIndex, pressure_metrics
+
+        def still(x, y):
+            return np.tile([x, y], (4, 1)).astype(float)
+
+        off_map = still(3000, 1000)
+        off_map[3] = np.nan
+        columns = self.columns({1: (0, still(1000, 1000)), 2: (0, off_map),
+                                5: (1, still(1300, 1000)), 6: (1, still(2000, 3000))})
+        ball = np.array([[1000, 1000], [2000, 2000], [1100, 1000], [1000, 1000]], float)
+        carrier, carrier_team = np.array([1, -1, 5, 2]), np.array([0, -1, 1, 0])
+
+        index = FrameIndex.from_columns(columns, n_frames=4, block_size=3)
+        slot, dist = index.nearest_to(ball)
+        self.assertEqual(index.track_id[2, slot[2]], 1)
+        self.assertAlmostEqual(dist[2], 100.0)
+        opp_dist, opponent = index.nearest_opponent()
+        self.assertEqual(opponent[0].tolist(), [5, 5, 1, 1])
+        self.assertEqual(opp_dist[0].tolist()[:3], [300.0, 1700.0, 300.0])
+
+        result = pressure_metrics(columns, ball, carrier, carrier_team)
+        self.assertEqual(result["carrier"].tolist(), [1, -1, 5, 2])
+        self.assertEqual(result["carrier_team"].tolist(), [0, -1, 1, 0])
+        np.testing.assert_allclose(result["pressure"], [3.0, np.nan, 3.0, np.nan])
+        self.assertEqual(result["open_lanes"].tolist(), [0, -1, 1, -1])  # 1 -> 2 runs past 5
+        self.assertEqual(result["near_ball"][0].tolist(), [1, 1])
+        np.testing.assert_allclose(result["marking"][0], [10.0, (3.0 + 5 ** 0.5 * 10) / 2], rtol=1e-6)
+
+    def test_possession_spells_and_events(self):
+        from processingVideo.analytics import EVENT_KINDS, possession_events, possession_spells
+
+        track = np.array([4] * 8 + [-1, 3] + [4] * 2 + [5] * 8 + [-1] * 2 + [9] * 8)
+        team = np.where(track == 9, 1, np.where(track >= 0, 0, -1))
+        spells = possession_spells(track, team)
+        self.assertEqual(spells["track"].tolist(), [4, 5, 9])
+        self.assertEqual(spells["start"].tolist(), [0, 12, 22])
+        self.assertEqual(spells["stop"].tolist(), [12, 20, 30])
+        self.assertEqual(spells["frames"].tolist(), [10, 8, 8])
+        self.assertEqual(spells["chain"].tolist(), [0, 0, 1])
+
+        ball = np.full((len(track), 2), np.nan)
+        ball[11], ball[12] = [1000, 1000], [1400, 1000]
+        ball[19], ball[22] = [1400, 1000], [1400, 1500]
+        events = possession_events(spells, ball)
+        self.assertEqual([EVENT_KINDS[k] for k in events["kind"]], ["pass", "interception"])
+        self.assertEqual(events["start"].tolist(), [11, 19])
+        self.assertEqual(events["end"].tolist(), [12, 22])
+        self.assertEqual((events["from_track"].tolist(), events["to_track"].tolist()), ([4, 5], [5, 9]))
+        self.assertEqual(events["to_team"].tolist(), [0, 1])
+        np.testing.assert_allclose(events["distance"], [400.0, 500.0])
+
+        ball[22] = np.nan
+        events = possession_events(spells, ball)
+        self.assertEqual(EVENT_KINDS[events["kind"][1]], "loss")
+        self.assertTrue(np.isnan(events["distance"][1]))
+
+
+class MatchTeamModelTests(SimpleTestCase):
+
+    @staticmethod
+    def clip(n_frames: int = 31):
+        """Ten still players of two shirt colours."""
+        frames = [np.zeros((60, 200, 3), np.uint8) for _ in range(n_frames)]
+        players = []
+        for frame in frames:
+            row = {}
+            for pid in range(10):
+                x = 10 + pid * 18
+                frame[10:40, x:x + 12] = (40, 40, 220) if pid < 5 else (220, 120, 30)
+                row[pid] = {"bbox": [x, 10, x + 12, 40]}
+            players.append(row)
+        empty = [{} for _ in frames]
+        return {"players": players, "goalkeepers": empty, "referees": list(empty), "ball": list(empty)}, frames
+
+    def test_first_fit_is_serialised(self):
+        import threading
+        import time
+        from benchmarks.stubs import stub_models
+
+        with stub_models(player=False, field=False):
+            from processingVideo.team_assigner.team import TeamClassifier
+            from processingVideo.team_assigner.team_assigner import TeamAssigner
+
+            fits, loads = [], []
+
+            def fit_features(classifier, data):
+                fits.append(len(data))
+                time.sleep(0.2)  # long enough for the other clip to reach the lock
+                classifier.reducer, classifier.cluster_model = "reducer", "kmeans"
+
+            def set_state(classifier, state):
+                loads.append(state["cluster_model"])
+
+            def assign(model_path):
+                tracks, frames = self.clip()
+                TeamAssigner().assign_teams(tracks, frames, model_path=model_path)
+
+            with tempfile.TemporaryDirectory() as tmp, \
+                    patch.object(TeamClassifier, "fit_features", fit_features), \
+                    patch.object(TeamClassifier, "set_state", set_state), \
+                    patch.object(TeamClassifier, "predict_features", lambda _, data: np.zeros(len(data), int)):
+                model_path = Path(tmp) / "matches" / "derby" / "team_model.pkl"
+                clips = [threading.Thread(target=assign, args=(model_path,)) for _ in range(2)]
+                for clip in clips:
+                    clip.start()
+                for clip in clips:
+                    clip.join()
+                self.assertTrue(model_path.exists())
+
+        self.assertEqual(len(fits), 1)
+        self.assertEqual(loads, ["kmeans"])
+
+
+class RenderTests(SimpleTestCase):
+
+    @staticmethod
+    def clip(n_frames: int = 20):
+        """Full-HD frames (the ball control box is drawn at 1350..1900 x 850..970) and moving tracks."""
+        frames = [np.full((1080, 1920, 3), (40, 120, 40), np.uint8) for _ in range(n_frames)]
+        players, ball = [], []
+        for k in range(n_frames):
+            players.append({
+                1: {"bbox": [200 + 10 * k, 400, 260 + 10 * k, 560], "team": 0, "team_color": (255, 191, 0)},
+                2: {"bbox": [900 - 10 * k, 400, 960 - 10 * k, 560], "team": 1, "team_color": (147, 20, 255)},
+            })
+            # with player 1 for the first quarter of the clip, then with player 2
+            x = 230 + 10 * k if k < n_frames // 4 else 930 - 10 * k
+            ball.append({1: {"bbox": [x - 5, 550, x + 5, 560]}})
+        empty = [{} for _ in frames]
+        return frames, {"players": players, "goalkeepers": empty, "referees": list(empty), "ball": ball}
+
+    def test_pooled_render_matches_serial(self):
+        from processingVideo.pipeline.render import FrameRenderer, render_products, write_frame_store
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+        from processingVideo.tracker import Tracker
+        from processingVideo.utils import ball_control_shares, open_video_writer
+
+        frames, tracks = self.clip()
+        tracker = Tracker()
+        expected = tracker.draw_annotations(frames, tracks, interpolate_ball=False)
+        team_ball_control = tracker.assign_ball_possession(tracks)
+        self.assertEqual(ball_control_shares(team_ball_control), (0.25, 0.75))
+        box = (slice(850, 971), slice(1350, 1901))
+        np.testing.assert_array_equal(expected[0][box], expected[-1][box])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            writer = open_video_writer(str(tmp / "annotations.mp4"), frames[0].shape)
+            for image in expected:
+                writer.write(image)
+            writer.release()
+
+            store = write_frame_store(frames, tmp / "frames.npy")
+            for workers in (1, 2):
+                renderer = FrameRenderer(SoccerPitchConfiguration(), ["detections"], frames,
+                                         tracks=tracks, team_ball_control=team_ball_control)
+                render_products(renderer, {"detections": tmp / f"detections_{workers}.mp4"}, len(frames),
+                                workers=workers, frames_path=store)
+
+            reference = (tmp / "annotations.mp4").read_bytes()
+            self.assertEqual((tmp / "detections_1.mp4").read_bytes(), reference)
+            self.assertEqual((tmp / "detections_2.mp4").read_bytes(), reference)
+
+
+    def test_incremental_boards_within_bound(self):
+        from processingVideo.pipeline.render import FrameRenderer
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+        from processingVideo.pitch.pitch import _min_dist2_broadcast
+
+        config = SoccerPitchConfiguration()
+        rng = np.random.default_rng(0)
+        n_frames, chunk = 32, 8
+        start = rng.uniform((0, 0), (config.length, config.width), (22, 2))
+        velocity = rng.normal(0, 8, (22, 2))  # cm per frame
+        xy = (start + np.arange(n_frames)[:, None, None] * velocity).astype(np.float32)
+        teams = np.repeat([0, 1], 11)
+
+        def renderer(incremental):
+            r = FrameRenderer(config, ["voronoi"], [np.zeros((4, 4, 3), np.uint8)] * n_frames,
+                              tracks={}, pitch_keypoints=[None] * n_frames, incremental=incremental)
+            r.pitch_annotator.annotate_products_from_result = (
+                lambda frame, tracks, t, *args, **kwargs: {"voronoi_xy": (xy[t], teams)}
+            )
+            return r
+
+        exact, serial = renderer(False), renderer(True)
+        pooled = [renderer(True), renderer(True)]
+        for k, first in enumerate(range(0, n_frames, chunk)):
+            expected = np.array(exact.render_block(first, first + chunk)["voronoi"], np.int16)
+            for r in (serial, pooled[k % 2]):
+                boards = np.array(r.render_block(first, first + chunk)["voronoi"], np.int16)
+                off = np.abs(boards - expected).max(axis=3) > 16
+                self.assertLess(off.mean(axis=(1, 2)).max(), 0.01)
+
+                board = r.voronoi_board
+                bound = board.max_error + board.step * np.sqrt(2)
+                for team in (0, 1):
+                    kept = np.sqrt(board._team_state[team]["d2"])
+                    pts = xy[first + chunk - 1][teams == team] * board.scale
+                    true = np.sqrt(_min_dist2_broadcast(pts, board.xg, board.yg))
+                    self.assertLess(np.abs(kept - true).max(), bound)
+
+        for r in (serial, *pooled):
+            self.assertGreater(r.take_stats()["voronoi"]["frames_reused"], 0)
+
+class VoronoiTests(SimpleTestCase):
+
+    def test_edt_engine_within_tolerance(self):
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+        from processingVideo.pitch.pitch import (
+            _cached_grid, _min_dist2_broadcast, _min_dist2_edt, draw_pitch_voronoi_diagram_2,
+        )
+
+        config = SoccerPitchConfiguration()
+        scale, padding, step, opacity = 0.1, 50, 2, 0.5
+        xg, yg = _cached_grid(int(config.width * scale), int(config.length * scale), padding, step)
+        rng = np.random.default_rng(0)
+        for _ in range(5):
+            team_1, team_2 = (rng.uniform((0, 0), (config.length, config.width), (11, 2)) for _ in range(2))
+            # a player off the pitch is outside the grid and added exactly
+            team_2[0] = (-600.0, config.width / 2)
+
+            xy = (team_1 * scale).astype(np.float32)
+            error = (np.sqrt(_min_dist2_edt(xy, xg, yg, padding, step))
+                     - np.sqrt(_min_dist2_broadcast(xy, xg, yg)))
+            self.assertGreater(error.min(), -1e-3)
+            self.assertLess(error.max(), step * np.sqrt(2))
+
+            edt, exact = (
+                draw_pitch_voronoi_diagram_2(config, team_1, team_2, opacity=opacity, padding=padding,
+                                             scale=scale, step=step, engine=engine).astype(int)
+                for engine in ("edt", "broadcast")
+            )
+            diff = np.abs(edt - exact).max(axis=2)
+            self.assertLess((diff > 0).mean(), 0.01)
+            self.assertLessEqual(diff.max(), opacity * 128)
+
+
+class StageCacheTests(SimpleTestCase):
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+
+    def test_hits_and_misses(self):
+        from processingVideo.pipeline import Stage, StageCache, StageGraph
+        from processingVideo.pipeline.cache import file_digest
+
+        video, weights, other_weights = self.tmp / "clip.mp4", self.tmp / "a.pt", self.tmp / "b.pt"
+        video.write_bytes(b"frames")
+        weights.write_bytes(b"weights a")
+        other_weights.write_bytes(b"weights b")
+        runs = []
+
+        def detect(video_path, model_path, conf):
+            runs.append((model_path, conf))
+            return {"boxes": np.arange(3) * conf}
+
+        def key(artifacts):
+            return {"video": file_digest(artifacts["video_path"]), "weights": file_digest(artifacts["model_path"]),
+                    "conf": artifacts["conf"]}
+
+        graph = StageGraph([Stage("detect", ("video_path", "model_path", "conf"), ("boxes",), detect, cache_key=key)])
+        cache = StageCache(self.tmp / "cache")
+
+        def run(model_path, conf):
+            return graph.run(["boxes"], {"video_path": str(video), "model_path": str(model_path), "conf": conf},
+                             cache=cache)["boxes"]
+
+        run(weights, 0.5)
+        np.testing.assert_array_equal(run(weights, 0.5), [0.0, 0.5, 1.0])
+        self.assertEqual(len(runs), 1)
+        self.assertEqual(cache.stats["hits"], 1)
+
+        run(other_weights, 0.5)
+        run(weights, 0.25)
+        self.assertEqual(runs, [(str(weights), 0.5), (str(other_weights), 0.5), (str(weights), 0.25)])
+        self.assertEqual(cache.stats["misses"], 3)
+
+    def test_lru_eviction_and_unreadable_entries(self):
+        import os
+        from processingVideo.pipeline import StageCache
+
+        cache = StageCache(self.tmp / "cache")
+        entry = {"boxes": np.random.default_rng(0).random(2000)}
+        cache.put("a", entry)
+        size = cache._path("a").stat().st_size
+        cache.max_bytes = 2 * size + size // 2  # room for two entries
+        cache.put("b", entry)
+        os.utime(cache._path("a"), (1000, 1000))
+        os.utime(cache._path("b"), (2000, 2000))
+
+        self.assertIsNotNone(cache.get("a"))  # now the most recently used
+        cache.put("c", entry)
+        self.assertEqual(sorted(p.stem for p in cache.root.glob("*.npz")), ["a", "c"])
+        self.assertEqual(cache.stats["evicted"], 1)
+        self.assertLessEqual(sum(p.stat().st_size for p in cache.root.glob("*.npz")), cache.max_bytes)
+
+        # a global that no longer exists, as after a library upgrade
+        np.savez_compressed(cache._path("old"), **{"pickle:tracks": np.frombuffer(b"cno_such_module\nThing\n.", np.uint8)})
+        self.assertIsNone(cache.get("old"))
+        self.assertFalse(cache._path("old").exists())
+        self.assertIsNone(cache.get("never_written"))
+
+
+class CropDeduplicatorTests(SimpleTestCase):
+
+    def test_static_crops_reuse_embeddings(self):
+        from processingVideo.team_assigner.dedup import CropDeduplicator, crop_dhash
+
+        rng = np.random.default_rng(0)
+        shirt = rng.integers(0, 256, (40, 16, 3), dtype=np.uint8)
+        other = rng.integers(0, 256, (40, 16, 3), dtype=np.uint8)
+        self.assertGreater(bin(crop_dhash(shirt) ^ crop_dhash(other)).count("1"), 2)
+        self.assertIsNone(crop_dhash(shirt[:0]))
+
+        box = [100, 50, 116, 90]
+        crops, bboxes, tracks = zip(*[
+            (shirt, box, 1),                              # 0 embedded
+            (shirt, [100.5, 50, 116.5, 90], 1),           # 1 still (under move_thresh): reuses 0
+            (shirt, [105, 50, 121, 90], 1),               # 2 moved: embedded
+            (shirt, [105, 50, 121, 90], 7),               # 3 same crop, another track: embedded
+            (other, [105, 50, 121, 90], 7),               # 4 same place, new appearance: embedded
+            (other, [105, 50, 121, 90], 7),               # 5 reuses 4
+            (shirt[:0], [105, 50, 121, 90], 7),           # 6 empty crop: embedded
+            (shirt, [105.5, 50, 121.5, 90], 1),           # 7 reuses 2, the last embedded of track 1
+        ])
+        keep, inverse = CropDeduplicator(move_thresh=2.0, hash_tolerance=2).dedup(list(crops), bboxes, tracks)
+
+        self.assertEqual(keep, [0, 2, 3, 4, 6])
+        self.assertEqual(inverse.tolist(), [0, 0, 1, 2, 3, 3, 4, 1])
+
+
+class StageGraphTests(SimpleTestCase):
+    INPUTS = ("video_path", "frame_range", "output_dir", "config", "device", "player_model_path", "field_model_path",
+              "team_model_path", "team_model_update", "render_workers", "render_incremental")
+
+    def test_plan_per_product(self):
+        from processingVideo.pipeline import build_video_pipeline
+
+        graph = build_video_pipeline()
+
+        def names(wanted, available=self.INPUTS):
+            return [stage.name for stage in graph.plan(wanted, available)]
+
+        self.assertEqual(names(["detections"]), ["decode", "track", "team", "ball", "frame_store", "render"])
+        self.assertEqual(names(["pitch_edges"]), ["decode", "keypoints", "frame_store", "render"])
+        self.assertEqual(names(["events"]), ["decode", "track", "team", "ball", "keypoints", "positions", "events"])
+        render = graph.plan(["pitch_edges"], self.INPUTS)[-1]
+        self.assertEqual(render.outputs, ("pitch_edges",))
+        self.assertIn("pitch_keypoints", render.inputs)
+        self.assertNotIn("render_tracks", render.inputs)
+
+        saved = self.INPUTS + ("render_tracks", "team_ball_control")
+        self.assertEqual(names(["detections"], saved), ["decode", "frame_store", "render"])
+        self.assertEqual(sorted(graph.phase_outputs(["detections"], self.INPUTS, "inference")),
+                         ["render_tracks", "team_ball_control", "team_stats"])
+
+        with self.assertRaisesRegex(ValueError, "missing pipeline inputs: .*'player_model_path'"):
+            graph.plan(["detections"], ["video_path"])
+        with self.assertRaisesRegex(ValueError, "no stage produces"):
+            graph.plan(["bogus"], self.INPUTS)
+
+    def test_parallel_branches(self):
+        import threading
+        import time
+        from processingVideo.pipeline import Stage, StageGraph
+
+        both_running = threading.Barrier(2, timeout=10)
+        lock = threading.Lock()
+        running, most, budgets = [0], [0], {}
+
+        def branch(name, meet):
+            def run(source):
+                with lock:
+                    running[0] += 1
+                    most[0] = max(most[0], running[0])
+                if meet:
+                    both_running.wait()  # breaks (and fails the run) unless the other branch is running too
+                time.sleep(0.05)
+                with lock:
+                    running[0] -= 1
+                return {name: source + 1}
+            return run
+
+        def join(a, b, c):
+            return {"total": a + b + c}
+
+        graph = StageGraph([
+            Stage("a", ("source",), ("a",), branch("a", True)),
+            Stage("b", ("source",), ("b",), branch("b", True)),
+            Stage("c", ("source",), ("c",), branch("c", False), threads=1),
+            Stage("join", ("a", "b", "c"), ("total",), join),
+        ])
+        budget = lambda threads: budgets.setdefault(threading.current_thread().name, []).append(threads)
+        order = []
+        with patch("processingVideo.pipeline.graph.set_thread_budget", side_effect=budget):
+            result = graph.run(["total"], {"source": 1}, max_parallel=2, cpu_threads=4,
+                               on_stage_done=lambda stage, done, total: order.append(stage.name))
+
+        self.assertEqual(result["total"], 6)
+        self.assertEqual(most[0], 2)
+        self.assertEqual(sorted(order[:2]), ["a", "b"])
+        self.assertEqual(order[-1], "join")
+        self.assertEqual(sorted(t for calls in budgets.values() for t in calls), [1, 2, 2, 2])
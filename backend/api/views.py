@@ -5,15 +5,27 @@ from django.conf import settings
 from moviepy.editor import VideoFileClip
 from .models import VideoJob
 from .serializers import VideoJobSerializer
-from .tasks import process_video_task
+from .dispatch import enqueue_process_video
+import json
+import logging
 import os
+import re
 from pathlib import Path
-from django.http import FileResponse, Http404, StreamingHttpResponse
+from django.http import FileResponse, Http404, HttpResponse, StreamingHttpResponse
 from zipfile import ZipFile, ZIP_DEFLATED
 from io import BytesIO
+import numpy as np
 
-MAX_SECONDS = 30
-VALID_PRODUCTS = {"detections", "pitch_edges", "tactical_board", "voronoi"}
+VALID_PRODUCTS = {"detections", "pitch_edges", "tactical_board", "voronoi", "pitch_control", "physical_metrics", "heatmaps", "pressure", "events"}
+MATCH_KEY_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+logger = logging.getLogger(__name__)
+
+
+def clip_frames(clip):
+    """(frame count, fps) of an open VideoFileClip."""
+    fps = float(clip.fps or 0)
+    return int(clip.duration * fps), fps
 
 class VideoJobViewSet(viewsets.ModelViewSet):
     queryset = VideoJob.objects.order_by("-id")
@@ -32,25 +44,29 @@ class VideoJobViewSet(viewsets.ModelViewSet):
             return Response({"detail": "Invalid file format. Only mp4, mov, and avi are allowed."}, status=400)
 
         # read desired outputs from query (?produce=...)
-        raw = request.query_params.get("produce", "") or ""
-        selected = {s.strip() for s in raw.split(",") if s.strip()}
-        if not selected:
-            selected = {"detections"}  # sensible default
+        selected = self._produce(request) or {"detections"}  # sensible default
         unknown = selected - VALID_PRODUCTS
         if unknown:
             return Response({"detail": f"invalid produce values: {sorted(unknown)}"}, status=400)
 
-        job = VideoJob.objects.create(original=f, status="pending")
+        # optional match grouping (?match=...): clips of one game reuse the same team model
+        match = (request.query_params.get("match", "") or "").strip()
+        if match and not MATCH_KEY_RE.match(match):
+            return Response({"detail": "invalid match key (use letters, digits, '-' or '_', max 64)"}, status=400)
 
-        # 30s validation
+        # ?profile=1: run under the sampling profiler (see the profile entry of the job's metrics)
+        job = VideoJob.objects.create(original=f, status="pending", match=match, profile=self._profile(request))
+
+        # length validation (long videos are processed in segments, see api.dispatch)
         try:
             with VideoFileClip(job.original.path) as clip:
-                if clip.duration > MAX_SECONDS + 0.01:
+                if clip.duration > settings.MAX_VIDEO_SECONDS + 0.01:
                     p = job.original.path
                     job.delete()
                     try: os.remove(p)
                     except Exception: pass
-                    return Response({"detail": "video longer than 30 seconds"}, status=400)
+                    return Response({"detail": f"video longer than {settings.MAX_VIDEO_SECONDS:g} seconds"}, status=400)
+                n_frames, fps = clip_frames(clip)
         except Exception as e:
             job.delete()
             return Response({"detail": f"could not read video: {e}"}, status=400)
@@ -58,10 +74,67 @@ class VideoJobViewSet(viewsets.ModelViewSet):
         job.status = "processing"
         job.save()
 
-        # pass the selection to Celery
-        process_video_task.delay(job.id, sorted(list(selected)))
+        # pass the selection to Celery (by task name, see api.dispatch)
+        enqueue_process_video(job.id, sorted(list(selected)), n_frames=n_frames, fps=fps)
         return Response(VideoJobSerializer(job).data, status=status.HTTP_201_CREATED)
 
+    @staticmethod
+    def _produce(request) -> set:
+        raw = request.query_params.get("produce", "") or ""
+        return {s.strip() for s in raw.split(",") if s.strip()}
+
+    @staticmethod
+    def _profile(request) -> bool:
+        return (request.query_params.get("profile", "") or "").strip().lower() in {"1", "true", "yes"}
+
+    @action(detail=True, methods=["post"])
+    def products(self, request, pk=None):
+        """
+        Adds products to a finished job (?produce=...) without uploading again:
+        the job's saved tracks, team labels and keypoints are reused, so only
+        the missing products are rendered and merged into its outputs.
+        ?profile=1 profiles this run.
+        """
+        job = self.get_object()
+        selected = self._produce(request)
+        if not selected:
+            return Response({"detail": "produce required"}, status=400)
+        unknown = selected - VALID_PRODUCTS
+        if unknown:
+            return Response({"detail": f"invalid produce values: {sorted(unknown)}"}, status=400)
+        if job.status != "done":
+            return Response({"detail": f"job is {job.status}, products can be added once it is done"}, status=409)
+
+        missing = selected - set(job.outputs or {})
+        if not missing:
+            return Response(VideoJobSerializer(job).data)
+
+        # the length decides the segments: never run a long match unsegmented on a failed probe
+        try:
+            with VideoFileClip(job.original.path) as clip:
+                n_frames, fps = clip_frames(clip)
+        except OSError as e:
+            logger.warning("job %s: could not probe %s: %s", job.id, job.original.path, e)
+            return Response({"detail": f"could not read video: {e}"}, status=400)
+
+        job.status = "processing"
+        job.profile = self._profile(request)
+        job.save(update_fields=["status", "profile"])
+        enqueue_process_video(job.id, sorted(missing), n_frames=n_frames, fps=fps)
+        return Response(VideoJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=["get"])
+    def metrics(self, request, pk=None):
+        """
+        Run statistics of a job: metrics["timing"] holds wall / CPU time, frames/s,
+        items and peak memory per pipeline stage and step, and the totals per task.
+        Profiled jobs (?profile=1) add metrics["profile"]: sampled seconds per
+        component (Tracker, TeamClassifier, PitchAnnotator, draw_utils) and the
+        report files (call tree .txt, flame graph .collapsed) under MEDIA_URL.
+        """
+        job = self.get_object()
+        return Response({"status": job.status, **(job.metrics or {})})
+
     @action(detail=True, methods=["get"])
     def files(self, request, pk=None):
         job = self.get_object()
@@ -73,6 +146,136 @@ class VideoJobViewSet(viewsets.ModelViewSet):
             return x
         return Response(absify(job.outputs or {}))
 
+    def _output_path(self, product: str, label: str) -> Path:
+        """Absolute path of a finished job's data product; 404 while it does not exist."""
+        job = self.get_object()
+        rel = (job.outputs or {}).get(product)
+        if job.status != "done" or not rel:
+            raise Http404(f"{label} not available")
+        abs_path = Path(settings.MEDIA_ROOT) / rel
+        if not abs_path.exists():
+            raise Http404(f"{label} not available")
+        return abs_path
+
+    def _per_frame_arrays(self, request, product: str, label: str):
+        """Arrays of a job's per-frame .npz product as JSON lists (null for NaN), ?every=N."""
+        abs_path = self._output_path(product, label)
+
+        try:
+            every = max(1, int(request.query_params.get("every", "1")))
+        except ValueError:
+            return Response({"detail": "every must be an integer"}, status=400)
+
+        def as_list(values):
+            if values.dtype.kind != "f":
+                return values.tolist()
+            values = np.round(values.astype(np.float64), 4)
+            return np.where(np.isnan(values), None, values).tolist()
+
+        with np.load(abs_path) as data:
+            payload = {key: as_list(data[key][::every]) for key in data.files}
+            n_frames = len(data[data.files[0]][::every]) if data.files else 0
+        payload["frames"] = list(range(0, n_frames * every, every))
+        return Response(payload)
+
+    @action(detail=True, methods=["get"])
+    def pitch_control(self, request, pk=None):
+        """
+        Per-frame pitch control of a job run with produce=pitch_control, as JSON.
+
+        Values are team 0's control in [0, 1] (team 1 has 1 - value), null
+        where unknown: share, thirds [3], zones [rows][cols], ball.
+
+        Query params:
+        - every=N  -> only every N-th frame (default 1)
+        """
+        return self._per_frame_arrays(request, "pitch_control", "Pitch control")
+
+    @action(detail=True, methods=["get"])
+    def pressure(self, request, pk=None):
+        """
+        Per-frame pressing and marking numbers of a job run with
+        produce=pressure, as JSON: carrier / carrier_team (track id and team
+        on the ball, -1 = none), pressure (m to the closest opponent),
+        near_ball [team] (players within 5 m of the ball), open_lanes
+        (unobstructed passes, -1 = no carrier), marking [team] (mean m to the
+        closest opponent). null where unknown.
+
+        Query params:
+        - every=N  -> only every N-th frame (default 1)
+        """
+        return self._per_frame_arrays(request, "pressure", "Pressure")
+
+    @action(detail=True, methods=["get"])
+    def physical_metrics(self, request, pk=None):
+        """
+        Per-player distance, speed, sprints and acceleration profile of a job
+        run with produce=physical_metrics, as JSON.
+        """
+        abs_path = self._output_path("physical_metrics", "Physical metrics")
+        return Response(json.loads(abs_path.read_text()))
+
+    @action(detail=True, methods=["get"])
+    def events(self, request, pk=None):
+        """
+        Possession spells and pass events of a job run with produce=events,
+        as JSON rows:
+        - spells: track, team, start, stop (frames [start, stop)), frames
+          (frames on the ball), chain (index of the team's possession chain)
+        - events: kind (pass / interception / loss), start, end, from_track,
+          to_track, from_team, to_team, distance (m of ball travel, null if unknown)
+        """
+        abs_path = self._output_path("events", "Events")
+
+        def rows(data, prefix):
+            keys = [k for k in data.files if k.startswith(prefix)]
+            columns = {k[len(prefix):]: data[k].tolist() for k in keys}
+            return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+        with np.load(abs_path) as data:
+            kinds = data["kinds"].tolist()
+            spells = rows(data, "spell_")
+            events = rows(data, "event_")
+        for event in events:
+            event["kind"] = kinds[event["kind"]]
+            d = event["distance"]
+            event["distance"] = None if d != d else round(d / 100.0, 2)
+        return Response({"spells": spells, "events": events})
+
+    @action(detail=True, methods=["get"])
+    def heatmap(self, request, pk=None):
+        """
+        Occupancy heatmap of a job run with produce=heatmaps, drawn over the
+        pitch as a PNG.
+
+        Query params (one of):
+        - team=0|1   -> a team's heatmap
+        - track=ID   -> one player's heatmap
+        """
+        abs_path = self._output_path("heatmaps", "Heatmaps")
+
+        team, track = request.query_params.get("team"), request.query_params.get("track")
+        if (team is None) == (track is None):
+            return Response({"detail": "give exactly one of team or track"}, status=400)
+        try:
+            key = int(team if team is not None else track)
+        except ValueError:
+            return Response({"detail": "team and track must be integers"}, status=400)
+
+        import cv2
+        from processingVideo.analytics import HeatmapAccumulator
+        heatmaps = HeatmapAccumulator.load(abs_path)
+        if team is not None:
+            if not 0 <= key < len(heatmaps.team):
+                raise Http404("No such team")
+            heat = heatmaps.team[key]
+        else:
+            if key not in heatmaps.tracks:
+                raise Http404("No such track")
+            heat = heatmaps.tracks[key]
+
+        ok, png = cv2.imencode(".png", heatmaps.render(heat))
+        return HttpResponse(png.tobytes(), content_type="image/png")
 
     @action(detail=True, methods=["get"])
     def download(self, request, pk=None):
@@ -0,0 +1,72 @@
+"""
+API process startup benchmark.
+
+Boots Django the way Daphne/runserver does (settings + URLconf, which pulls in
+api.views) in a fresh interpreter and reports wall time, peak RSS and which
+heavy CV/ML libraries ended up imported.
+
+    cd backend
+    python -m benchmarks.api_startup --repeat 5 --json startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("torch", "ultralytics", "supervision", "pandas", "transformers", "umap", "sklearn", "cv2")
+
+_PROBE = r"""
+import json, resource, sys, time
+t0 = time.perf_counter()
+import django
+django.setup()
+import config.urls  # noqa: F401  (imports api.views like the first request would)
+elapsed = time.perf_counter() - t0
+heavy = [m for m in %(heavy)r if m in sys.modules]
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"seconds": elapsed, "peak_rss_mb": rss_kb / 1024.0, "heavy_modules": heavy}))
+"""
+
+
+def probe_once(settings_module: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    out = subprocess.run(
+        [sys.executable, "-c", _PROBE % {"heavy": HEAVY_MODULES}],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    # the probe prints a single JSON line last; libraries may log before it
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--settings", default="config.settings")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the summary here")
+    args = parser.parse_args(argv)
+
+    runs = [probe_once(args.settings) for _ in range(max(1, args.repeat))]
+    summary = {
+        "benchmark": "api_startup",
+        "repeat": len(runs),
+        "seconds_median": statistics.median(r["seconds"] for r in runs),
+        "peak_rss_mb_median": statistics.median(r["peak_rss_mb"] for r in runs),
+        "heavy_modules": runs[-1]["heavy_modules"],
+    }
+
+    print(f"startup: {summary['seconds_median']:.2f}s  "
+          f"peak RSS: {summary['peak_rss_mb_median']:.0f} MB  "
+          f"heavy modules: {', '.join(summary['heavy_modules']) or 'none'}")
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Compare two pipeline benchmark reports (benchmarks.pipeline --json).
+
+Scenes are matched by name (size and frame count). For each one, prints the
+end-to-end frames/s and peak memory of both reports and every stage's wall
+time (run on its own), with the change. Exits with status 1 when a scene got
+slower end to end by more than --threshold (a fraction), so it can gate CI.
+
+    cd backend
+    python -m benchmarks.compare base.json head.json --threshold 0.10
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+
+
+def _change(old, new):
+    if not old or new is None:
+        return None
+    return new / old - 1.0
+
+
+def _fmt(change) -> str:
+    return "     n/a" if change is None else f"{change:+8.1%}"
+
+
+def compare(base: dict, head: dict, threshold: float = 0.10) -> dict:
+    """Per-scene changes of `head` against `base`; "regressions" lists scenes over the threshold."""
+    base_runs = {run["scene"]: run for run in base["runs"]}
+    scenes, regressions = {}, []
+    for run in head["runs"]:
+        old = base_runs.get(run["scene"])
+        if old is None:
+            continue
+        e2e_old, e2e_new = old["end_to_end"], run["end_to_end"]
+        fps = _change(e2e_old["fps"], e2e_new["fps"])
+        scenes[run["scene"]] = {
+            "fps": [e2e_old["fps"], e2e_new["fps"]],
+            "fps_change": fps,
+            "peak_rss_mb": [e2e_old["peak_rss_mb"], e2e_new["peak_rss_mb"]],
+            "stages": {
+                name: {
+                    "wall_s": [old["stages"][name]["wall_s"], row["wall_s"]],
+                    "wall_change": _change(old["stages"][name]["wall_s"], row["wall_s"]),
+                }
+                for name, row in run["stages"].items() if name in old["stages"]
+            },
+        }
+        if fps is not None and fps < -threshold:
+            regressions.append(run["scene"])
+    return {"base": base.get("commit"), "head": head.get("commit"), "scenes": scenes, "regressions": regressions}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed end-to-end frames/s drop")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the comparison here")
+    args = parser.parse_args(argv)
+
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    if base.get("models") != head.get("models") or base.get("options") != head.get("options"):
+        print("warning: the reports were run with different models or options")
+
+    result = compare(base, head, args.threshold)
+    for scene, row in result["scenes"].items():
+        print(f"{scene:18s} frames/s {row['fps'][0]:8.2f} -> {row['fps'][1]:8.2f} {_fmt(row['fps_change'])}   "
+              f"peak {row['peak_rss_mb'][0]:6.0f} -> {row['peak_rss_mb'][1]:6.0f} MB")
+        for name, stage in row["stages"].items():
+            print(f"    {name:16s} {stage['wall_s'][0]:8.3f} -> {stage['wall_s'][1]:8.3f} s {_fmt(stage['wall_change'])}")
+    if result["regressions"]:
+        print(f"slower by more than {args.threshold:.0%}: {', '.join(result['regressions'])}")
+
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(result, indent=2))
+    return 1 if result["regressions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
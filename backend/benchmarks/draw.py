@@ -0,0 +1,112 @@
+"""
+Per-frame drawing benchmark.
+
+Times the detections overlay (draw_tracks) and the tactical board markers
+(draw_points_on_pitch) on synthetic tracks, with the sprite cache and with
+direct cv2 drawing (SPRITES.direct), and checks both give the same pixels.
+
+    cd backend
+    python -m benchmarks.draw --frames 200 --players 22 --json draw.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+def synthetic_tracks(rng, frames: int, players: int, shape):
+    """Players drifting around a frame of `shape`, two team colours, one referee, the ball."""
+    H, W = shape[:2]
+    start = rng.uniform([50, 100], [W - 50, H - 20], (players, 2))
+    velocity = rng.normal(0, 2, (players, 2))
+    tracks = {"players": [], "goalkeepers": [], "referees": [], "ball": []}
+    for f in range(frames):
+        pos = start + velocity * f
+        tracks["players"].append({
+            i + 1: {
+                "bbox": [x - 20, y - 70, x + 20 + (i % 4), y],
+                "team_color": (255, 0, 0) if i % 2 else (0, 0, 255),
+                "has_ball": i == f % players,
+            }
+            for i, (x, y) in enumerate(pos)
+        })
+        tracks["goalkeepers"].append({})
+        tracks["referees"].append({200: {"bbox": [W / 2 - 20, H / 2 - 70, W / 2 + 20, H / 2]}})
+        tracks["ball"].append({1: {"bbox": [W / 3, H / 3, W / 3 + 10, H / 3 + 10]}})
+    return tracks
+
+
+def main(argv=None):
+    import supervision as sv
+    from processingVideo.pitch.football import SoccerPitchConfiguration
+    from processingVideo.pitch.pitch import draw_pitch, draw_points_on_pitch
+    from processingVideo.utils import SPRITES, draw_tracks
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--players", type=int, default=22)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None, help="write the summary here")
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    frame = rng.integers(0, 255, (args.height, args.width, 3), dtype=np.uint8)
+    tracks = synthetic_tracks(rng, args.frames, args.players, frame.shape)
+    team_ball_control = list(rng.integers(0, 2, args.frames))
+
+    config = SoccerPitchConfiguration()
+    pitch = draw_pitch(config)
+    layers = [
+        (sv.Color.WHITE, 10, 1),
+        (sv.Color.from_hex("00BFFF"), 16, args.players // 2),
+        (sv.Color.from_hex("FF1493"), 16, args.players - args.players // 2),
+        (sv.Color.from_hex("FFD700"), 16, 3),
+    ]
+    points = [
+        [rng.uniform([0, 0], [config.length, config.width], (n, 2)) for _, _, n in layers]
+        for _ in range(args.frames)
+    ]
+
+    def detections():
+        return [draw_tracks(frame, f, tracks, team_ball_control) for f in range(args.frames)]
+
+    def tactical():
+        boards = []
+        for f in range(args.frames):
+            board = pitch.copy()
+            for (color, radius, _), xy in zip(layers, points[f]):
+                board = draw_points_on_pitch(config, xy, color, sv.Color.BLACK, radius, 2, pitch=board)
+            boards.append(board)
+        return boards
+
+    results = {}
+    for name, render in (("detections", detections), ("tactical_board", tactical)):
+        row = {}
+        images = {}
+        for mode, direct in (("cv2", True), ("sprites", False)):
+            SPRITES.direct = direct
+            render()  # warm-up (sprite rasterization)
+            t0 = time.perf_counter()
+            images[mode] = render()
+            row[f"{mode}_ms_per_frame"] = 1000.0 * (time.perf_counter() - t0) / args.frames
+        SPRITES.direct = False
+        row["speedup"] = row["cv2_ms_per_frame"] / row["sprites_ms_per_frame"]
+        row["identical"] = all(np.array_equal(a, b) for a, b in zip(images["cv2"], images["sprites"]))
+        results[name] = row
+        print(f"{name:15s} cv2 {row['cv2_ms_per_frame']:6.2f} ms/frame  "
+              f"sprites {row['sprites_ms_per_frame']:6.2f} ms/frame  "
+              f"x{row['speedup']:.1f}  identical {row['identical']}")
+
+    summary = {"benchmark": "draw", "frames": args.frames, "players": args.players,
+               "sprite_cache": dict(SPRITES.stats), "results": results}
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
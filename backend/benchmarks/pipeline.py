@@ -0,0 +1,246 @@
+"""
+End-to-end and per-stage pipeline benchmark.
+
+Runs the video pipeline (build_video_pipeline) on synthetic matches
+(benchmarks.synthetic) of every --sizes x --seconds, with the stub models of
+benchmarks.stubs for every model not given real weights, and records it with
+utils.instrument:
+
+- end to end: the requested products, independent stages side by side as on a
+  worker, --repeat times (the run with the median wall time is reported);
+- per stage: each stage of the plan once more on its own, from the outputs of
+  the end-to-end run, with every core.
+
+Each scene runs in a fresh interpreter after a short warm-up run (imports, JIT
+compilation, sprite rasterization), so the peak memory of one scene is not
+inflated by the ones before it. The JSON report (frames/s, wall / CPU seconds
+and peak RSS per stage and in total, with the commit and the machine) is what
+benchmarks.compare reads.
+
+    cd backend
+    python -m benchmarks.pipeline --sizes 640x360 1280x720 --seconds 2 5 --json bench.json
+    python -m benchmarks.pipeline --player-model processingVideo/models/player_detection.pt \\
+        --field-model processingVideo/models/field_detection.pt --real-embedder --json real.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .synthetic import SyntheticMatch, parse_size
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_PRODUCTS = ("detections", "pitch_edges", "tactical_board", "voronoi", "pitch_control", "physical_metrics",
+                    "heatmaps", "pressure", "events")
+
+
+def git_commit():
+    try:
+        head = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=BACKEND_DIR,
+                               capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {"sha": head, "dirty": bool(dirty)}
+
+
+def pipeline_inputs(video_path, output_dir, args) -> dict:
+    """The external inputs a job's task supplies (api.tasks.JobRun), for a local video."""
+    from processingVideo.pitch import SoccerPitchConfiguration
+    return {
+        "video_path": str(video_path),
+        "frame_range": None,
+        "output_dir": Path(output_dir),
+        "config": SoccerPitchConfiguration(),
+        "device": args.device,
+        "player_model_path": args.player_model or "stub",
+        "field_model_path": args.field_model or "stub",
+        "team_model_path": None,
+        "team_model_update": False,
+        "render_workers": args.render_workers or os.cpu_count() or 1,
+        "render_incremental": args.render_incremental,
+    }
+
+
+def recorded(fn) -> dict:
+    from processingVideo.utils.instrument import Recorder, recording
+    recorder = Recorder()
+    with recording(recorder):
+        fn()
+    return recorder.summary()
+
+
+def run_scene(args, width: int, height: int, seconds: float, work_dir: Path) -> dict:
+    """Benchmarks one synthetic match in this process."""
+    from processingVideo.pipeline import build_video_pipeline
+
+    frames = max(1, int(round(seconds * args.fps)))
+    match = SyntheticMatch(width, height, frames, args.fps, seed=args.seed)
+    video = match.write(work_dir / f"match_{width}x{height}_{frames}.avi")
+    products = list(args.products)
+    graph = build_video_pipeline()
+
+    def end_to_end(out):
+        artifacts = pipeline_inputs(video, out, args)
+        summary = recorded(lambda: graph.run(
+            products, artifacts, max_parallel=args.max_parallel, cpu_threads=args.cpu_threads or None,
+        ))
+        return summary, artifacts
+
+    if not args.no_warmup:
+        warm = SyntheticMatch(width, height, min(frames, 2 * int(args.fps)), args.fps, seed=args.seed)
+        warm_out = work_dir / "warmup"
+        warm_out.mkdir(exist_ok=True)
+        warm_inputs = pipeline_inputs(warm.write(work_dir / "warmup.avi"), warm_out, args)
+        graph.run(products, warm_inputs, max_parallel=args.max_parallel, cpu_threads=args.cpu_threads or None)
+
+    runs = []
+    for k in range(max(1, args.repeat)):
+        out = work_dir / f"run{k}"
+        out.mkdir(exist_ok=True)
+        runs.append(end_to_end(out))
+    runs.sort(key=lambda run: run[0]["totals"]["wall_s"])
+    summary, artifacts = runs[len(runs) // 2]
+    totals = summary["totals"]
+
+    # every stage again on its own, on the outputs of the reported run
+    stages = {}
+    base = pipeline_inputs(video, artifacts["output_dir"], args)
+    for stage in graph.plan(products, available=base.keys()):
+        inputs = {name: value for name, value in artifacts.items() if name not in stage.outputs}
+        alone = recorded(lambda: graph.run(list(stage.outputs), inputs, cpu_threads=args.cpu_threads or None))
+        row = next(r for r in alone["stages"] if r["name"] == stage.name)
+        stages[stage.name] = {
+            "wall_s": row["wall_s"],
+            "cpu_s": row["cpu_s"],
+            "fps": round(frames / row["wall_s"], 2) if row["wall_s"] > 0 else None,
+            "peak_rss_mb": row["peak_rss_mb"],
+        }
+
+    return {
+        "scene": f"{width}x{height}-{frames}f",
+        "width": width,
+        "height": height,
+        "frames": frames,
+        "video_fps": args.fps,
+        "end_to_end": {
+            "wall_s": totals["wall_s"],
+            "cpu_s": totals["cpu_s"],
+            "fps": round(frames / totals["wall_s"], 2),
+            "peak_rss_mb": totals["peak_rss_mb"],
+            "children_peak_rss_mb": totals.get("children_peak_rss_mb"),
+            "repeats_wall_s": [run[0]["totals"]["wall_s"] for run in runs],
+            "stages": summary["stages"],
+        },
+        "stages": stages,
+    }
+
+
+def run_scene_subprocess(argv, size, seconds) -> dict:
+    """run_scene() in a fresh interpreter (same options, one scene), for clean memory numbers."""
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "scene.json"
+        cmd = [sys.executable, "-m", "benchmarks.pipeline", *argv,
+               "--sizes", f"{size[0]}x{size[1]}", "--seconds", str(seconds), "--in-process", "--json", str(out)]
+        subprocess.run(cmd, cwd=BACKEND_DIR, check=True)
+        return json.loads(out.read_text())["runs"][0]
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(640, 360), (1280, 720)],
+                        help="WIDTHxHEIGHT ...")
+    parser.add_argument("--seconds", type=float, nargs="+", default=[2.0])
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--products", nargs="+", default=list(DEFAULT_PRODUCTS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-parallel", type=int, default=2, help="as PIPELINE_MAX_PARALLEL_STAGES")
+    parser.add_argument("--cpu-threads", type=int, default=0, help="as PIPELINE_CPU_THREADS (0 = all cores)")
+    parser.add_argument("--render-workers", type=int, default=0, help="as PIPELINE_RENDER_WORKERS (0 = all cores)")
+    parser.add_argument("--render-incremental", action="store_true")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--player-model", default=None, help="YOLO weights (default: stub detector)")
+    parser.add_argument("--field-model", default=None, help="YOLO pitch keypoint weights (default: stub)")
+    parser.add_argument("--real-embedder", action="store_true", help="CLIP from Hugging Face instead of the stub")
+    parser.add_argument("--no-warmup", action="store_true")
+    parser.add_argument("--in-process", action="store_true", help="all scenes in this interpreter")
+    parser.add_argument("--json", dest="json_path", default=None, help="write the report here")
+    return parser
+
+
+def main(argv=None):
+    from .stubs import stub_models
+
+    argv = list(sys.argv[1:] if argv is None else argv)
+    args = build_parser().parse_args(argv)
+    for name in ("player_model", "field_model"):
+        if getattr(args, name):
+            setattr(args, name, str(Path(getattr(args, name)).resolve()))
+
+    scenes = [(size, seconds) for size in args.sizes for seconds in args.seconds]
+    runs = []
+    if args.in_process:
+        with stub_models(player=not args.player_model, field=not args.field_model, embedder=not args.real_embedder), \
+                tempfile.TemporaryDirectory() as tmp:
+            for (width, height), seconds in scenes:
+                work_dir = Path(tmp) / f"{width}x{height}_{seconds:g}s"
+                work_dir.mkdir()
+                runs.append(run_scene(args, width, height, seconds, work_dir))
+    else:
+        # the scene options are given again per scene; everything else is passed through
+        passthrough = _without(argv, ("--sizes", "--seconds", "--json"))
+        runs = [run_scene_subprocess(passthrough, size, seconds) for size, seconds in scenes]
+
+    for run in runs if args.in_process else ():  # scene subprocesses print their own line
+        e2e = run["end_to_end"]
+        slowest = sorted(run["stages"].items(), key=lambda item: -item[1]["wall_s"])[:3]
+        print(f"{run['scene']:18s} {e2e['fps']:7.2f} frames/s  {e2e['wall_s']:7.2f} s  "
+              f"peak {e2e['peak_rss_mb']:6.0f} MB  slowest: "
+              + ", ".join(f"{name} {row['wall_s']:.2f}s" for name, row in slowest))
+
+    report = {
+        "benchmark": "pipeline",
+        "schema": 1,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count()},
+        "models": {
+            "player": args.player_model or "stub",
+            "field": args.field_model or "stub",
+            "embedder": "clip" if args.real_embedder else "stub",
+        },
+        "options": {
+            "products": list(args.products), "repeat": args.repeat, "max_parallel": args.max_parallel,
+            "cpu_threads": args.cpu_threads, "render_workers": args.render_workers,
+            "render_incremental": args.render_incremental, "seed": args.seed, "warmup": not args.no_warmup,
+        },
+        "runs": runs,
+    }
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(report, indent=2))
+    return report
+
+
+def _without(argv, options):
+    """argv without the given options and their values."""
+    kept, skipping = [], False
+    for arg in argv:
+        if arg.startswith("--"):
+            skipping = arg.split("=", 1)[0] in options
+            if skipping:
+                continue
+        elif skipping:
+            continue
+        kept.append(arg)
+    return kept
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Deterministic stand-ins for the pipeline's models, for benchmarks.
+
+    StubPlayerDetector    YOLO players model: people and the ball of a
+                          benchmarks.synthetic frame, found by colour
+    StubFieldDetector     YOLO pitch model: the pitch vertices through the
+                          synthetic camera (confident where inside the frame)
+    StubEmbedder          CLIP: mean colour and a colour histogram of each crop
+
+They answer like the real ones (Ultralytics Results, CLIP features), so the
+tracker, team assignment and renderers run their real code on them, and they
+depend only on the pixels: the same video gives the same detections in any
+order, in any process.
+
+stub_models() swaps them in for the models not given real weights.
+"""
+from contextlib import ExitStack, contextmanager
+from unittest.mock import patch
+
+import cv2
+import numpy as np
+
+from .synthetic import COLORS, camera_homography, project
+
+PLAYER_NAMES = {0: "ball", 1: "goalkeeper", 2: "player", 3: "referee"}
+_CLASSES = {
+    "ball": 0, "goalkeeper_0": 1, "goalkeeper_1": 1, "team_0": 2, "team_1": 2, "referee": 3,
+}
+_TOLERANCE = 45
+
+
+def _results(image, names, boxes, keypoints=None):
+    import torch
+    from ultralytics.engine.results import Results
+    return Results(
+        image, path="", names=names,
+        boxes=torch.tensor(boxes, dtype=torch.float32).reshape(-1, 6),
+        keypoints=None if keypoints is None else torch.tensor(keypoints, dtype=torch.float32),
+    )
+
+
+class StubPlayerDetector:
+    names = PLAYER_NAMES
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    @staticmethod
+    def detect(image) -> list:
+        """[x1, y1, x2, y2, conf, class] of every blob in one of the synthetic colours."""
+        rows = []
+        area = image.shape[0] * image.shape[1]
+        for kind, color in COLORS.items():
+            lo = np.clip(np.array(color) - _TOLERANCE, 0, 255).astype(np.uint8)
+            hi = np.clip(np.array(color) + _TOLERANCE, 0, 255).astype(np.uint8)
+            mask = cv2.inRange(image, lo, hi)
+            count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+            min_area = 4 if kind == "ball" else max(6, area // 40000)
+            for x, y, w, h, n in stats[1:count]:
+                if n >= min_area:
+                    rows.append([x, y, x + w, y + h, 0.9, _CLASSES[kind]])
+        return rows
+
+    def predict(self, batch, conf=0.2, verbose=False, **kwargs):
+        return [_results(image, self.names, self.detect(image)) for image in batch]
+
+
+class StubFieldDetector:
+    names = {0: "pitch"}
+
+    def __init__(self, *args, **kwargs):
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+        self.vertices = np.asarray(SoccerPitchConfiguration().vertices, np.float32)
+        self._keypoints = {}
+
+    def keypoints(self, height: int, width: int) -> np.ndarray:
+        """(1, vertices, 3) x, y, confidence; the camera never moves, so once per frame size."""
+        key = (height, width)
+        if key not in self._keypoints:
+            from processingVideo.pitch.football import SoccerPitchConfiguration
+            xy = project(self.vertices, camera_homography(SoccerPitchConfiguration(), width, height))
+            inside = (xy[:, 0] >= 0) & (xy[:, 0] < width) & (xy[:, 1] >= 0) & (xy[:, 1] < height)
+            self._keypoints[key] = np.concatenate([xy, np.where(inside, 0.9, 0.1)[:, None]], axis=1)[None]
+        return self._keypoints[key]
+
+    def predict(self, batch, conf=0.3, verbose=False, **kwargs):
+        out = []
+        for image in batch:
+            h, w = image.shape[:2]
+            out.append(_results(image, self.names, [[0, 0, w, h, 0.9, 0]], self.keypoints(h, w)))
+        return out
+
+
+class StubEmbedder:
+    """CLIPModel and CLIPProcessor in one: from_pretrained() returns the stub itself."""
+    bins = 4
+
+    @classmethod
+    def from_pretrained(cls, *args, **kwargs):
+        return cls()
+
+    def to(self, device):
+        return self
+
+    def __call__(self, images, return_tensors="pt", **kwargs):
+        import torch
+
+        features = []
+        for image in images:
+            pixels = np.asarray(image, np.float32).reshape(-1, 3)
+            hist, _ = np.histogramdd(pixels, bins=self.bins, range=[(0, 256)] * 3)
+            features.append(np.concatenate([pixels.mean(axis=0) / 255.0, hist.ravel() / max(1, len(pixels))]))
+
+        class Batch:
+            pixel_values = torch.tensor(np.stack(features), dtype=torch.float32)
+        return Batch()
+
+    def get_image_features(self, pixel_values):
+        return pixel_values
+
+
+@contextmanager
+def stub_models(player: bool = True, field: bool = True, embedder: bool = True):
+    """Stubs in place of the players model, the pitch model and CLIP (each unless False)."""
+    import processingVideo.team_assigner.team as team
+    import processingVideo.tracker.tracker as tracker
+
+    with ExitStack() as stack:
+        if player:
+            stack.enter_context(patch.object(tracker, "YOLO", StubPlayerDetector))
+        if field:
+            # PitchAnnotator imports YOLO when it is built
+            stack.enter_context(patch("ultralytics.YOLO", StubFieldDetector))
+        if embedder:
+            stack.enter_context(patch.object(team, "CLIPModel", StubEmbedder))
+            stack.enter_context(patch.object(team, "CLIPProcessor", StubEmbedder))
+        yield
@@ -0,0 +1,171 @@
+"""
+Synthetic match videos for the pipeline benchmark.
+
+A fixed broadcast camera looks at the whole pitch (SoccerPitchConfiguration,
+seen in perspective): striped grass, the pitch lines, 22 players as blobs in
+two shirt colours, two goalkeepers, a referee and a ball passed from player
+to player. Everything is a function of the seed and the frame number, so the
+same arguments give the same video on every machine.
+
+The colours are the contract with benchmarks.stubs: the stub detector finds
+people and the ball by colour, the stub keypoint model projects the pitch
+vertices through camera_homography().
+
+    cd backend
+    python -m benchmarks.synthetic --size 1280x720 --seconds 5 --out match.avi
+"""
+import argparse
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+# BGR, far enough apart to survive video compression
+COLORS = {
+    "team_0": (40, 40, 220),
+    "team_1": (220, 120, 30),
+    "goalkeeper_0": (0, 230, 230),
+    "goalkeeper_1": (230, 230, 0),
+    "referee": (20, 20, 20),
+    "ball": (0, 140, 255),
+}
+SKIN = (150, 180, 220)
+GRASS = ((34, 139, 34), (44, 155, 44))
+LINE = (255, 255, 255)
+
+# image corners of the pitch (fractions of the frame) for the far and near touchlines
+_CORNERS = ((0.18, 0.12), (0.82, 0.12), (1.08, 0.98), (-0.08, 0.98))
+
+
+def camera_homography(config, width: int, height: int) -> np.ndarray:
+    """Pitch (cm) -> image (px) homography of the synthetic camera."""
+    pitch = np.float32([[0, 0], [config.length, 0], [config.length, config.width], [0, config.width]])
+    image = np.float32([[x * width, y * height] for x, y in _CORNERS])
+    return cv2.getPerspectiveTransform(pitch, image)
+
+
+def project(points, homography) -> np.ndarray:
+    points = np.asarray(points, np.float32).reshape(-1, 1, 2)
+    return cv2.perspectiveTransform(points, homography).reshape(-1, 2)
+
+
+class SyntheticMatch:
+    def __init__(self, width: int = 1280, height: int = 720, frames: int = 125, fps: float = 25.0,
+                 players_per_team: int = 11, seed: int = 0):
+        from processingVideo.pitch.football import SoccerPitchConfiguration
+
+        self.width, self.height, self.frames, self.fps = width, height, frames, fps
+        self.config = SoccerPitchConfiguration()
+        self.homography = camera_homography(self.config, width, height)
+        rng = np.random.default_rng(seed)
+
+        # outfield players around a formation, goalkeepers near their goal, one referee
+        L, W = self.config.length, self.config.width
+        outfield = players_per_team - 1
+        homes, kinds = [], []
+        for team in (0, 1):
+            xs = rng.uniform(0.12, 0.48, outfield) * L
+            ys = (np.arange(outfield) + 0.5) / outfield * W
+            homes.append(np.stack([xs if team == 0 else L - xs, ys], axis=1))
+            kinds += [f"team_{team}"] * outfield
+        homes.append(np.array([[0.04 * L, W / 2], [0.96 * L, W / 2], [L / 2, 0.3 * W]]))
+        kinds += ["goalkeeper_0", "goalkeeper_1", "referee"]
+        self.homes = np.concatenate(homes)
+        self.kinds = kinds
+        n = len(self.homes)
+        self.amplitude = rng.uniform(200, 900, (n, 2))
+        self.period = rng.uniform(3, 9, (n, 2))
+        self.phase = rng.uniform(0, 2 * np.pi, (n, 2))
+
+        # the ball goes from carrier to carrier, one pass every `pass_frames`
+        self.pass_frames = max(2, int(1.2 * fps))
+        self.carriers = rng.integers(0, 2 * outfield, frames // self.pass_frames + 2)
+
+        self.background = self._background(rng)
+
+    def positions(self, f: int) -> np.ndarray:
+        """(people, 2) pitch positions (cm) at frame f."""
+        t = f / self.fps
+        drift = self.amplitude * np.sin(2 * np.pi * t / self.period + self.phase)
+        pos = self.homes + drift
+        return np.clip(pos, [100, 100], [self.config.length - 100, self.config.width - 100])
+
+    def ball(self, f: int) -> np.ndarray:
+        k, step = divmod(f, self.pass_frames)
+        start = self.positions(f)[self.carriers[k]]
+        travel = max(0.0, step / self.pass_frames - 0.5) * 2  # carried half the time, then passed
+        end = self.positions((k + 1) * self.pass_frames)[self.carriers[k + 1]]
+        return start + (end - start) * travel + np.array([60.0, 0.0])
+
+    def _background(self, rng) -> np.ndarray:
+        img = np.empty((self.height, self.width, 3), np.uint8)
+        img[:] = GRASS[0]
+        L, W = self.config.length, self.config.width
+        bands = 12
+        for b in range(0, bands, 2):
+            corners = [[b * L / bands, 0], [(b + 1) * L / bands, 0], [(b + 1) * L / bands, W], [b * L / bands, W]]
+            cv2.fillPoly(img, [np.round(project(corners, self.homography)).astype(np.int32)], GRASS[1])
+        noise = rng.integers(-6, 7, img.shape, dtype=np.int16)
+        img = np.clip(img.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+        thickness = max(1, round(self.height / 360))
+        vertices = np.asarray(self.config.vertices, np.float32)
+        for a, b in self.config.edges:
+            p, q = np.round(project(vertices[[a - 1, b - 1]], self.homography)).astype(int)
+            cv2.line(img, tuple(p), tuple(q), LINE, thickness, cv2.LINE_AA)
+        angles = np.linspace(0, 2 * np.pi, 72)
+        circle = np.stack([L / 2 + self.config.centre_circle_radius * np.cos(angles),
+                           W / 2 + self.config.centre_circle_radius * np.sin(angles)], axis=1)
+        cv2.polylines(img, [np.round(project(circle, self.homography)).astype(np.int32)], True, LINE, thickness,
+                      cv2.LINE_AA)
+        return img
+
+    def frame(self, f: int) -> np.ndarray:
+        img = self.background.copy()
+        feet = project(self.positions(f), self.homography)
+        # far players first, so near ones are drawn over them
+        for i in np.argsort(feet[:, 1]):
+            x, y = feet[i]
+            h = self.height * (0.03 + 0.06 * y / self.height)
+            w = 0.4 * h
+            cv2.rectangle(img, (int(x - w / 2), int(y - 0.8 * h)), (int(x + w / 2), int(y)), COLORS[self.kinds[i]], -1)
+            cv2.circle(img, (int(x), int(y - 0.9 * h)), max(1, int(w / 3)), SKIN, -1, cv2.LINE_AA)
+        bx, by = project([self.ball(f)], self.homography)[0]
+        cv2.circle(img, (int(bx), int(by)), max(2, round(self.height / 160)), COLORS["ball"], -1)
+        return img
+
+    def __iter__(self):
+        return (self.frame(f) for f in range(self.frames))
+
+    def write(self, path) -> str:
+        from processingVideo.utils import open_video_writer
+        writer = open_video_writer(str(path), (self.height, self.width, 3), fps=self.fps)
+        try:
+            for image in self:
+                writer.write(image)
+        finally:
+            writer.release()
+        return str(path)
+
+
+def parse_size(text: str):
+    width, height = (int(v) for v in text.lower().split("x"))
+    return width, height
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size", type=parse_size, default=(1280, 720), help="WIDTHxHEIGHT")
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--fps", type=float, default=25.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="synthetic_match.avi")
+    args = parser.parse_args(argv)
+
+    width, height = args.size
+    match = SyntheticMatch(width, height, int(round(args.seconds * args.fps)), args.fps, seed=args.seed)
+    print(f"wrote {match.write(Path(args.out))} ({match.frames} frames, {width}x{height})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Voronoi control map benchmark.
+
+Times draw_pitch_voronoi_diagram_2 per engine ("broadcast": N x H' x W'
+distance tensor, "edt": distance transform over seeded cells) for a range of
+grid steps and players per team, on random positions over the pitch, plus the
+per-frame cost of VoronoiBoard.render_block on blocks of frames. Also reports
+how far the edt image is from the exact broadcast one.
+
+    cd backend
+    python -m benchmarks.voronoi --steps 1 2 3 4 --players 5 11 22 --json voronoi.json
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+
+ENGINES = ("broadcast", "edt")
+
+
+def time_call(fn, repeat: int) -> float:
+    fn()  # warm-up (grid cache, allocator)
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main(argv=None):
+    from processingVideo.pitch.football import SoccerPitchConfiguration
+    from processingVideo.pitch.pitch import draw_pitch, draw_pitch_voronoi_diagram_2
+    from processingVideo.pitch.voronoi import VoronoiBoard
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--steps", type=int, nargs="+", default=[1, 2, 3, 4])
+    parser.add_argument("--players", type=int, nargs="+", default=[5, 11, 22],
+                        help="players per team")
+    parser.add_argument("--block", type=int, default=8, help="frames per render_block call")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", default=None, help="write the summary here")
+    args = parser.parse_args(argv)
+
+    config = SoccerPitchConfiguration()
+    base = draw_pitch(config)
+    rng = np.random.default_rng(args.seed)
+    hi = [config.length, config.width]
+
+    results = []
+    for n in args.players:
+        team_1 = rng.uniform([0, 0], hi, (n, 2)).astype(np.float32)
+        team_2 = rng.uniform([0, 0], hi, (n, 2)).astype(np.float32)
+        for step in args.steps:
+            row = {"players_per_team": n, "step": step}
+            images = {}
+            for engine in ENGINES:
+                def run(engine=engine):
+                    images[engine] = draw_pitch_voronoi_diagram_2(
+                        config, team_1, team_2, pitch=base.copy(), step=step, engine=engine
+                    )
+                row[f"{engine}_ms"] = 1000.0 * time_call(run, args.repeat)
+
+            board = VoronoiBoard(config, pitch=base, step=step, block_size=args.block)
+            block_xy = np.concatenate([team_1, team_2])[None].repeat(args.block, axis=0)
+            block_teams = np.repeat([[0] * n + [1] * n], args.block, axis=0)
+            row["block_ms_per_frame"] = 1000.0 * time_call(
+                lambda: board.render_block(block_xy, block_teams), args.repeat
+            ) / args.block
+
+            diff = np.abs(images["edt"].astype(np.int16) - images["broadcast"].astype(np.int16)).max(axis=-1)
+            row["speedup"] = row["broadcast_ms"] / row["edt_ms"]
+            row["max_pixel_diff"] = int(diff.max())
+            row["pixels_off_by_more_than_2"] = float((diff > 2).mean())
+            results.append(row)
+
+            print(f"players/team {n:3d}  step {step}  "
+                  f"broadcast {row['broadcast_ms']:7.1f} ms  edt {row['edt_ms']:6.1f} ms  "
+                  f"block {row['block_ms_per_frame']:6.1f} ms/frame  "
+                  f"x{row['speedup']:.1f}  max diff {row['max_pixel_diff']}")
+
+    summary = {"benchmark": "voronoi", "repeat": args.repeat, "results": results}
+    if args.json_path:
+        Path(args.json_path).write_text(json.dumps(summary, indent=2))
+    return summary
+
+
+if __name__ == "__main__":
+    main()
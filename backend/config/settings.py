@@ -140,6 +140,49 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 CELERY_BROKER_URL = os.getenv("CELERY_BROKER_URL", "redis://redis:6379/0")
 CELERY_RESULT_BACKEND = os.getenv("CELERY_RESULT_BACKEND", "redis://redis:6379/0")
 
+# A job runs as a chain of two tasks (see api.dispatch): model inference on the
+# inference queue, then rendering on the render queue, so each pool is sized on its own.
+PIPELINE_INFERENCE_QUEUE = os.getenv("PIPELINE_INFERENCE_QUEUE", "inference")
+PIPELINE_RENDER_QUEUE = os.getenv("PIPELINE_RENDER_QUEUE", "render")
+CELERY_TASK_ROUTES = {
+    "api.tasks.run_inference_task": {"queue": PIPELINE_INFERENCE_QUEUE},
+    "api.tasks.run_render_task": {"queue": PIPELINE_RENDER_QUEUE},
+    "api.tasks.run_segment_task": {"queue": PIPELINE_INFERENCE_QUEUE},
+    "api.tasks.run_stitch_task": {"queue": PIPELINE_RENDER_QUEUE},
+    "api.tasks.run_render_segment_task": {"queue": PIPELINE_RENDER_QUEUE},
+    "api.tasks.run_concat_task": {"queue": PIPELINE_RENDER_QUEUE},
+}
+# Longest upload accepted. Videos longer than one segment are split into overlapping
+# segments processed on parallel workers, and their track ids stitched over the overlap.
+MAX_VIDEO_SECONDS = float(os.getenv("MAX_VIDEO_SECONDS", str(2 * 60 * 60)))
+PIPELINE_SEGMENT_SECONDS = float(os.getenv("PIPELINE_SEGMENT_SECONDS", "30"))
+PIPELINE_SEGMENT_OVERLAP_SECONDS = float(os.getenv("PIPELINE_SEGMENT_OVERLAP_SECONDS", "2"))
+
+# Jobs uploaded with ?match=... reuse the team model fitted by the first clip of that match.
+# When enabled, every later clip also refines the stored cluster centres with its own crops.
+TEAM_MODEL_INCREMENTAL_UPDATE = os.getenv("TEAM_MODEL_INCREMENTAL_UPDATE", "0") == "1"
+
+# Independent pipeline stages (tracking -> teams vs. pitch keypoints) run concurrently
+# on the worker; the CPU threads (0 = all cores) are split evenly between them.
+PIPELINE_MAX_PARALLEL_STAGES = int(os.getenv("PIPELINE_MAX_PARALLEL_STAGES", "2"))
+PIPELINE_CPU_THREADS = int(os.getenv("PIPELINE_CPU_THREADS", "0"))
+# Render processes (frame chunks rendered in a pool); 0 = one per core, 1 = in-process.
+PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", "0"))
+# Reuse the Voronoi / tactical boards of the previous frame where the players barely moved
+# (approximate within a few decimetres on the pitch, so off by default). A render worker
+# starts its boards over at every chunk that does not follow its last one, so with
+# PIPELINE_RENDER_WORKERS > 1 frames are reused less and the video differs from a
+# one-worker render, within the same bound.
+PIPELINE_RENDER_INCREMENTAL = os.getenv("PIPELINE_RENDER_INCREMENTAL", "0") == "1"
+# Detections, tracks, team labels and pitch keypoints are cached across jobs under
+# MEDIA_ROOT/cache/stages, keyed by the video and model contents; least recently used
+# entries are evicted past this size (0 = no cache).
+PIPELINE_CACHE_MAX_BYTES = int(os.getenv("PIPELINE_CACHE_MAX_BYTES", str(2 * 1024 ** 3)))
+# Run every job under the sampling profiler (a single job: upload with ?profile=1). Call tree,
+# flame graph stacks and the time per component go to outputs/<id>/profile/, one set per task.
+PIPELINE_PROFILE = os.getenv("PIPELINE_PROFILE", "0") == "1"
+PIPELINE_PROFILE_INTERVAL_MS = float(os.getenv("PIPELINE_PROFILE_INTERVAL_MS", "5"))
+
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
@@ -1,10 +1,25 @@
-from .utils import read_video, save_video
-from .tracker import Tracker
-from .team_assigner import TeamAssigner
-from .pitch import PitchAnnotator, SoccerPitchConfiguration
-
+import importlib
 from pathlib import Path
 
+# Public names are resolved on first access so that importing the package (or
+# a light submodule such as pitch.football) does not pull in torch, ultralytics,
+# transformers or UMAP.
+_LAZY_ATTRS = {
+    "read_video": ".utils",
+    "save_video": ".utils",
+    "Tracker": ".tracker",
+    "TeamAssigner": ".team_assigner",
+    "PitchAnnotator": ".pitch",
+    "SoccerPitchConfiguration": ".pitch",
+}
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 PKG_DIR: Path = Path(__file__).resolve().parent
 models_dir: Path = PKG_DIR / "models"
 #remove later
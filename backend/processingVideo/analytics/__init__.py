@@ -0,0 +1,5 @@
+from .positions import OBJECTS, concat_columns, frame_homographies, project_tracks
+from .physical import physical_metrics
+from .heatmap import HeatmapAccumulator, accumulate_heatmaps
+from .proximity import FrameIndex, ball_per_frame, pressure_metrics
+from .events import EVENT_KINDS, possession_events, possession_spells, possessors, run_lengths
@@ -0,0 +1,121 @@
+"""
+Possession spells, chains and pass events.
+
+The per-frame possessor (the track marked 'has_ball' by
+Tracker.assign_ball_possession, -1 while the ball is free) is run-length
+encoded into spells. A run shorter than `min_frames` between two runs of
+the same player is flicker between nearby players and is dropped so the
+player's spell goes on; other spells that short are not possession.
+Consecutive spells make the events:
+
+    pass          same team, another player
+    interception  other team, the ball travelled at least `min_pass` (pitch units)
+    loss          other team otherwise (tackle, dispossession, unknown travel)
+
+and a chain is a run of spells of one team. Everything is NumPy run-length
+and diff work on (F,) arrays, linear in the number of frames.
+"""
+import numpy as np
+
+EVENT_KINDS = ("pass", "interception", "loss")
+
+
+def run_lengths(values: np.ndarray):
+    """(starts, lengths, values) of the runs of equal consecutive values."""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.int64), values[:0]
+    starts = np.flatnonzero(np.r_[True, values[1:] != values[:-1]])
+    lengths = np.diff(np.r_[starts, len(values)])
+    return starts, lengths, values[starts]
+
+
+def possessors(tracks: dict):
+    """(F,) track id on the ball and (F,) its team, -1 when nobody has it."""
+    n_frames = len(tracks["players"])
+    track = np.full(n_frames, -1, dtype=np.int64)
+    team = np.full(n_frames, -1, dtype=np.int64)
+    for frame_num in range(n_frames):
+        for name in ("players", "goalkeepers"):
+            for track_id, info in tracks[name][frame_num].items():
+                if info.get("has_ball"):
+                    track[frame_num] = track_id
+                    team[frame_num] = info.get("team", -1)
+    return track, team
+
+
+def _merge(start, stop, frames, owner):
+    """Joins consecutive spells of the same owner."""
+    first = np.r_[True, owner[1:] != owner[:-1]] if len(owner) else np.empty(0, bool)
+    group = np.cumsum(first) - 1
+    merged_stop = np.zeros(int(first.sum()), dtype=np.int64)
+    np.maximum.at(merged_stop, group, stop)
+    return start[first], merged_stop, np.bincount(group, weights=frames).astype(np.int64), owner[first]
+
+
+def possession_spells(track: np.ndarray, team: np.ndarray, min_frames: int = 3) -> dict:
+    """
+    Spells of possession as columns {"track", "team", "start", "stop",
+    "frames", "chain"}: frames [start, stop) of which `frames` with the ball
+    seen at the player's feet, chain = index of the team's possession chain.
+    """
+    track = np.asarray(track, dtype=np.int64)
+    team = np.asarray(team, dtype=np.int64)
+
+    # 1) runs of one possessor, without the free-ball frames
+    start, frames, owner = run_lengths(track)
+    held = owner >= 0
+    start, frames, owner = start[held], frames[held], owner[held]
+    stop = start + frames
+
+    # 2) flicker: a short run between two runs of the same player is dropped and they merge
+    short = frames < min_frames
+    same_around = np.zeros(len(owner), dtype=bool)
+    same_around[1:-1] = owner[:-2] == owner[2:]
+    keep = ~(short & same_around)
+    start, stop, frames, owner = _merge(start[keep], stop[keep], frames[keep], owner[keep])
+
+    # 3) what is still short is no possession; merge again around it
+    keep = frames >= min_frames
+    start, stop, frames, owner = _merge(start[keep], stop[keep], frames[keep], owner[keep])
+    owner_team = team[start]
+
+    # 4) chains: runs of one team
+    new_chain = np.r_[True, owner_team[1:] != owner_team[:-1]] if len(owner) else np.empty(0, bool)
+    return {
+        "track": owner,
+        "team": owner_team,
+        "start": start,
+        "stop": stop,
+        "frames": frames,
+        "chain": np.cumsum(new_chain) - 1,
+    }
+
+
+def possession_events(spells: dict, ball_xy: np.ndarray, min_pass: float = 300.0) -> dict:
+    """
+    Events between consecutive spells as columns {"kind" (index into
+    EVENT_KINDS), "start", "end" (last frame of the first spell, first frame
+    of the next), "from_track", "to_track", "from_team", "to_team",
+    "distance" (ball travel in pitch units, NaN when unknown)}.
+    """
+    ball_xy = np.asarray(ball_xy, dtype=np.float64).reshape(-1, 2)
+    a, b = slice(None, -1), slice(1, None)
+    start = spells["stop"][a] - 1
+    end = spells["start"][b]
+    distance = np.hypot(*(ball_xy[end] - ball_xy[start]).T) if len(end) else np.empty(0)
+
+    same_team = spells["team"][a] == spells["team"][b]
+    with np.errstate(invalid="ignore"):
+        travelled = distance >= min_pass
+    kind = np.where(same_team, 0, np.where(travelled, 1, 2)).astype(np.int8)
+    return {
+        "kind": kind,
+        "start": start,
+        "end": end,
+        "from_track": spells["track"][a],
+        "to_track": spells["track"][b],
+        "from_team": spells["team"][a],
+        "to_team": spells["team"][b],
+        "distance": distance.astype(np.float32),
+    }
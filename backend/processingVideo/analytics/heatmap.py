@@ -0,0 +1,152 @@
+"""
+Occupancy heatmaps in pitch space.
+
+HeatmapAccumulator bins pitch positions into a grid of `cell` x `cell`
+pitch units over SoccerPitchConfiguration's length and width, per team and
+per track id. Every update() takes a block of rows (any number of frames)
+and adds it with one bincount, so memory depends on the grid and the
+number of tracks, never on the clip length. Cells hold seconds of
+presence, which makes heatmaps of different jobs (or clips of one long
+match) merge by plain addition:
+
+    total = HeatmapAccumulator.load(a) + HeatmapAccumulator.load(b)
+
+render() draws a heatmap over the cached base pitch on demand.
+"""
+from pathlib import Path
+
+import numpy as np
+
+from ..pitch.football import SoccerPitchConfiguration
+
+
+class HeatmapAccumulator:
+    def __init__(self, config: SoccerPitchConfiguration, cell: float = 100.0, teams: int = 2):
+        self.config = config
+        self.cell = float(cell)
+        self.nx = int(np.ceil(config.length / self.cell))
+        self.ny = int(np.ceil(config.width / self.cell))
+        self.team = np.zeros((teams, self.ny, self.nx), dtype=np.float32)
+        self.tracks = {}  # track id -> (ny, nx) float32
+
+    @property
+    def shape(self):
+        return self.ny, self.nx
+
+    def _cells(self, xy: np.ndarray):
+        """Flat cell index of every position and whether it is on the pitch (within a cell of it)."""
+        xy = np.asarray(xy, dtype=np.float64).reshape(-1, 2)
+        with np.errstate(invalid="ignore"):
+            ix = np.floor(xy[:, 0] / self.cell)
+            iy = np.floor(xy[:, 1] / self.cell)
+            valid = (ix >= -1) & (ix <= self.nx) & (iy >= -1) & (iy <= self.ny)
+        ix = np.clip(np.nan_to_num(ix), 0, self.nx - 1).astype(np.int64)
+        iy = np.clip(np.nan_to_num(iy), 0, self.ny - 1).astype(np.int64)
+        return iy * self.nx + ix, valid
+
+    def update(self, xy, track_id, team, weight: float = 1.0) -> "HeatmapAccumulator":
+        """
+        Adds a block of rows: (M, 2) pitch positions with their track ids and
+        teams (-1 = none, counted per track only). `weight` is the time one
+        row stands for, 1 / fps.
+        """
+        cells, valid = self._cells(xy)
+        track_id = np.asarray(track_id, dtype=np.int64)[valid]
+        team = np.asarray(team, dtype=np.int64)[valid]
+        cells = cells[valid]
+        size = self.ny * self.nx
+
+        in_team = (team >= 0) & (team < len(self.team))
+        self.team += weight * np.bincount(
+            team[in_team] * size + cells[in_team], minlength=len(self.team) * size,
+        ).reshape(self.team.shape).astype(np.float32)
+
+        ids, index = np.unique(track_id, return_inverse=True)
+        counts = np.bincount(index * size + cells, minlength=len(ids) * size).reshape(len(ids), self.ny, self.nx)
+        for track, grid in zip(ids.tolist(), counts):
+            heat = self.tracks.get(track)
+            if heat is None:
+                heat = self.tracks[track] = np.zeros(self.shape, dtype=np.float32)
+            heat += weight * grid
+        return self
+
+    def __iadd__(self, other: "HeatmapAccumulator") -> "HeatmapAccumulator":
+        if (other.cell, other.shape) != (self.cell, self.shape):
+            raise ValueError("heatmaps with different grids cannot be merged")
+        self.team += other.team
+        for track, heat in other.tracks.items():
+            if track in self.tracks:
+                self.tracks[track] += heat
+            else:
+                self.tracks[track] = heat.copy()
+        return self
+
+    def __add__(self, other: "HeatmapAccumulator") -> "HeatmapAccumulator":
+        total = HeatmapAccumulator(self.config, self.cell, len(self.team))
+        total += self
+        total += other
+        return total
+
+    # --- storage --------------------------------------------------------------
+
+    def save(self, path) -> str:
+        track_ids = np.array(sorted(self.tracks), dtype=np.int64)
+        np.savez_compressed(
+            path,
+            cell=np.float32(self.cell),
+            team=self.team,
+            track_ids=track_ids,
+            tracks=(np.stack([self.tracks[t] for t in track_ids.tolist()]) if len(track_ids)
+                    else np.zeros((0,) + self.shape, dtype=np.float32)),
+        )
+        return str(path)
+
+    @classmethod
+    def load(cls, path, config: SoccerPitchConfiguration = None) -> "HeatmapAccumulator":
+        with np.load(Path(path)) as data:
+            acc = cls(config or SoccerPitchConfiguration(), float(data["cell"]), len(data["team"]))
+            if acc.team.shape != data["team"].shape:
+                raise ValueError("heatmap grid does not match the pitch configuration")
+            acc.team[:] = data["team"]
+            acc.tracks = {int(t): heat for t, heat in zip(data["track_ids"], data["tracks"])}
+        return acc
+
+    # --- drawing --------------------------------------------------------------
+
+    def render(self, heat: np.ndarray, opacity: float = 0.6, padding: int = 50, scale: float = 0.1) -> np.ndarray:
+        """`heat` (one of self.team / self.tracks) as a colour map over the base pitch."""
+        import cv2
+        from ..pitch.pitch import base_pitch
+
+        image = base_pitch(self.config, padding=padding, scale=scale).copy()
+        peak = float(heat.max()) if heat.size else 0.0
+        if peak <= 0:
+            return image
+
+        h, w = int(self.config.width * scale), int(self.config.length * scale)
+        level = cv2.resize(heat / peak, (w, h), interpolation=cv2.INTER_LINEAR)
+        level = cv2.GaussianBlur(level, (0, 0), sigmaX=self.cell * scale)
+        level = np.clip(level / max(float(level.max()), 1e-6), 0, 1)
+        colors = cv2.applyColorMap((level * 255).astype(np.uint8), cv2.COLORMAP_JET)
+
+        region = image[padding:padding + h, padding:padding + w]
+        alpha = (opacity * level)[..., None]
+        region[:] = (region * (1 - alpha) + colors * alpha).astype(np.uint8)
+        return image
+
+
+def accumulate_heatmaps(columns: dict, fps: float, config: SoccerPitchConfiguration,
+                        cell: float = 100.0, block_frames: int = 256) -> HeatmapAccumulator:
+    """Heatmaps of analytics.positions columns, one update per block of frames."""
+    acc = HeatmapAccumulator(config, cell)
+    frame = np.asarray(columns["frame"])
+    order = np.argsort(frame, kind="stable")
+    frame = frame[order]
+    if not len(frame):
+        return acc
+    bounds = np.searchsorted(frame, np.arange(0, frame[-1] + block_frames + 1, block_frames))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        if hi > lo:
+            rows = order[lo:hi]
+            acc.update(columns["xy"][rows], columns["track_id"][rows], columns["team"][rows], weight=1.0 / fps)
+    return acc
@@ -0,0 +1,162 @@
+"""
+Physical metrics per track: distance, speed, sprints, accelerations.
+
+physical_metrics() works on the columns of analytics.positions in one pass
+over all rows, whatever the number of tracks:
+
+1) rows are sorted by (track, frame) and cut into segments wherever the
+   track changes, the position is unknown or the track was lost for longer
+   than `max_gap` seconds;
+2) positions, and the speeds before the accelerations, are smoothed with a
+   centred moving average that stays inside its segment, narrowing evenly
+   towards the segment ends (prefix sums, so the cost does not depend on the
+   window);
+3) speeds and accelerations are finite differences over consecutive rows;
+   steps faster than `max_speed` are detection glitches and are dropped;
+4) totals per track are bincounts over the track index, sprints are runs of
+   steps above `sprint_speed` lasting at least `sprint_min` seconds.
+
+Pitch units are cm; results are in metres, seconds, km/h and m/s².
+"""
+import numpy as np
+
+SPRINT_SPEED = 25.2 / 3.6   # m/s
+ACCEL_BANDS = (-3.0, -1.0, 1.0, 3.0)  # m/s², edges of the acceleration profile
+
+
+def _runs(flags: np.ndarray, breaks: np.ndarray):
+    """Run id (0 = not in a run) of every True in `flags`; runs never cross a break."""
+    start = flags & (breaks | ~np.r_[False, flags[:-1]])
+    run = np.cumsum(start)
+    return np.where(flags, run, 0), int(run[-1]) if len(run) else 0
+
+
+def _segments(new_segment: np.ndarray):
+    """Start and stop row of the segment of every row; a segment starts at each True."""
+    first = np.flatnonzero(new_segment)
+    seg = np.cumsum(new_segment) - 1
+    return first[seg], np.r_[first[1:], len(new_segment)][seg]
+
+
+def _smooth(values: np.ndarray, new_segment: np.ndarray, half: int) -> np.ndarray:
+    """
+    Centred moving average of 2*half+1 rows. Near the segment ends the window
+    shrinks on both sides alike, so it stays centred and steady motion is not
+    pulled back there (a window cut on one side only reads as an acceleration).
+    """
+    if half <= 0 or len(values) == 0:
+        return values
+    seg_start, seg_stop = _segments(new_segment)
+    idx = np.arange(len(values))
+    h = np.minimum(half, np.minimum(idx - seg_start, seg_stop - 1 - idx))
+    lo = idx - h
+    hi = idx + h
+    cs = np.concatenate([np.zeros((1,) + values.shape[1:]), np.cumsum(values, axis=0)])
+    count = (hi - lo + 1).reshape((-1,) + (1,) * (values.ndim - 1))
+    return (cs[hi + 1] - cs[lo]) / count
+
+
+def physical_metrics(
+    columns: dict,
+    fps: float,
+    smooth: float = 0.5,          # s, moving-average window
+    max_gap: float = 0.5,         # s, longer gaps split the track
+    max_speed: float = 12.0,      # m/s, faster steps are glitches
+    sprint_speed: float = SPRINT_SPEED,
+    sprint_min: float = 1.0,      # s
+    accel_bands=ACCEL_BANDS,
+) -> list:
+    """
+    `columns`: {"frame", "track_id", "team", "xy"} (see analytics.positions).
+    Returns one dict per track, ordered by track id.
+    """
+    frame = np.asarray(columns["frame"], dtype=np.int64)
+    track_id = np.asarray(columns["track_id"], dtype=np.int64)
+    team = np.asarray(columns["team"], dtype=np.int64)
+    xy = np.asarray(columns["xy"], dtype=np.float64) / 100.0  # cm -> m
+
+    # 1) sort and segment
+    known = np.isfinite(xy).all(axis=1)
+    order = np.lexsort((frame[known], track_id[known]))
+    frame, track_id, team, xy = frame[known][order], track_id[known][order], team[known][order], xy[known][order]
+    ids, track = np.unique(track_id, return_inverse=True)
+    n, T = len(frame), len(ids)
+    if n == 0:
+        return []
+
+    gap = np.diff(frame)
+    new_segment = np.r_[True, (np.diff(track) != 0) | (gap > max(1, round(max_gap * fps)))]
+
+    # 2) smoothed positions
+    half = int(round(smooth * fps)) // 2
+    xy = _smooth(xy, new_segment, half)
+
+    # 3) steps between consecutive rows of a segment
+    same = ~new_segment[1:]
+    dt = np.where(same, gap, 1) / fps
+    dist = np.hypot(*np.diff(xy, axis=0).T)
+    speed = dist / dt
+    ok = same & (speed <= max_speed)
+    step_track = track[1:]
+    step_breaks = np.r_[True, ~(ok[:-1] & ok[1:])] if len(ok) else ok
+
+    # accelerations from the speed smoothed once more (differences amplify the jitter)
+    accel = np.diff(_smooth(np.where(ok, speed, 0.0), step_breaks, half)) / dt[1:]
+    accel_ok = ok[:-1] & ok[1:]
+
+    # 4) per-track totals
+    def per_track(weights, mask):
+        return np.bincount(step_track[mask], weights=weights[mask], minlength=T)
+
+    distance = per_track(dist, ok)
+    seconds = per_track(dt, ok)
+    max_speed_t = np.zeros(T)
+    np.maximum.at(max_speed_t, step_track[ok], speed[ok])
+
+    sprinting = ok & (speed >= sprint_speed)
+    run, n_runs = _runs(sprinting, step_breaks)
+    run_time = np.bincount(run, weights=dt, minlength=n_runs + 1)
+    run_dist = np.bincount(run, weights=dist, minlength=n_runs + 1)
+    run_track = np.zeros(n_runs + 1, dtype=np.int64)
+    run_track[run] = step_track
+    long_run = run_time >= sprint_min
+    long_run[0] = False
+    sprints = np.bincount(run_track[long_run], minlength=T)
+    sprint_distance = np.bincount(run_track[long_run], weights=run_dist[long_run], minlength=T)
+
+    accel_track = step_track[1:][accel_ok]
+    a = accel[accel_ok]
+    band = np.digitize(a, accel_bands)
+    n_bands = len(accel_bands) + 1
+    band_time = np.bincount(accel_track * n_bands + band, weights=dt[1:][accel_ok],
+                            minlength=T * n_bands).reshape(T, n_bands)
+    max_accel = np.zeros(T)
+    max_decel = np.zeros(T)
+    np.maximum.at(max_accel, accel_track, a)
+    np.minimum.at(max_decel, accel_track, a)
+
+    # majority team of every track
+    team_votes = np.bincount(track * 3 + np.clip(team + 1, 0, 2), minlength=T * 3).reshape(T, 3)
+    track_team = team_votes[:, 1:].argmax(axis=1)
+    track_team[team_votes[:, 1:].sum(axis=1) == 0] = -1
+
+    edges = [-np.inf, *accel_bands, np.inf]
+    band_names = [f"{lo:g}..{hi:g}" for lo, hi in zip(edges[:-1], edges[1:])]
+    rows = np.bincount(track, minlength=T)
+    return [
+        {
+            "track_id": int(ids[t]),
+            "team": int(track_team[t]),
+            "frames": int(rows[t]),
+            "seconds": float(seconds[t]),
+            "distance_m": float(distance[t]),
+            "max_speed_kmh": float(max_speed_t[t] * 3.6),
+            "mean_speed_kmh": float(distance[t] / seconds[t] * 3.6) if seconds[t] > 0 else 0.0,
+            "sprints": int(sprints[t]),
+            "sprint_distance_m": float(sprint_distance[t]),
+            "max_accel": float(max_accel[t]),
+            "max_decel": float(max_decel[t]),
+            "accel_seconds": {name: float(s) for name, s in zip(band_names, band_time[t])},
+        }
+        for t in range(T)
+    ]
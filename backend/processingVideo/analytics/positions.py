@@ -0,0 +1,81 @@
+"""
+Track positions in pitch coordinates, as columns.
+
+project_tracks() flattens the per-frame track dicts into one row per
+detection and projects every row with its frame's homography in a single
+vectorized pass, so the analytics work on plain arrays:
+
+    {object: {"frame": (M,) int64, "track_id": (M,) int64,
+              "team": (M,) int64 (-1 when unknown), "xy": (M, 2) float32}}
+
+`xy` is in pitch units (cm), NaN where the frame has no homography.
+"""
+import numpy as np
+
+OBJECTS = ("players", "goalkeepers", "referees", "ball")
+
+
+def frame_homographies(pitch_keypoints, config, kp_thresh: float = 0.5) -> np.ndarray:
+    """(F, 3, 3) image -> pitch homographies, NaN for frames without one."""
+    from ..pitch import PitchAnnotator
+    pitch_ann = PitchAnnotator(CONFIG=config, model_path=None)
+    homographies = np.full((len(pitch_keypoints), 3, 3), np.nan, dtype=np.float64)
+    for i, result in enumerate(pitch_keypoints):
+        transformer = pitch_ann.image_to_pitch(result, kp_thresh)
+        if transformer is not None and transformer.m is not None:
+            homographies[i] = transformer.m
+    return homographies
+
+
+def image_point(info):
+    """The image point PitchAnnotator.tx projects for a track entry, or None."""
+    p = info.get("position") or info.get("xy") or info.get("center")
+    if p is None:
+        box = info.get("bbox") or info.get("xyxy") or info.get("box")
+        if box is not None and len(box) == 4:
+            x1, y1, x2, y2 = map(float, box)
+            p = ((x1 + x2) * 0.5, (y1 + y2) * 0.5)
+    return p
+
+
+def project_points(points: np.ndarray, homographies: np.ndarray) -> np.ndarray:
+    """(M, 2) image points through their own (M, 3, 3) homographies -> (M, 2) float32."""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    h = np.concatenate([points, np.ones((len(points), 1))], axis=1)
+    v = np.einsum("mij,mj->mi", homographies, h)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (v[:, :2] / v[:, 2:3]).astype(np.float32)
+
+
+def project_tracks(tracks: dict, homographies: np.ndarray, objects=OBJECTS) -> dict:
+    """Columns of every tracked object in pitch coordinates (see module doc)."""
+    columns = {}
+    for name in objects:
+        frames, ids, teams, points = [], [], [], []
+        for frame_idx, frame_tracks in enumerate(tracks.get(name, [])):
+            for track_id, info in frame_tracks.items():
+                p = image_point(info)
+                if p is None:
+                    continue
+                frames.append(frame_idx)
+                ids.append(track_id)
+                teams.append(info.get("team", -1))
+                points.append(p)
+
+        frame = np.asarray(frames, dtype=np.int64)
+        columns[name] = {
+            "frame": frame,
+            "track_id": np.asarray(ids, dtype=np.int64),
+            "team": np.asarray(teams, dtype=np.int64),
+            "xy": (project_points(np.asarray(points), homographies[frame]) if len(frame)
+                   else np.empty((0, 2), dtype=np.float32)),
+        }
+    return columns
+
+
+def concat_columns(columns: dict, objects=("players", "goalkeepers")) -> dict:
+    """The rows of several objects as one set of columns (e.g. everyone on a team)."""
+    return {
+        key: np.concatenate([columns[name][key] for name in objects])
+        for key in ("frame", "track_id", "team", "xy")
+    }
@@ -0,0 +1,217 @@
+"""
+Proximity queries over every frame of a clip at once.
+
+A frame holds a couple of dozen tracked objects, so the index is the dense
+per-frame layout itself: FrameIndex pads the rows of each frame into
+(F, N) arrays (positions, teams, track ids, a validity mask) and answers
+each query for all frames with batched distance arrays. Queries walk the
+clip in blocks of frames, so memory stays bounded on full matches, and no
+query loops over players in Python.
+
+Coordinates are whatever the rows hold: pitch units (cm) for the columns of
+analytics.positions, pixels for image positions.
+"""
+import numpy as np
+
+
+class FrameIndex:
+    def __init__(self, xy: np.ndarray, team: np.ndarray, track_id: np.ndarray, valid: np.ndarray,
+                 block_size: int = 1024):
+        self.xy = xy                # (F, N, 2) float64
+        self.team = team            # (F, N) int64, -1 = unknown
+        self.track_id = track_id    # (F, N) int64, -1 = padding
+        self.valid = valid          # (F, N) bool
+        self.block_size = block_size
+
+    @classmethod
+    def from_columns(cls, columns: dict, n_frames: int = None, **kwargs) -> "FrameIndex":
+        """Index of analytics.positions columns; rows with unknown positions are left out."""
+        frame = np.asarray(columns["frame"], dtype=np.int64)
+        xy = np.asarray(columns["xy"], dtype=np.float64).reshape(-1, 2)
+        known = np.isfinite(xy).all(axis=1)
+        frame, xy = frame[known], xy[known]
+        team = np.asarray(columns["team"], dtype=np.int64)[known]
+        track_id = np.asarray(columns["track_id"], dtype=np.int64)[known]
+        if n_frames is None:
+            n_frames = int(frame.max()) + 1 if len(frame) else 0
+
+        # slot of every row within its frame
+        order = np.argsort(frame, kind="stable")
+        frame = frame[order]
+        counts = np.bincount(frame, minlength=n_frames)
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        slot = np.arange(len(frame)) - starts[frame]
+
+        n = max(int(counts.max()) if len(counts) else 0, 1)
+        index = cls(
+            np.full((n_frames, n, 2), np.nan),
+            np.full((n_frames, n), -1, dtype=np.int64),
+            np.full((n_frames, n), -1, dtype=np.int64),
+            np.zeros((n_frames, n), dtype=bool),
+            **kwargs,
+        )
+        index.xy[frame, slot] = xy[order]
+        index.team[frame, slot] = team[order]
+        index.track_id[frame, slot] = track_id[order]
+        index.valid[frame, slot] = True
+        return index
+
+    @property
+    def n_frames(self) -> int:
+        return len(self.valid)
+
+    def _blocks(self):
+        for start in range(0, self.n_frames, self.block_size):
+            yield slice(start, min(start + self.block_size, self.n_frames))
+
+    def nearest_to(self, points: np.ndarray, mask: np.ndarray = None):
+        """
+        Closest indexed object to one point per frame ((F, 2), NaN = none),
+        among `mask` (default: all valid). Returns (slot, distance), slot -1
+        and distance inf where there is none; ties go to the first slot.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        mask = self.valid if mask is None else mask & self.valid
+        slot = np.full(self.n_frames, -1, dtype=np.int64)
+        dist = np.full(self.n_frames, np.inf)
+        for b in self._blocks():
+            d = np.sqrt(((self.xy[b] - points[b, None, :]) ** 2).sum(axis=-1))
+            d = np.where(mask[b] & np.isfinite(d), d, np.inf)
+            best = d.argmin(axis=1)
+            best_d = np.take_along_axis(d, best[:, None], axis=1)[:, 0]
+            found = np.isfinite(best_d)
+            slot[b] = np.where(found, best, -1)
+            dist[b] = best_d
+        return slot, dist
+
+    def within(self, points: np.ndarray, radius: float) -> np.ndarray:
+        """(F, N) objects within `radius` of the frame's point ((F, 2), NaN = none)."""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        out = np.zeros(self.valid.shape, dtype=bool)
+        for b in self._blocks():
+            d2 = ((self.xy[b] - points[b, None, :]) ** 2).sum(axis=-1)
+            with np.errstate(invalid="ignore"):
+                out[b] = self.valid[b] & (d2 <= radius * radius)
+        return out
+
+    def nearest_opponent(self):
+        """
+        Distance to, and track id of, every object's closest opponent (any
+        other known team): (F, N) float64 (inf when none) and (F, N) int64 (-1).
+        """
+        dist = np.full(self.valid.shape, np.inf)
+        other = np.full(self.valid.shape, -1, dtype=np.int64)
+        for b in self._blocks():
+            xy, team = self.xy[b], self.team[b]
+            known = self.valid[b] & (team >= 0)
+            d = np.sqrt(((xy[:, :, None, :] - xy[:, None, :, :]) ** 2).sum(axis=-1))   # (B, N, N)
+            opponent = known[:, :, None] & known[:, None, :] & (team[:, :, None] != team[:, None, :])
+            d = np.where(opponent, d, np.inf)
+            best = d.argmin(axis=2)
+            dist[b] = np.take_along_axis(d, best[..., None], axis=2)[..., 0]
+            ids = np.take_along_axis(self.track_id[b], best, axis=1)
+            other[b] = np.where(np.isfinite(dist[b]), ids, -1)
+        return dist, other
+
+    def open_lanes(self, passer: np.ndarray, lane_width: float) -> np.ndarray:
+        """
+        (F, N) teammates of the frame's `passer` slot ((F,), -1 = none) with no
+        opponent closer than `lane_width` to the straight line between them.
+        """
+        passer = np.asarray(passer, dtype=np.int64)
+        out = np.zeros(self.valid.shape, dtype=bool)
+        for b in self._blocks():
+            xy, team, valid = self.xy[b], self.team[b], self.valid[b]
+            has = passer[b] >= 0
+            p = np.clip(passer[b], 0, None)
+            p_xy = np.take_along_axis(xy, p[:, None, None], axis=1)            # (B, 1, 2)
+            p_team = np.take_along_axis(team, p[:, None], axis=1)             # (B, 1)
+
+            slots = np.arange(valid.shape[1])
+            receiver = valid & has[:, None] & (team == p_team) & (p_team >= 0) & (slots != p[:, None])
+            opponent = valid & (team >= 0) & (team != p_team)
+
+            # distance of every opponent (axis 2) to every passer -> receiver segment (axis 1)
+            seg = xy - p_xy                                                   # (B, N, 2)
+            rel = xy[:, None, :, :] - p_xy[:, :, None, :]                     # (B, 1, N, 2)
+            length2 = (seg ** 2).sum(axis=-1)[:, :, None]                     # (B, N, 1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                t = np.clip((rel * seg[:, :, None, :]).sum(axis=-1) / length2, 0.0, 1.0)
+            closest = seg[:, :, None, :] * t[..., None] - rel                 # (B, N, N, 2)
+            near = ((closest ** 2).sum(axis=-1) < lane_width * lane_width) & opponent[:, None, :]
+            out[b] = receiver & ~near.any(axis=2)
+        return out
+
+
+def ball_per_frame(ball_columns: dict, n_frames: int) -> np.ndarray:
+    """(F, 2) ball position of every frame from the ball's columns, NaN when unknown."""
+    ball_xy = np.full((n_frames, 2), np.nan)
+    frame = np.asarray(ball_columns["frame"], dtype=np.int64)
+    ball_xy[frame] = ball_columns["xy"]
+    return ball_xy
+
+
+def pressure_metrics(
+    players: dict,
+    ball_xy: np.ndarray,
+    carrier: np.ndarray,
+    carrier_team: np.ndarray,
+    press_radius: float = 500.0,    # pitch units (cm)
+    lane_width: float = 150.0,      # pitch units (cm)
+    teams: int = 2,
+) -> dict:
+    """
+    Pressing and marking numbers per frame from the players' columns, the
+    ball (F, 2) and the player on it (analytics.possessors: the tracker's
+    has_ball marks, as for the events), all in one pass of FrameIndex queries:
+
+        carrier       (F,)        track id of the player on the ball, -1 = none
+        carrier_team  (F,)        their team, -1 = none / unknown
+        pressure      (F,)        distance (m) from the carrier to the closest opponent
+        near_ball     (F, teams)  players of each team within press_radius of the ball
+        open_lanes    (F,)        teammates the carrier can pass to unobstructed,
+                                  -1 = no carrier or carrier off the pitch map
+        marking       (F, teams)  mean distance (m) from each team's players to their closest opponent
+
+    Distances are NaN where unknown.
+    """
+    index = FrameIndex.from_columns(players, n_frames=len(ball_xy))
+    frames = np.arange(index.n_frames)
+
+    # the carrier's slot in the index, -1 when nobody has the ball or their position is unknown
+    carrier = np.asarray(carrier, dtype=np.int64)
+    carrier_team = np.asarray(carrier_team, dtype=np.int64)
+    on_ball = index.valid & (index.track_id == carrier[:, None]) & (carrier[:, None] >= 0)
+    has = on_ball.any(axis=1)
+    carrier_slot = np.where(has, on_ball.argmax(axis=1), -1)
+    safe = np.clip(carrier_slot, 0, None)
+
+    opp_dist, _ = index.nearest_opponent()
+    pressure = np.where(has, opp_dist[frames, safe], np.inf)
+
+    near = index.within(ball_xy, press_radius)
+    near_ball = np.stack([(near & (index.team == t)).sum(axis=1) for t in range(teams)], axis=1)
+
+    lanes = index.open_lanes(carrier_slot, lane_width).sum(axis=1)
+    open_lanes = np.where(has & (carrier_team >= 0), lanes, -1)
+
+    known = np.isfinite(opp_dist)
+    marking = np.full((index.n_frames, teams), np.nan)
+    for t in range(teams):
+        mine = known & (index.team == t)
+        count = mine.sum(axis=1)
+        total = np.where(mine, opp_dist, 0.0).sum(axis=1)
+        marking[count > 0, t] = total[count > 0] / count[count > 0]
+
+    def metres(values):
+        values = np.asarray(values, dtype=np.float64) / 100.0
+        return np.where(np.isfinite(values), values, np.nan).astype(np.float32)
+
+    return {
+        "carrier": carrier.astype(np.int64),
+        "carrier_team": carrier_team.astype(np.int64),
+        "pressure": metres(pressure),
+        "near_ball": near_ball.astype(np.int16),
+        "open_lanes": open_lanes.astype(np.int16),
+        "marking": metres(marking),
+    }
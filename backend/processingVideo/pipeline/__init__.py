@@ -0,0 +1,3 @@
+from .cache import StageCache, load_artifacts, save_artifacts
+from .graph import Stage, StageGraph
+from .stages import DATA_PRODUCTS, INTERMEDIATES, PRODUCTS, VIDEO_PRODUCTS, build_video_pipeline
\ No newline at end of file
@@ -0,0 +1,138 @@
+"""
+Content-addressed cache of stage outputs, shared by every job.
+
+A stage that declares `cache_key` turns its inputs into key material (the
+digest of the video file, of the model weights, the parameters that change
+the result); the same material gives the same key, so uploading a clip
+again or asking for other products of it loads the detections, tracks,
+team labels and keypoints instead of running the models.
+
+Entries are single compressed .npz files (save_artifacts): arrays are
+stored as they are, anything else (track dicts, KeyPoints) as pickled bytes.
+Reads touch the file, and writes evict the least recently used entries past
+`max_bytes`.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+_PICKLED = "pickle:"
+_DIGESTS = {}  # (path, size, mtime) -> sha256, file contents hashed once per process
+
+
+def file_digest(path) -> Optional[str]:
+    """sha256 of a file's contents, None when it does not exist."""
+    if path is None:
+        return None
+    path = Path(path)
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    memo = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _DIGESTS.get(memo)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        digest = _DIGESTS[memo] = h.hexdigest()
+    return digest
+
+
+def cache_key(stage_name: str, material: dict) -> str:
+    h = hashlib.sha256(stage_name.encode())
+    for name in sorted(material):
+        h.update(f"\0{name}={material[name]!r}".encode())
+    return h.hexdigest()
+
+
+def save_artifacts(path, artifacts: dict) -> None:
+    """
+    Writes artifacts to one compressed .npz (arrays as they are, anything else
+    pickled), atomically: readers never see half a file.
+    """
+    arrays = {}
+    for name, value in artifacts.items():
+        if isinstance(value, np.ndarray) and value.dtype != object:
+            arrays[name] = value
+        else:
+            arrays[_PICKLED + name] = np.frombuffer(pickle.dumps(value, protocol=5), dtype=np.uint8)
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez_compressed(f, **arrays)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+def load_artifacts(path) -> dict:
+    """The artifacts written by save_artifacts."""
+    with np.load(path, allow_pickle=False) as data:
+        return {
+            (name[len(_PICKLED):] if name.startswith(_PICKLED) else name):
+                (pickle.loads(data[name].tobytes()) if name.startswith(_PICKLED) else data[name])
+            for name in data.files
+        }
+
+
+class StageCache:
+    def __init__(self, root, max_bytes: int = 2 << 30):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.stats = {"hits": 0, "misses": 0, "evicted": 0}
+        self._lock = threading.Lock()  # stages of one job may finish concurrently
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.npz"
+
+    def get(self, key: str) -> Optional[dict]:
+        path = self._path(key)
+        try:
+            entry = load_artifacts(path)
+            os.utime(path)  # most recently used
+        except Exception as e:
+            # missing, truncated, or pickled by other library versions (AttributeError,
+            # ImportError ...): a miss, and an unreadable entry is not kept
+            if not isinstance(e, FileNotFoundError):
+                path.unlink(missing_ok=True)
+            with self._lock:
+                self.stats["misses"] += 1
+            return None
+        with self._lock:
+            self.stats["hits"] += 1
+        return entry
+
+    def put(self, key: str, outputs: dict) -> None:
+        save_artifacts(self._path(key), outputs)
+        self.evict()
+
+    def evict(self) -> None:
+        """Deletes the least recently used entries until the cache fits in max_bytes."""
+        with self._lock:
+            entries = []
+            for path in self.root.glob("*.npz"):
+                try:
+                    stat = path.stat()
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+                self.stats["evicted"] += 1
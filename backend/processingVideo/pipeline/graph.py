@@ -0,0 +1,276 @@
+import contextvars
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field, replace
+from functools import partial
+from typing import Callable, Iterable, List, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Stage:
+    """
+    One step of the pipeline.
+
+    `run` is called with the artifacts named in `inputs` as keyword arguments
+    and must return a dict containing every artifact named in `outputs`.
+    `threads` is an explicit CPU thread budget for the stage when it runs
+    concurrently with others (None = an equal share of the cores).
+
+    A stage that can produce any subset of its outputs in one pass (the fused
+    renderer) lists the extra inputs of each output in `needs`. It is then run
+    with `products=` the outputs actually wanted and only the inputs those
+    require; the other optional inputs are left to their defaults.
+
+    `cache_key(artifacts)` makes the outputs cacheable across runs (see
+    pipeline.cache): it returns the key material identifying them (digests of
+    files, parameters), or None when this run must not use the cache.
+
+    `queue` is the worker pool the stage runs on when a job is split into
+    Celery tasks (model inference on GPU workers, the rest on render workers).
+    """
+    name: str
+    inputs: Tuple[str, ...]
+    outputs: Tuple[str, ...]
+    run: Callable[..., dict]
+    threads: Optional[int] = None
+    needs: Optional[Mapping[str, Tuple[str, ...]]] = field(default=None, compare=False, hash=False)
+    cache_key: Optional[Callable[[Mapping], Optional[dict]]] = field(default=None, compare=False, hash=False)
+    queue: str = "render"
+
+    def narrowed(self, wanted: Iterable[str]) -> "Stage":
+        """This stage restricted to the `wanted` outputs (itself unless it declares `needs`)."""
+        if self.needs is None:
+            return self
+        products = tuple(out for out in self.outputs if out in set(wanted))
+        extra = []
+        for out in products:
+            extra.extend(i for i in self.needs.get(out, ()) if i not in self.inputs and i not in extra)
+        return replace(
+            self,
+            inputs=self.inputs + tuple(extra),
+            outputs=products,
+            run=partial(self.run, products=products),
+            needs=None,
+        )
+
+
+def set_thread_budget(threads: int) -> None:
+    """
+    Cap the CPU threads used by the calling thread's stage.
+    torch sizes its OpenMP team per calling thread, so concurrent stages each
+    get their own budget; OpenCV's pool is process-wide and gets the same cap.
+    """
+    threads = max(1, int(threads))
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+
+def init_native_thread_pools() -> None:
+    """
+    Start numba's threading layer (used by UMAP) from the calling thread.
+    When it is first launched from a stage worker thread the TBB layer cannot
+    shut down and the process hangs on exit.
+    """
+    try:
+        import numba
+    except ImportError:
+        return
+    numba.get_num_threads()  # launches the threading layer
+
+
+def _call_stage(stage: Stage, kwargs: dict) -> dict:
+    from ..utils.instrument import span
+    with span(stage.name) as counts:
+        result = stage.run(**kwargs)
+        frames = kwargs.get("video_frames", result.get("video_frames"))
+        if frames is not None:
+            counts["frames"] = len(frames)
+    return result
+
+
+def _run_stage(stage: Stage, kwargs: dict, threads: int) -> dict:
+    set_thread_budget(threads)
+    return _call_stage(stage, kwargs)
+
+
+class StageGraph:
+    """
+    A declared DAG of stages. Stages are listed in a valid execution order and
+    each artifact has exactly one producer; artifacts nobody produces (video
+    path, model paths, ...) must be supplied by the caller.
+    """
+    def __init__(self, stages: Iterable[Stage]):
+        self.stages: List[Stage] = list(stages)
+        self._producer = {}
+
+        for stage in self.stages:
+            all_inputs = set(stage.inputs)
+            for extra in (stage.needs or {}).values():
+                all_inputs.update(extra)
+            for inp in all_inputs:
+                producer = self._producer.get(inp)
+                if producer is None and any(inp in s.outputs for s in self.stages):
+                    raise ValueError(f"stage {stage.name!r} is declared before the producer of {inp!r}")
+            for out in stage.outputs:
+                if out in self._producer:
+                    raise ValueError(
+                        f"artifact {out!r} is produced by both {self._producer[out].name!r} and {stage.name!r}"
+                    )
+                self._producer[out] = stage
+
+    def producer(self, artifact: str) -> Optional[Stage]:
+        return self._producer.get(artifact)
+
+    def plan(self, wanted: Iterable[str], available: Iterable[str] = ()) -> List[Stage]:
+        """
+        Stages needed to produce `wanted`, in execution order.
+        Artifacts listed in `available` are taken as given and not recomputed.
+        """
+        available = set(available)
+        needed = {w for w in wanted if w not in available}
+
+        unknown = {w for w in needed if w not in self._producer}
+        if unknown:
+            raise ValueError(f"no stage produces {sorted(unknown)}")
+
+        picked = []
+        for stage in reversed(self.stages):
+            if needed.intersection(stage.outputs):
+                stage = stage.narrowed(needed)
+                picked.append(stage)
+                needed.update(i for i in stage.inputs if i not in available)
+
+        produced = {out for stage in picked for out in stage.outputs}
+        missing = needed - produced
+        if missing:
+            raise ValueError(f"missing pipeline inputs: {sorted(missing)}")
+
+        return picked[::-1]
+
+    def phase_outputs(self, wanted: Iterable[str], available: Iterable[str], queue: str) -> List[str]:
+        """
+        What the `queue` stages of the plan for `wanted` hand over: outputs
+        consumed by stages of other queues, wanted, or consumed by nobody
+        (e.g. team_stats). Running the pipeline for these on one worker and
+        for `wanted` on another splits a job between them.
+        """
+        wanted = list(wanted)
+        plan = self.plan(wanted, available)
+        inside = [s for s in plan if s.queue == queue]
+        used_inside = {i for s in inside for i in s.inputs}
+        used_outside = {i for s in plan if s.queue != queue for i in s.inputs}.union(wanted)
+        return [
+            out for s in inside for out in s.outputs
+            if out in used_outside or out not in used_inside
+        ]
+
+    def _plan_cached(self, wanted: Iterable[str], artifacts: dict, cache) -> Tuple[List[Stage], dict]:
+        """
+        The plan once cached outputs are loaded into `artifacts`, and the cache
+        keys of the cacheable stages that still have to run. Stages are looked
+        up from the last one backwards, so a hit also drops the stages that
+        only fed it (a cached team labelling needs no tracking, nor decoding).
+        """
+        from .cache import cache_key
+
+        wanted = list(wanted)
+        checked, to_store = set(), {}
+        while True:
+            plan = self.plan(wanted, available=artifacts.keys())
+            todo = [s for s in reversed(plan) if s.cache_key is not None and s.name not in checked]
+            if not todo:
+                return plan, to_store
+            stage = todo[0]
+            checked.add(stage.name)
+            material = stage.cache_key(artifacts)
+            if material is None:
+                continue
+            key = cache_key(stage.name, material)
+            entry = cache.get(key)
+            if entry is not None and set(stage.outputs) <= set(entry):
+                artifacts.update({name: entry[name] for name in stage.outputs})
+            else:
+                to_store[stage.name] = key
+
+    def run(self, wanted: Iterable[str], artifacts: dict, on_stage_done=None,
+            max_parallel: int = 1, cpu_threads: Optional[int] = None, cache=None) -> dict:
+        """
+        Run only the stages `wanted` depends on. `artifacts` holds the external
+        inputs (and anything already computed) and is updated in place.
+        on_stage_done(stage, done, total) is called after each stage.
+
+        With max_parallel > 1, independent stages (e.g. tracking -> teams and
+        pitch keypoints) run at the same time in worker threads, each capped to
+        `cpu_threads // max_parallel` CPU threads unless the stage sets its own.
+
+        With a `cache` (pipeline.cache.StageCache), stages declaring a cache_key
+        are loaded from it when possible and their outputs are stored otherwise.
+        """
+        if cache is None:
+            plan, to_store = self.plan(wanted, available=artifacts.keys()), {}
+        else:
+            plan, to_store = self._plan_cached(wanted, artifacts, cache)
+
+        def store(stage, result):
+            self._store(stage, result, artifacts)
+            # serialized right away: later stages may update the artifacts in place
+            if stage.name in to_store:
+                cache.put(to_store[stage.name], {name: result[name] for name in stage.outputs})
+
+        if max_parallel <= 1:
+            for done, stage in enumerate(plan, start=1):
+                result = _call_stage(stage, {name: artifacts[name] for name in stage.inputs})
+                store(stage, result)
+                if on_stage_done is not None:
+                    on_stage_done(stage, done, len(plan))
+            return artifacts
+
+        init_native_thread_pools()
+        cpu_threads = cpu_threads or os.cpu_count() or 1
+        budget = max(1, cpu_threads // max_parallel)
+        pending = list(plan)
+        running = {}
+        done = 0
+
+        with ThreadPoolExecutor(max_workers=max_parallel, thread_name_prefix="stage") as pool:
+            while pending or running:
+                # submit every stage whose inputs exist, in declaration order
+                for stage in list(pending):
+                    if len(running) >= max_parallel:
+                        break
+                    if all(name in artifacts for name in stage.inputs):
+                        pending.remove(stage)
+                        kwargs = {name: artifacts[name] for name in stage.inputs}
+                        # each stage thread sees the caller's context (utils.instrument.recording)
+                        future = pool.submit(
+                            contextvars.copy_context().run, _run_stage, stage, kwargs, stage.threads or budget,
+                        )
+                        running[future] = stage
+
+                if not running:
+                    raise RuntimeError(f"pipeline stalled before {[s.name for s in pending]}")
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    store(stage, future.result())
+                    done += 1
+                    if on_stage_done is not None:
+                        on_stage_done(stage, done, len(plan))
+
+        return artifacts
+
+    @staticmethod
+    def _store(stage: Stage, result: dict, artifacts: dict) -> None:
+        missing = set(stage.outputs) - set(result)
+        if missing:
+            raise RuntimeError(f"stage {stage.name!r} did not produce {sorted(missing)}")
+        artifacts.update(result)
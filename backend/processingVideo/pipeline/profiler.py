@@ -0,0 +1,221 @@
+"""
+Sampling profiler of a pipeline run (opt-in per job, see api.tasks).
+
+A background thread reads the Python stack of every other thread each
+`interval` seconds (sys._current_frames) and counts the stacks. Nothing is
+hooked into the profiled code, so a job that is not profiled runs exactly as
+before. Samples of threads that only wait (a lock, a queue, a pool result) are
+dropped. Render pool processes sample themselves and hand their stacks back
+with each chunk (pipeline.render).
+
+Every sample is also credited to the innermost COMPONENTS frame on its stack
+(e.g. a CLIP forward pass called by TeamClassifier counts as TeamClassifier).
+
+write_report() leaves in a directory, per task:
+
+    <task>.collapsed   "frame;frame;frame count" lines (flamegraph.pl, speedscope, inferno)
+    <task>.txt         call tree with inclusive and self seconds
+    <task>.json        seconds per component and per thread
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+_PROFILER = contextvars.ContextVar("pipeline_profiler", default=None)
+
+# component -> (file path suffix, qualified name prefix) of the code it owns
+COMPONENTS = {
+    "Tracker": (("tracker/tracker.py", "Tracker."),),
+    "TeamClassifier": (("team_assigner/team.py", "TeamClassifier."),),
+    "PitchAnnotator": (("pitch/pitch_annotator.py", "PitchAnnotator."),),
+    "draw_utils": (("utils/draw_utils.py", ""), ("utils/sprites.py", "")),
+}
+
+# innermost frames of a thread that is blocked, not working (the pool's task and
+# result handlers block in C calls, so they count as idle throughout)
+_IDLE = {
+    ("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"),
+    ("queue.py", "get"), ("selectors.py", "select"),
+    ("connection.py", "_recv"), ("connection.py", "wait"), ("connection.py", "_poll"),
+    ("pool.py", "_handle_tasks"), ("pool.py", "_handle_results"),
+}
+
+
+class SamplingProfiler:
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()      # (root, ..., leaf) labels -> samples
+        self.components = Counter()  # component (or "other") -> samples
+        self._codes = {}             # code object -> (label, component, idle key)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    # --- sampling --------------------------------------------------------------
+
+    def _describe(self, code):
+        described = self._codes.get(code)
+        if described is None:
+            path = code.co_filename.replace(os.sep, "/")
+            name = getattr(code, "co_qualname", code.co_name)
+            short = "/".join(path.rsplit("/", 2)[-2:])
+            component = next(
+                (c for c, owned in COMPONENTS.items()
+                 if any(path.endswith(suffix) and name.startswith(prefix) for suffix, prefix in owned)),
+                None,
+            )
+            label = f"{name} ({short}:{code.co_firstlineno})".replace(";", ":")
+            described = self._codes[code] = (label, component, (path.rsplit("/", 1)[-1], code.co_name))
+        return described
+
+    def sample(self) -> None:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own or frame is None:
+                continue
+            leaf = self._describe(frame.f_code)
+            if leaf[2] in _IDLE:
+                continue
+            labels, component = [], None
+            while frame is not None:
+                label, owner, _ = self._describe(frame.f_code)
+                labels.append(label)
+                if component is None and owner is not None:
+                    component = owner
+                frame = frame.f_back
+            labels.append(f"thread {names.get(ident, ident)}")
+            with self._lock:
+                self.stacks[tuple(reversed(labels))] += 1
+                self.components[component or "other"] += 1
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="profile-sampler", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    # --- merging (render pool processes) ------------------------------------------
+
+    def take(self):
+        """The samples so far, as (stacks, components), and starts counting afresh."""
+        with self._lock:
+            taken = (dict(self.stacks), dict(self.components))
+            self.stacks.clear()
+            self.components.clear()
+        return taken
+
+    def add(self, taken, root: str = None) -> None:
+        """Adds samples of another process (take()), their thread roots renamed to `root`."""
+        stacks, components = taken
+        with self._lock:
+            for stack, count in stacks.items():
+                self.stacks[(root,) + tuple(stack[1:]) if root else tuple(stack)] += count
+            self.components.update(components)
+
+    # --- reports -----------------------------------------------------------------
+
+    def summary(self) -> dict:
+        total = sum(self.components.values())
+        threads = Counter()
+        for stack, count in self.stacks.items():
+            threads[stack[0]] += count
+        return {
+            "interval_s": self.interval,
+            "samples": total,
+            "seconds": round(total * self.interval, 3),
+            "components": {
+                name: {"seconds": round(count * self.interval, 3), "share": round(count / total, 4)}
+                for name, count in self.components.most_common()
+            },
+            "threads": {name: round(count * self.interval, 3) for name, count in threads.most_common()},
+        }
+
+    def call_tree(self, min_share: float = 0.005) -> str:
+        """Indented call tree, inclusive / self seconds; branches under `min_share` of the samples are cut."""
+        tree = {}
+        for stack, count in self.stacks.items():
+            node = tree
+            for label in stack:
+                entry = node.setdefault(label, [0, 0, {}])
+                entry[0] += count
+                node = entry[2]
+            entry[1] += count
+
+        total = sum(self.stacks.values()) or 1
+        lines = [f"{'total s':>9} {'self s':>8} {'share':>6}  ({total} samples every {self.interval * 1000:g} ms)"]
+
+        def walk(node, depth):
+            for label, (inclusive, own, children) in sorted(node.items(), key=lambda item: -item[1][0]):
+                if inclusive / total < min_share:
+                    continue
+                lines.append(
+                    f"{inclusive * self.interval:9.3f} {own * self.interval:8.3f} {inclusive / total:6.1%}  "
+                    f"{'  ' * depth}{label}"
+                )
+                walk(children, depth + 1)
+
+        walk(tree, 0)
+        return "\n".join(lines) + "\n"
+
+    def write_report(self, directory, name: str) -> dict:
+        """Writes <name>.collapsed / .txt / .json into `directory`; returns the summary."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        with open(directory / f"{name}.collapsed", "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{';'.join(stack)} {count}\n")
+        (directory / f"{name}.txt").write_text(self.call_tree())
+        summary = self.summary()
+        (directory / f"{name}.json").write_text(json.dumps(summary, indent=2))
+        return summary
+
+
+@contextmanager
+def profiling(profiler: SamplingProfiler):
+    """Samples while the block runs; render pools started in it profile their processes too."""
+    token = _PROFILER.set(profiler.start())
+    try:
+        yield profiler
+    finally:
+        _PROFILER.reset(token)
+        profiler.stop()
+
+
+def active_profiler():
+    return _PROFILER.get()
+
+
+def merge_reports(directory) -> dict:
+    """Components and tasks of every <task>.json report in `directory` (the tasks of one job)."""
+    components, tasks = Counter(), {}
+    for path in sorted(Path(directory).glob("*.json")):
+        report = json.loads(path.read_text())
+        tasks[path.stem] = report["seconds"]
+        for name, entry in report["components"].items():
+            components[name] += entry["seconds"]
+    total = sum(components.values()) or 1.0
+    return {
+        "seconds": round(sum(tasks.values()), 3),
+        "components": {
+            name: {"seconds": round(seconds, 3), "share": round(seconds / total, 4)}
+            for name, seconds in components.most_common()
+        },
+        "tasks": tasks,
+    }
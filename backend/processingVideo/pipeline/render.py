@@ -0,0 +1,323 @@
+"""
+Frame-level rendering of the video products.
+
+FrameRenderer draws a block of frames of every requested product in a single
+fused pass (the homographies and track projections are shared, the Voronoi
+boards are computed for the whole block at once), so the clip can be rendered
+in any order and in pieces. render_products() walks the frames once
+and streams each product straight into its encoder, either in this process or
+split into frame chunks across a process pool:
+
+- workers are spawned (not forked, the inference threads may still be running)
+  and map the decoded frames from the .npy file written by the frame_store stage;
+- a task renders one chunk of frames, all products, into a slot of each
+  product's shared-memory ring;
+- the parent encodes finished chunks strictly in frame order, so the video files
+  are byte-identical to a serial render.
+"""
+import multiprocessing
+import queue
+from collections import deque
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from ..utils.instrument import span
+from .profiler import SamplingProfiler, active_profiler
+
+BOARD_PRODUCTS = ("tactical_board", "voronoi")
+PITCH_PRODUCTS = ("pitch_edges",) + BOARD_PRODUCTS
+
+
+class FrameRenderer:
+    def __init__(self, config, products, video_frames, tracks=None, team_ball_control=None, pitch_keypoints=None,
+                 incremental=False, frame_offset=0):
+        self.config = config
+        # video_frames is a segment starting at frame_offset of the tracks / keypoints (pipeline.segments)
+        self.frame_offset = frame_offset
+        # reuse the previous frame's boards where nothing moved noticeably (see pitch.temporal / VoronoiBoard)
+        self.incremental = incremental
+        self.products = tuple(products)
+        self.video_frames = video_frames
+        self.tracks = tracks
+        self.team_ball_control = team_ball_control
+        # the ball control box shows the whole clip's shares: counted once, not per frame
+        self._ball_control_shares = None
+        self.pitch_keypoints = pitch_keypoints
+        # voronoi boards are drawn block-wise from the positions the annotator returns
+        self._pitch_products = tuple(
+            "voronoi_xy" if p == "voronoi" else p for p in self.products if p in PITCH_PRODUCTS
+        )
+        self._pitch_annotator = None
+        self._voronoi_board = None
+        self._next_start = None
+        self._buffers = {}  # product -> (block, H, W, 3) images, reused by every block
+
+    def __getstate__(self):
+        # workers map the frames from the frame store and build their own annotator
+        state = self.__dict__.copy()
+        state["video_frames"] = None
+        state["_pitch_annotator"] = None
+        state["_voronoi_board"] = None
+        state["_buffers"] = {}
+        return state
+
+    @property
+    def pitch_annotator(self):
+        if self._pitch_annotator is None:
+            from ..pitch import PitchAnnotator
+            self._pitch_annotator = PitchAnnotator(CONFIG=self.config, model_path=None)
+            if self.incremental and "tactical_board" in self.products:
+                from ..pitch.temporal import MarkerBoardCache
+                self._pitch_annotator.tactical_cache = MarkerBoardCache()
+        return self._pitch_annotator
+
+    def frame_shape(self, product):
+        if product in BOARD_PRODUCTS:
+            return self.pitch_annotator.BASE_PITCH.shape
+        return self.video_frames[0].shape
+
+    @property
+    def voronoi_board(self):
+        if self._voronoi_board is None:
+            self._voronoi_board = self.pitch_annotator.voronoi_board(
+                self.config, vor_step=3, incremental=self.incremental
+            )
+        return self._voronoi_board
+
+    def take_stats(self) -> dict:
+        """Reuse counters of the incremental mode since the last call, then zero them."""
+        stats = {}
+        if not self.incremental:
+            return stats
+        if self._voronoi_board is not None:
+            stats["voronoi"] = dict(self._voronoi_board.stats)
+            self._voronoi_board.stats = dict.fromkeys(stats["voronoi"], 0)
+        if self._pitch_annotator is not None and self._pitch_annotator.tactical_cache is not None:
+            cache = self._pitch_annotator.tactical_cache
+            stats["tactical_board"] = dict(cache.stats)
+            cache.stats = dict.fromkeys(stats["tactical_board"], 0)
+        return stats
+
+    def _block_buffers(self, frames) -> dict:
+        buffers = {}
+        for product in self.products:
+            if product == "voronoi":
+                continue  # the Voronoi board has its own
+            buffer = self._buffers.get(product)
+            if buffer is None or len(buffer) < frames:
+                buffer = self._buffers[product] = np.empty((frames,) + tuple(self.frame_shape(product)), np.uint8)
+            buffers[product] = buffer
+        return buffers
+
+    def render_block(self, start, stop) -> dict:
+        """
+        {product: images} for frames [start, stop). The images are views into
+        buffers reused by every block: write them out before the next call.
+        """
+        out = {product: [] for product in self.products}
+        positions = []
+        buffers = self._block_buffers(stop - start)
+
+        if self.incremental and start != self._next_start:
+            # not the continuation of the last block (e.g. another pool worker's chunk)
+            if self._voronoi_board is not None:
+                self._voronoi_board.reset()
+            if self._pitch_annotator is not None and self._pitch_annotator.tactical_cache is not None:
+                self._pitch_annotator.tactical_cache.reset()
+        self._next_start = stop
+
+        for j, i in enumerate(range(start, stop)):
+            frame = np.asarray(self.video_frames[i])
+            t = i + self.frame_offset
+
+            if "detections" in self.products:
+                from ..utils import ball_control_shares, draw_tracks
+                if self._ball_control_shares is None:
+                    self._ball_control_shares = ball_control_shares(self.team_ball_control)
+                with span("detections", frames=1):
+                    out["detections"].append(
+                        draw_tracks(frame, t, self.tracks, self.team_ball_control, out=buffers["detections"][j],
+                                    shares=self._ball_control_shares)
+                    )
+
+            if self._pitch_products:
+                with span("pitch", frames=1):
+                    images = self.pitch_annotator.annotate_products_from_result(
+                        frame, self.tracks, t, self.config, self.pitch_keypoints[t],
+                        self._pitch_products, kp_thresh=0.5,
+                        dst={product: buffer[j] for product, buffer in buffers.items()},
+                    )
+                if "voronoi_xy" in images:
+                    positions.append(images.pop("voronoi_xy"))
+                for product, image in images.items():
+                    out[product].append(image)
+
+        if "voronoi" in self.products:
+            from ..pitch.voronoi import pad_positions
+            with span("voronoi", frames=stop - start):
+                xy, teams = pad_positions(positions)
+                out["voronoi"] = list(self.voronoi_board.render_block(xy, teams))
+        return out
+
+
+def write_frame_store(video_frames, path) -> str:
+    """Copies the decoded frames into one (N, H, W, 3) .npy that workers can memory-map."""
+    store = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.uint8, shape=(len(video_frames),) + video_frames[0].shape
+    )
+    for i, frame in enumerate(video_frames):
+        store[i] = frame
+    store.flush()
+    del store
+    return str(path)
+
+
+def render_products(renderer, outputs, n_frames, workers=1, frames_path=None, chunk_size=8):
+    """
+    Renders frames [0, n_frames) of the renderer's products; `outputs` maps
+    each product to its video path. Uses the pool only with workers > 1 and a
+    frame store. Returns the reuse statistics of the incremental mode.
+    """
+    from ..utils import open_video_writer
+    writers = {p: open_video_writer(str(Path(path)), renderer.frame_shape(p)) for p, path in outputs.items()}
+    stats = {}
+    try:
+        if workers > 1 and frames_path is not None and n_frames > chunk_size:
+            _render_pooled(renderer, writers, n_frames, workers, frames_path, chunk_size, stats)
+        else:
+            for start in range(0, n_frames, chunk_size):
+                stop = min(start + chunk_size, n_frames)
+                with span("draw", frames=stop - start):
+                    blocks = renderer.render_block(start, stop)
+                for product, images in blocks.items():
+                    with span("encode"), span(product, frames=len(images)):
+                        for image in images:
+                            writers[product].write(image)
+            _add_stats(stats, renderer.take_stats())
+    finally:
+        for writer in writers.values():
+            writer.release()
+    return _reuse_summary(stats)
+
+
+def _add_stats(total: dict, part: dict) -> None:
+    for product, counters in part.items():
+        acc = total.setdefault(product, dict.fromkeys(counters, 0))
+        for name, value in counters.items():
+            acc[name] += value
+
+
+def _reuse_summary(stats: dict) -> dict:
+    for product, counters in stats.items():
+        if "cells" in counters:
+            counters["reuse_ratio"] = 1.0 - counters["cells_recomputed"] / max(1, counters["cells"])
+        else:
+            counters["reuse_ratio"] = counters["frames_reused"] / max(1, counters["frames"])
+    return stats
+
+
+def _render_pooled(renderer, writers, n_frames, workers, frames_path, chunk_size, stats):
+    # workers + 1 slots (one chunk of every product each): all workers busy while a chunk waits for the encoder
+    slots = workers + 1
+    shms, rings = [], {}
+    try:
+        for product in writers:
+            shape = (slots * chunk_size,) + tuple(renderer.frame_shape(product))
+            shm = shared_memory.SharedMemory(create=True, size=int(np.prod(shape)))
+            shms.append(shm)
+            rings[product] = (shm.name, shape)
+        _run_pool(renderer, writers, n_frames, workers, frames_path, chunk_size, slots, shms, rings, stats)
+    finally:
+        for shm in shms:
+            try:
+                shm.close()
+            except BufferError:
+                # a view is still referenced by an in-flight exception traceback
+                pass
+            shm.unlink()
+
+
+def _run_pool(renderer, writers, n_frames, workers, frames_path, chunk_size, slots, shms, rings, stats):
+    views = {
+        product: np.ndarray(shape, np.uint8, buffer=shm.buf)
+        for shm, (product, (_, shape)) in zip(shms, rings.items())
+    }
+    todo = deque(range(0, n_frames, chunk_size))
+    free = deque(range(slots))
+    ready = {}
+    next_start = 0
+    done = queue.SimpleQueue()
+    in_flight = 0
+
+    # a profiled job samples the workers too: they send their stacks back with each chunk
+    profiler = active_profiler()
+    profile_interval = profiler.interval if profiler is not None else None
+
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(workers, initializer=_init_worker, initargs=(renderer, frames_path, rings, profile_interval)) as pool:
+        while True:
+            # 1) hand out chunks while there are free slots
+            while todo and free:
+                start = todo.popleft()
+                offset = free.popleft() * chunk_size
+                stop = min(start + chunk_size, n_frames)
+                pool.apply_async(
+                    _render_chunk, (start, stop, offset),
+                    callback=done.put, error_callback=done.put,
+                )
+                in_flight += 1
+            if not in_flight:
+                break
+
+            # 2) wait for any chunk, then encode whatever is next in line
+            item = done.get()
+            in_flight -= 1
+            if isinstance(item, BaseException):
+                raise item
+            start, offset, chunk_stats, samples = item
+            _add_stats(stats, chunk_stats)
+            if samples is not None and profiler is not None:
+                profiler.add(samples, root="render worker")
+            ready[start] = offset
+            while next_start in ready:
+                offset = ready.pop(next_start)
+                stop = min(next_start + chunk_size, n_frames)
+                for product, writer in writers.items():
+                    with span("encode"), span(product, frames=stop - next_start):
+                        for j in range(stop - next_start):
+                            writer.write(views[product][offset + j])
+                free.append(offset // chunk_size)
+                next_start = stop
+    views.clear()
+
+
+# --- worker side --------------------------------------------------------------
+
+_worker = {}
+
+
+def _init_worker(renderer, frames_path, rings, profile_interval=None):
+    import cv2
+    cv2.setNumThreads(1)  # parallelism comes from the processes
+
+    renderer.video_frames = np.load(frames_path, mmap_mode="r")
+    _worker["renderer"] = renderer
+    _worker["shms"] = []
+    _worker["views"] = {}
+    for product, (name, shape) in rings.items():
+        shm = shared_memory.SharedMemory(name=name)
+        _worker["shms"].append(shm)
+        _worker["views"][product] = np.ndarray(shape, np.uint8, buffer=shm.buf)
+    _worker["profiler"] = SamplingProfiler(profile_interval).start() if profile_interval else None
+
+
+def _render_chunk(start, stop, offset):
+    renderer = _worker["renderer"]
+    views = _worker["views"]
+    for product, images in renderer.render_block(start, stop).items():
+        for j, image in enumerate(images):
+            views[product][offset + j] = image
+    profiler = _worker["profiler"]
+    return start, offset, renderer.take_stats(), profiler.take() if profiler is not None else None
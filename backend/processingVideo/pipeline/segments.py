@@ -0,0 +1,241 @@
+"""
+Long videos as overlapping segments.
+
+A match is cut into segments of `segment_frames` that each start `overlap`
+frames before the previous one ends. Every segment runs the model stages on
+its own (another worker, its own ByteTrack ids and team clustering), and
+stitch_segments() joins them:
+
+    ids     over the overlap, every box of the next segment votes for the
+            box of the previous one it overlaps most (IoU); pairs with enough
+            votes keep the previous segment's id, the rest get new ones
+    teams   the two clusterings may have swapped team 0 and 1: when most
+            matched players disagree, the next segment's labels are flipped
+            (colours are taken from the first segment)
+    frames  each side of a boundary keeps its half of the overlap
+
+Ball possession is assigned again over the stitched tracks so the control
+counts and the possession marks run across the whole match.
+"""
+from collections import Counter
+from pathlib import Path
+
+import numpy as np
+
+PERSONS = ("players", "goalkeepers", "referees")
+
+
+def plan_segments(n_frames: int, segment_frames: int, overlap: int):
+    """[(start, stop)] frame ranges to decode, the last one open-ended (stop None)."""
+    if n_frames <= segment_frames:
+        return [(0, None)]
+    count = int(np.ceil(n_frames / segment_frames))
+    ranges = [(max(0, k * segment_frames - overlap), (k + 1) * segment_frames) for k in range(count)]
+    ranges[-1] = (ranges[-1][0], None)
+    return ranges
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, M) IoU of (N, 4) and (M, 4) xyxy boxes."""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.clip(rb - lt, 0, None).prod(axis=-1)
+    area_a = (a[:, 2:] - a[:, :2]).clip(0).prod(axis=-1)
+    area_b = (b[:, 2:] - b[:, :2]).clip(0).prod(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        iou = inter / (area_a[:, None] + area_b[None, :] - inter)
+    return np.nan_to_num(iou)
+
+
+def _frame_boxes(tracks: dict, frame: int):
+    ids, boxes = [], []
+    for name in PERSONS:
+        for track_id, info in tracks[name][frame].items():
+            ids.append(track_id)
+            boxes.append(info["bbox"])
+    return np.asarray(ids, dtype=np.int64), np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+
+
+def _teams(tracks: dict, frame: int) -> dict:
+    return {
+        track_id: info.get("team")
+        for name in ("players", "goalkeepers")
+        for track_id, info in tracks[name][frame].items()
+    }
+
+
+def match_tracks(prev: dict, prev_frames, nxt: dict, nxt_frames, iou: float = 0.5, min_votes: int = 3):
+    """
+    Ids of `nxt` matched to ids of `prev` over the same frames (local frame
+    numbers of each) as {next id: previous id}, and (agree, disagree) counts
+    of the matched players' team labels.
+    """
+    votes = Counter()
+    for fa, fb in zip(prev_frames, nxt_frames):
+        ids_a, boxes_a = _frame_boxes(prev, fa)
+        ids_b, boxes_b = _frame_boxes(nxt, fb)
+        if not len(ids_a) or not len(ids_b):
+            continue
+        overlap = box_iou(boxes_a, boxes_b)
+        best = overlap.argmax(axis=0)
+        for j, i in enumerate(best):
+            if overlap[i, j] >= iou:
+                votes[int(ids_a[i]), int(ids_b[j])] += 1
+
+    mapping, used = {}, set()
+    for (a, b), count in votes.most_common():
+        if count < min_votes:
+            break
+        if b not in mapping and a not in used:
+            mapping[b] = a
+            used.add(a)
+
+    agree = disagree = 0
+    for fa, fb in zip(prev_frames, nxt_frames):
+        teams_a, teams_b = _teams(prev, fa), _teams(nxt, fb)
+        for b, a in mapping.items():
+            ta, tb = teams_a.get(a), teams_b.get(b)
+            if ta in (0, 1) and tb in (0, 1):
+                if ta == tb:
+                    agree += 1
+                else:
+                    disagree += 1
+    return mapping, (agree, disagree)
+
+
+def _relabel(tracks: dict, mapping: dict, flip: bool, colors: dict) -> dict:
+    """`tracks` with ids through `mapping`, teams flipped if asked and the reference colours."""
+    out = {}
+    for name, frames in tracks.items():
+        if name not in PERSONS:
+            out[name] = frames
+            continue
+        relabelled = []
+        for frame_tracks in frames:
+            new = {}
+            for track_id, info in frame_tracks.items():
+                team = info.get("team")
+                if flip and team in (0, 1):
+                    info["team"] = team = 1 - team
+                if team in colors and "team_color" in info:
+                    info["team_color"] = colors[team]
+                new[mapping[track_id]] = info
+            relabelled.append(new)
+        out[name] = relabelled
+    return out
+
+
+def stitch_segments(parts, iou: float = 0.5, min_votes: int = 3):
+    """
+    Joins the intermediates of consecutive segments, `parts` = [(start frame,
+    {"render_tracks", "pitch_keypoints", "team_stats"})] in order; a job that
+    needs no tracks (pitch_edges) or no keypoints (detections) has only the
+    other. Returns the intermediates of the whole video (render_tracks and
+    team_ball_control, pitch_keypoints, team_stats, as present), the
+    [(start, stop)] frames each segment contributes, and stitching stats.
+    """
+    from ..tracker import Tracker
+
+    has_tracks = all("render_tracks" in artifacts for _, artifacts in parts)
+    has_keypoints = all("pitch_keypoints" in artifacts for _, artifacts in parts)
+    if not has_tracks and not has_keypoints:
+        raise ValueError("segments have neither render_tracks nor pitch_keypoints to stitch")
+
+    starts = [int(start) for start, _ in parts]
+    lengths = [
+        len(a["render_tracks"]["players"]) if has_tracks else len(a["pitch_keypoints"]) for _, a in parts
+    ]
+    ends = [s + n for s, n in zip(starts, lengths)]
+
+    # each side of a boundary keeps its half of the overlap
+    cuts = [0]
+    for k in range(1, len(parts)):
+        cuts.append(max(starts[k], min((starts[k] + ends[k - 1]) // 2, ends[k - 1])))
+    cuts.append(ends[-1])
+
+    stats = {"segments": len(parts), "matched": 0, "new": 0, "flipped": 0}
+    intermediates = {}
+    if has_tracks:
+        merged = _stitch_tracks(parts, starts, ends, cuts, stats, iou, min_votes)
+        intermediates["render_tracks"] = merged
+        # possession over the whole match (control counts, has_ball marks)
+        intermediates["team_ball_control"] = Tracker().assign_ball_possession(merged)
+    if has_keypoints:
+        keypoints = []
+        for k, (start, artifacts) in enumerate(parts):
+            keypoints.extend(artifacts["pitch_keypoints"][cuts[k] - starts[k]:cuts[k + 1] - starts[k]])
+        intermediates["pitch_keypoints"] = keypoints
+    if any("team_stats" in artifacts for _, artifacts in parts):
+        intermediates["team_stats"] = {"segments": [artifacts.get("team_stats") for _, artifacts in parts]}
+    return intermediates, list(zip(cuts[:-1], cuts[1:])), stats
+
+
+def _stitch_tracks(parts, starts, ends, cuts, stats, iou, min_votes) -> dict:
+    """render_tracks of the whole video: ids and teams matched over each overlap, frames cut at `cuts`."""
+    colors = {}
+    for frame_tracks in parts[0][1]["render_tracks"]["players"]:
+        for info in frame_tracks.values():
+            if info.get("team") in (0, 1) and "team_color" in info:
+                colors.setdefault(info["team"], info["team_color"])
+
+    next_id = 1 + max(
+        (track_id for name in PERSONS for frame in parts[0][1]["render_tracks"][name] for track_id in frame),
+        default=0,
+    )
+    prev = None
+    stitched = []
+    for k, (start, artifacts) in enumerate(parts):
+        tracks = artifacts["render_tracks"]
+        local_ids = {track_id for name in PERSONS for frame in tracks[name] for track_id in frame}
+        if prev is None:
+            mapping, flip = {track_id: track_id for track_id in local_ids}, False
+        else:
+            overlap = range(starts[k], ends[k - 1])
+            mapping, (agree, disagree) = match_tracks(
+                prev, [f - starts[k - 1] for f in overlap],
+                tracks, [f - starts[k] for f in overlap],
+                iou=iou, min_votes=min_votes,
+            )
+            flip = disagree > agree
+            stats["matched"] += len(mapping)
+            stats["flipped"] += int(flip)
+            for track_id in sorted(local_ids - mapping.keys()):
+                mapping[track_id] = next_id
+                next_id += 1
+                stats["new"] += 1
+        prev = _relabel(tracks, mapping, flip, colors)
+        stitched.append(prev)
+
+    merged = {name: [] for name in stitched[0]}
+    for k in range(len(parts)):
+        lo, hi = cuts[k] - starts[k], cuts[k + 1] - starts[k]
+        for name, frames in stitched[k].items():
+            merged[name].extend(frames[lo:hi])
+    return merged
+
+
+def concat_videos(paths, output_path) -> str:
+    """
+    Joins the segment videos into one file without re-encoding them (ffmpeg
+    concat demuxer, streams copied): the segments come from the same renderer,
+    so they share codec, frame size and frame rate, and each starts on a keyframe.
+    """
+    import ffmpeg
+
+    output_path = Path(output_path)
+    list_file = output_path.with_name(f"{output_path.stem}_segments.txt")
+    quoted = (Path(path).resolve().as_posix().replace("'", "'\\''") for path in paths)
+    list_file.write_text("".join(f"file '{path}'\n" for path in quoted))
+    try:
+        (
+            ffmpeg.input(str(list_file), format="concat", safe=0)
+            .output(str(output_path), c="copy")
+            .overwrite_output()
+            .run(quiet=True)
+        )
+    except ffmpeg.Error as e:
+        stderr = (e.stderr or b"").decode(errors="replace")[-500:]
+        raise RuntimeError(f"could not join {len(paths)} segment videos: {stderr}") from e
+    finally:
+        list_file.unlink(missing_ok=True)
+    return str(output_path)
@@ -0,0 +1,311 @@
+"""
+The football video pipeline as a stage graph.
+
+External inputs (supplied by the caller):
+    video_path, frame_range ((start, stop) of a segment of a long video, None = all),
+    output_dir, config, device,
+    player_model_path, field_model_path, team_model_path, team_model_update,
+    render_workers (render processes, <= 1 renders in-process),
+    render_incremental (reuse boards across frames where nothing moved noticeably)
+
+Products (one file each, value is the absolute output path):
+    detections, pitch_edges, tactical_board, voronoi  (videos)
+    pitch_control                                     (per-frame numbers, .npz)
+    physical_metrics                                  (per-track numbers, .json)
+    heatmaps                                          (per-team / per-track occupancy, .npz)
+    pressure                                          (per-frame pressing / marking, .npz)
+    events                                            (possession spells and passes, .npz)
+
+Heavy modules are imported inside the stage functions so building the graph
+is cheap.
+"""
+from pathlib import Path
+
+from .graph import Stage, StageGraph
+
+VIDEO_PRODUCTS = ("detections", "pitch_edges", "tactical_board", "voronoi")
+DATA_PRODUCTS = ("pitch_control", "physical_metrics", "heatmaps", "pressure", "events")
+PRODUCTS = VIDEO_PRODUCTS + DATA_PRODUCTS
+# kept with a job so products can be added later without running the models again
+INTERMEDIATES = ("render_tracks", "team_ball_control", "team_stats", "pitch_keypoints", "fps")
+
+
+# --- inference stages --------------------------------------------------------
+# Their outputs are cached across jobs (see pipeline.cache) under the digests
+# of the video and the weights; bump the version when a stage's logic changes.
+
+def _weights(path):
+    from .cache import file_digest
+    return file_digest(path) or str(path)
+
+
+def _segment(artifacts):
+    # whole videos keep the keys they had before segments existed
+    frame_range = artifacts.get("frame_range")
+    return {} if frame_range is None else {"frame_range": tuple(frame_range)}
+
+
+def tracks_key(artifacts):
+    from .cache import file_digest
+    video = file_digest(artifacts["video_path"])
+    if video is None:
+        return None
+    return {"version": 1, "video": video, "weights": _weights(artifacts["player_model_path"]), **_segment(artifacts)}
+
+
+def teams_key(artifacts):
+    # a match model that is created or refined by the stage is a side effect: run it
+    model_path = artifacts.get("team_model_path")
+    if model_path is not None and (artifacts.get("team_model_update") or not Path(model_path).exists()):
+        return None
+    key = tracks_key(artifacts)
+    if key is None:
+        return None
+    return {**key, "teams_version": 1, "team_model": _weights(model_path) if model_path else None}
+
+
+def keypoints_key(artifacts):
+    from .cache import file_digest
+    video = file_digest(artifacts["video_path"])
+    if video is None:
+        return None
+    return {"version": 1, "video": video, "weights": _weights(artifacts["field_model_path"]), **_segment(artifacts)}
+
+
+def decode_video(video_path, frame_range):
+    from ..utils import read_video
+    start, stop = frame_range or (0, None)
+    return {"video_frames": read_video(video_path, start, stop)}
+
+
+def probe_video(video_path):
+    # container metadata only, so data products of a cached clip need no decoding
+    from ..utils import video_fps
+    return {"fps": video_fps(video_path)}
+
+
+def track_objects(video_frames, player_model_path):
+    from ..tracker import Tracker
+    tracker = Tracker(player_model_path)
+    tracks = tracker.get_object_tracks(video_frames)
+    tracker.add_position_to_track(tracks)
+    return {"tracks": tracks}
+
+
+def assign_teams(tracks, video_frames, device, team_model_path, team_model_update):
+    from ..team_assigner import TeamAssigner
+    team_assigner = TeamAssigner(device=device)
+    team_assigner.assign_teams(
+        tracks, video_frames,
+        model_path=team_model_path,
+        update=team_model_update,
+    )
+    # team labels are written into the track dicts in place
+    return {"team_tracks": tracks, "team_stats": team_assigner.stats}
+
+
+def interpolate_ball(team_tracks):
+    # done once for every render (detections and boards) instead of inside
+    # Tracker.draw_annotations, so renders can run in any order
+    from ..tracker import Tracker
+    tracker = Tracker()  # the detector is not loaded for these
+    team_tracks['ball'] = tracker.interpolate_ball_positions(team_tracks['ball'])
+    team_ball_control = tracker.assign_ball_possession(team_tracks)
+    return {"render_tracks": team_tracks, "team_ball_control": team_ball_control}
+
+
+def detect_pitch_keypoints(video_frames, config, field_model_path):
+    from ..pitch import PitchAnnotator
+    from ..utils.instrument import span
+    pitch_ann = PitchAnnotator(CONFIG=config, model_path=field_model_path)
+    with span("detect", frames=len(video_frames)):
+        pitch_results = pitch_ann.annotate_video_batched(video_frames=video_frames, batch_size=8)
+    # plain keypoint arrays: small and picklable, unlike the Ultralytics results
+    return {"pitch_keypoints": [pitch_ann.key_points(r) for r in pitch_results]}
+
+
+# --- data stages -------------------------------------------------------------
+
+def compute_pitch_control(pitch_keypoints, render_tracks, config, output_dir):
+    import numpy as np
+    from ..pitch import PitchAnnotator
+    from ..pitch.control import pitch_control
+    from ..pitch.voronoi import pad_positions
+
+    # same projections as the boards, without drawing anything
+    pitch_ann = PitchAnnotator(CONFIG=config, model_path=None)
+    positions, ball_xy = [], np.full((len(pitch_keypoints), 2), np.nan, dtype=np.float32)
+    for i, result in enumerate(pitch_keypoints):
+        found = pitch_ann.annotate_products_from_result(
+            None, render_tracks, i, config, result, ("voronoi_xy", "ball_xy"), kp_thresh=0.5,
+        )
+        positions.append(found["voronoi_xy"])
+        if len(found["ball_xy"]):
+            ball_xy[i] = found["ball_xy"][0]
+
+    xy, teams = pad_positions(positions)
+    control = pitch_control(config, xy, teams, ball_xy)
+    path = Path(output_dir) / "pitch_control.npz"
+    np.savez_compressed(path, **control)
+    return {"pitch_control": str(path)}
+
+
+def project_positions(pitch_keypoints, render_tracks, config):
+    # every tracked position of the clip in pitch coordinates, one projection pass
+    from ..analytics import frame_homographies, project_tracks
+    return {"pitch_positions": project_tracks(render_tracks, frame_homographies(pitch_keypoints, config))}
+
+
+def compute_physical_metrics(pitch_positions, fps, output_dir):
+    import json
+    from ..analytics import concat_columns, physical_metrics
+
+    metrics = {"fps": fps, "players": physical_metrics(concat_columns(pitch_positions), fps)}
+    path = Path(output_dir) / "physical_metrics.json"
+    path.write_text(json.dumps(metrics))
+    return {"physical_metrics": str(path)}
+
+
+def compute_heatmaps(pitch_positions, fps, config, output_dir):
+    # seconds per pitch cell, per team and per track; merges across jobs by addition
+    from ..analytics import accumulate_heatmaps, concat_columns
+    heatmaps = accumulate_heatmaps(concat_columns(pitch_positions), fps, config)
+    return {"heatmaps": heatmaps.save(Path(output_dir) / "heatmaps.npz")}
+
+
+def compute_pressure(render_tracks, pitch_positions, output_dir):
+    # the carrier is the possessor of the ball stage, as for the events
+    import numpy as np
+    from ..analytics import ball_per_frame, concat_columns, possessors, pressure_metrics
+    carrier, carrier_team = possessors(render_tracks)
+    ball_xy = ball_per_frame(pitch_positions["ball"], len(carrier))
+    pressure = pressure_metrics(concat_columns(pitch_positions), ball_xy, carrier, carrier_team)
+    path = Path(output_dir) / "pressure.npz"
+    np.savez_compressed(path, **pressure)
+    return {"pressure": str(path)}
+
+
+def extract_events(render_tracks, pitch_positions, output_dir):
+    # spells from the possession marks of the ball stage, ball travel from pitch_positions
+    import numpy as np
+    from ..analytics import EVENT_KINDS, ball_per_frame, possession_events, possession_spells, possessors
+    track, team = possessors(render_tracks)
+    spells = possession_spells(track, team)
+    events = possession_events(spells, ball_per_frame(pitch_positions["ball"], len(track)))
+    path = Path(output_dir) / "events.npz"
+    np.savez_compressed(
+        path,
+        kinds=np.array(EVENT_KINDS),
+        **{f"spell_{key}": value for key, value in spells.items()},
+        **{f"event_{key}": value for key, value in events.items()},
+    )
+    return {"events": str(path)}
+
+
+# --- render stages -----------------------------------------------------------
+
+def store_frames(video_frames, output_dir, render_workers):
+    # one memory-mappable copy of the frames for the render workers
+    if render_workers <= 1:
+        return {"frame_store": None}
+    from .render import write_frame_store
+    return {"frame_store": write_frame_store(video_frames, Path(output_dir) / "frames.npy")}
+
+
+def render_videos(products, video_frames, frame_range, config, frame_store, render_workers, render_incremental,
+                  output_dir, render_tracks=None, team_ball_control=None, pitch_keypoints=None):
+    # one fused pass over the frames for every requested product
+    from .render import FrameRenderer, render_products
+    renderer = FrameRenderer(
+        config, products, video_frames,
+        tracks=render_tracks, team_ball_control=team_ball_control, pitch_keypoints=pitch_keypoints,
+        incremental=render_incremental, frame_offset=(frame_range or (0, None))[0],
+    )
+    outputs = {product: Path(output_dir) / f"{product}.mp4" for product in products}
+    stats = render_products(
+        renderer, outputs, len(video_frames),
+        workers=render_workers, frames_path=frame_store,
+    )
+    # render_stats rides along with the products (reuse ratios, empty unless incremental)
+    return {**{product: str(path) for product, path in outputs.items()}, "render_stats": stats}
+
+
+def build_video_pipeline() -> StageGraph:
+    # Declaration order is the serial execution order. With max_parallel > 1 the
+    # track -> team -> ball branch and the keypoints branch run side by side.
+    # Model stages are queued on the inference workers, everything else renders.
+    return StageGraph([
+        Stage("decode", ("video_path", "frame_range"), ("video_frames",), decode_video),
+        Stage("probe", ("video_path",), ("fps",), probe_video),
+        Stage(
+            "track",
+            ("video_frames", "player_model_path"),
+            ("tracks",),
+            track_objects,
+            cache_key=tracks_key,
+            queue="inference",
+        ),
+        Stage(
+            "team",
+            ("tracks", "video_frames", "device", "team_model_path", "team_model_update"),
+            ("team_tracks", "team_stats"),
+            assign_teams,
+            cache_key=teams_key,
+            queue="inference",
+        ),
+        Stage(
+            "ball",
+            ("team_tracks",),
+            ("render_tracks", "team_ball_control"),
+            interpolate_ball,
+            queue="inference",
+        ),
+        Stage(
+            "keypoints",
+            ("video_frames", "config", "field_model_path"),
+            ("pitch_keypoints",),
+            detect_pitch_keypoints,
+            cache_key=keypoints_key,
+            queue="inference",
+        ),
+        Stage(
+            "pitch_control",
+            ("pitch_keypoints", "render_tracks", "config", "output_dir"),
+            ("pitch_control",),
+            compute_pitch_control,
+        ),
+        Stage(
+            "positions",
+            ("pitch_keypoints", "render_tracks", "config"),
+            ("pitch_positions",),
+            project_positions,
+        ),
+        Stage(
+            "physical_metrics",
+            ("pitch_positions", "fps", "output_dir"),
+            ("physical_metrics",),
+            compute_physical_metrics,
+        ),
+        Stage("heatmaps", ("pitch_positions", "fps", "config", "output_dir"), ("heatmaps",), compute_heatmaps),
+        Stage(
+            "pressure",
+            ("render_tracks", "pitch_positions", "output_dir"),
+            ("pressure",),
+            compute_pressure,
+        ),
+        Stage("events", ("render_tracks", "pitch_positions", "output_dir"), ("events",), extract_events),
+        Stage("frame_store", ("video_frames", "output_dir", "render_workers"), ("frame_store",), store_frames),
+        Stage(
+            "render",
+            ("video_frames", "frame_range", "config", "frame_store", "render_workers", "render_incremental",
+             "output_dir"),
+            VIDEO_PRODUCTS,
+            render_videos,
+            needs={
+                "detections": ("render_tracks", "team_ball_control"),
+                "pitch_edges": ("pitch_keypoints",),
+                "tactical_board": ("pitch_keypoints", "render_tracks"),
+                "voronoi": ("pitch_keypoints", "render_tracks"),
+            },
+        ),
+    ])
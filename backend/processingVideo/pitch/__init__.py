@@ -1,3 +1,19 @@
-from .pitch import draw_pitch, draw_points_on_pitch, draw_pitch_voronoi_diagram_2
-from .football import SoccerPitchConfiguration
-from .pitch_annotator import PitchAnnotator
\ No newline at end of file
+import importlib
+
+# pitch_annotator imports ultralytics and pitch imports supervision; load them on first use
+_LAZY_ATTRS = {
+    "draw_pitch": ".pitch",
+    "base_pitch": ".pitch",
+    "draw_points_on_pitch": ".pitch",
+    "draw_pitch_voronoi_diagram_2": ".pitch",
+    "SoccerPitchConfiguration": ".football",
+    "PitchAnnotator": ".pitch_annotator",
+    "VoronoiBoard": ".voronoi",
+}
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRS:
+        value = getattr(importlib.import_module(_LAZY_ATTRS[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,105 @@
+"""
+Pitch control as numbers.
+
+pitch_control() evaluates the soft Voronoi field of draw_pitch_voronoi_diagram_2
+(nearest player per team, same control_blend) on a coarse grid of cell
+centres over the pitch, for every frame of a clip at once, and reduces it to:
+
+    share   (F,)                 part of the pitch controlled by team 0
+    thirds  (F, 3)               the same per third, along the length
+    zones   (F, rows, cols)      per zone (rows across the width, cols along the length)
+    ball    (F,)                 control within `ball_radius` of the ball
+
+Values are team 0's control in [0, 1] (team 1 has 1 - value); NaN where the
+frame has no player (or, for `ball`, no ball). A frame with a single team
+gives that team the whole pitch, like the board.
+"""
+from typing import Tuple
+
+import numpy as np
+
+from .football import SoccerPitchConfiguration
+from .pitch import control_blend
+
+
+def _zone_weights(index: np.ndarray, n: int) -> np.ndarray:
+    """(C, n) matrix averaging the cells of each zone: control @ weights = per-zone mean."""
+    weights = np.zeros((len(index), n), dtype=np.float32)
+    weights[np.arange(len(index)), index] = 1.0
+    return weights / np.maximum(weights.sum(axis=0), 1.0)
+
+
+def pitch_control(
+    config: SoccerPitchConfiguration,
+    xy: np.ndarray,
+    teams: np.ndarray,
+    ball_xy: np.ndarray,
+    cell: float = 100.0,            # pitch units (cm)
+    zones: Tuple[int, int] = (3, 6),
+    ball_radius: float = 1000.0,    # pitch units (cm)
+    block_size: int = 32,
+) -> dict:
+    """
+    xy:      (F, N, 2) player positions in pitch coordinates
+    teams:   (F, N) team ids, 0 / 1, anything else is padding
+    ball_xy: (F, 2) ball position, NaN when unknown
+    Returns {"share", "thirds", "zones", "ball"} as float32 arrays (see module doc).
+    """
+    xy = np.asarray(xy, dtype=np.float32)
+    teams = np.asarray(teams)
+    ball_xy = np.asarray(ball_xy, dtype=np.float32).reshape(-1, 2)
+    F = len(xy)
+
+    # cell centres, row-major over (width, length)
+    nx = int(np.ceil(config.length / cell))
+    ny = int(np.ceil(config.width / cell))
+    gx = np.minimum((np.arange(nx) + 0.5) * cell, config.length).astype(np.float32)
+    gy = np.minimum((np.arange(ny) + 0.5) * cell, config.width).astype(np.float32)
+    grid_x = np.tile(gx, ny)
+    grid_y = np.repeat(gy, nx)
+
+    rows, cols = zones
+    col = np.minimum((grid_x * cols / config.length).astype(np.int64), cols - 1)
+    row = np.minimum((grid_y * rows / config.width).astype(np.int64), rows - 1)
+    third = np.minimum((grid_x * 3 / config.length).astype(np.int64), 2)
+    zone_w = _zone_weights(row * cols + col, rows * cols)
+    third_w = _zone_weights(third, 3)
+
+    out = {
+        "share": np.full(F, np.nan, dtype=np.float32),
+        "thirds": np.full((F, 3), np.nan, dtype=np.float32),
+        "zones": np.full((F, rows, cols), np.nan, dtype=np.float32),
+        "ball": np.full(F, np.nan, dtype=np.float32),
+    }
+
+    for start in range(0, F, block_size):
+        stop = min(start + block_size, F)
+        pts, team = xy[start:stop], teams[start:stop]
+
+        # squared distance of every cell to every player (B, N, C), then nearest per team
+        dx = pts[..., 0:1] - grid_x
+        dy = pts[..., 1:2] - grid_y
+        d2 = dx * dx + dy * dy
+        d2_t1 = np.where((team == 0)[..., None], d2, np.inf).min(axis=1)
+        d2_t2 = np.where((team == 1)[..., None], d2, np.inf).min(axis=1)
+
+        has_1 = (team == 0).any(axis=1)
+        has_2 = (team == 1).any(axis=1)
+        control = np.full(d2_t1.shape, np.nan, dtype=np.float32)
+        both = has_1 & has_2
+        control[both] = control_blend(d2_t1[both], d2_t2[both])
+        control[has_1 & ~has_2] = 1.0
+        control[~has_1 & has_2] = 0.0
+
+        out["share"][start:stop] = control.mean(axis=1)
+        out["thirds"][start:stop] = control @ third_w
+        out["zones"][start:stop] = (control @ zone_w).reshape(-1, rows, cols)
+
+        # mean control over the cells around the ball
+        ball = ball_xy[start:stop]
+        near = ((ball[:, 0:1] - grid_x) ** 2 + (ball[:, 1:2] - grid_y) ** 2) <= ball_radius ** 2
+        count = near.sum(axis=1)
+        seen = count > 0
+        out["ball"][start:stop][seen] = (control * near).sum(axis=1)[seen] / count[seen]
+
+    return out
@@ -1,19 +1,23 @@
 import cv2
 import numpy as np
 import supervision as sv
-from ultralytics import YOLO
 from .homography import ViewTransformer  # keep your import
-from . import SoccerPitchConfiguration, draw_pitch, draw_points_on_pitch, draw_pitch_voronoi_diagram_2
+from . import SoccerPitchConfiguration, base_pitch, draw_points_on_pitch, draw_pitch_voronoi_diagram_2
+from .voronoi import VoronoiBoard
 
 class PitchAnnotator:
     def __init__(
         self,
         CONFIG: SoccerPitchConfiguration, 
         conf: float = 0.3,
-        model_path: str = "/models/field_detection.pt",  # local YOLO weights
+        model_path: str | None = "/models/field_detection.pt",  # local YOLO weights
     ):
-        # Load local Ultralytics model
-        self.model = YOLO(model_path)
+        # Load local Ultralytics model (None: render-only, e.g. in a render worker)
+        if model_path is not None:
+            from ultralytics import YOLO
+            self.model = YOLO(model_path)
+        else:
+            self.model = None
         self.conf = float(conf)
 
         # static pitch schema (in model coordinates)
@@ -31,7 +35,11 @@ class PitchAnnotator:
             edges=self.edges
         )
 
-        self.BASE_PITCH = draw_pitch(CONFIG)
+        # shared and read-only: boards start from a copy
+        self.BASE_PITCH = base_pitch(CONFIG)
+
+        # optional temporal.MarkerBoardCache: reuse the last tactical board while nothing moved
+        self.tactical_cache = None
 
     def annotate_video_batched(self, video_frames: list[np.ndarray], batch_size: int = 16):
             # 1) batched inference
@@ -44,52 +52,62 @@ class PitchAnnotator:
             
             return results_all
 
-    def annotate_frame_from_result(
-        self,
-        frame: np.ndarray,
-        result,
-        kp_thresh: float = 0.5
-    ) -> np.ndarray:
-        canvas = frame.copy()
-
-        # 1) keypoints from precomputed Ultralytics result
-        kps = sv.KeyPoints.from_ultralytics(result)
-        if kps.xy is None or len(kps.xy) == 0 or kps.xy[0] is None:
-            return canvas
-
-        all_pts = kps.xy[0]  # (K,2)
-        if all_pts.size == 0:
-            return canvas
+    @staticmethod
+    def _start_image(image: np.ndarray, buffer: np.ndarray | None) -> np.ndarray:
+        """A writable copy of `image`, in `buffer` when one is given."""
+        if buffer is None:
+            return image.copy()
+        np.copyto(buffer, image)
+        return buffer
+
+    @staticmethod
+    def key_points(result) -> sv.KeyPoints:
+        """Keypoints of an Ultralytics result; already-converted sv.KeyPoints pass through."""
+        if isinstance(result, sv.KeyPoints):
+            return result
+        return sv.KeyPoints.from_ultralytics(result)
+
+    def correspondences(self, result, kp_thresh: float = 0.5):
+        """
+        (image points, pitch model points) of the confident keypoints, or None
+        when there are fewer than 4 (no homography).
+        """
+        kps = self.key_points(result)
+        if kps.xy is None or len(kps.xy) == 0 or kps.xy[0] is None or kps.xy[0].size == 0:
+            return None
 
-        # confidences (fallback to ones)
-        confidences = (
+        xy = kps.xy[0]  # (K,2)
+        conf = (
             kps.confidence[0].astype(np.float32)
             if (kps.confidence is not None and len(kps.confidence) > 0 and kps.confidence[0] is not None)
-            else np.ones((all_pts.shape[0],), dtype=np.float32)
+            else np.ones((len(xy),), np.float32)
         )
 
-        # 2) correspondences (model/pitch -> image)
-        K = min(len(self.vertices), len(all_pts))
-        if K == 0:
-            return canvas
-
-        mask = (confidences[:K] > kp_thresh)
-        src_pts = self.vertices[:K][mask]                 # model-space
-        dst_pts = all_pts[:K][mask]                        # image-space
-
-        # 3) homography + draw if we have enough pairs
-        if src_pts.shape[0] >= 4:
-            transformer = ViewTransformer(
-                source=src_pts.astype(np.float32),
-                target=dst_pts.astype(np.float32)
-            )
-            frame_all_points = transformer.transform_points(self.vertices.astype(np.float32))
-            kp_all = sv.KeyPoints(xy=frame_all_points[np.newaxis, ...])
-
-            canvas = self.edge_annotator.annotate(scene=canvas, key_points=kp_all)
-            canvas = self.vertex_annotator.annotate(scene=canvas, key_points=kp_all)
+        K = min(len(self.vertices), len(xy))
+        mask = conf[:K] > kp_thresh
+        src_img = xy[:K][mask].astype(np.float32)                 # image-space
+        dst_pitch = self.vertices[:K][mask].astype(np.float32)    # pitch model-space
+        if src_img.shape[0] < 4:
+            return None
+        return src_img, dst_pitch
+
+    def image_to_pitch(self, result, kp_thresh: float = 0.5):
+        """Image -> pitch ViewTransformer of a frame's keypoints, or None."""
+        pairs = self.correspondences(result, kp_thresh)
+        if pairs is None:
+            return None
+        src_img, dst_pitch = pairs
+        return ViewTransformer(source=src_img, target=dst_pitch)
 
-        return canvas
+    def annotate_frame_from_result(
+        self,
+        frame: np.ndarray,
+        result,
+        kp_thresh: float = 0.5
+    ) -> np.ndarray:
+        return self.annotate_products_from_result(
+            frame, None, None, None, result, ("pitch_edges",), kp_thresh=kp_thresh
+        )["pitch_edges"]
 
     def tx(self, track_dict, transformer) -> np.ndarray:
         """
@@ -127,7 +145,7 @@ class PitchAnnotator:
 
         pts = np.asarray(pts, dtype=np.float32).reshape(-1, 2)
         return transformer.transform_points(points=pts)
-    
+
 
     def annotate_tactical_board_from_result(
         self,
@@ -138,82 +156,9 @@ class PitchAnnotator:
         result,
         kp_thresh: float = 0.5,
     ) -> np.ndarray:
-        
-        # 1) keypoints from Ultralytics result
-        key_points = sv.KeyPoints.from_ultralytics(result)
-        if key_points.xy is None or len(key_points.xy) == 0 or key_points.xy[0] is None:
-            return self.BASE_PITCH.copy()
-
-        xy = key_points.xy[0]
-        if xy.size == 0:
-            return self.BASE_PITCH.copy()
-
-        conf = (
-            key_points.confidence[0].astype(np.float32)
-            if (key_points.confidence is not None and len(key_points.confidence) > 0 and key_points.confidence[0] is not None)
-            else np.ones((len(xy),), np.float32)
-        )
-
-        # 2) image -> pitch correspondences
-        mask = conf > kp_thresh
-        src_pts = xy[mask]
-        dst_pts = np.array(CONFIG.vertices, dtype=np.float32)[mask]
-        if src_pts.shape[0] < 4:
-            return self.BASE_PITCH.copy()
-
-        transformer = ViewTransformer(source=src_pts.astype(np.float32),
-                                    target=dst_pts.astype(np.float32))
-
-        # 3) transform tracks
-        ball_dict    = tracks["ball"][frame_idx]
-        player_dict  = tracks["players"][frame_idx]
-        referee_dict = tracks["referees"][frame_idx]
-
-        pitch_ball    = self.tx(ball_dict, transformer)
-        pitch_players = self.tx(player_dict, transformer)
-        pitch_refs    = self.tx(referee_dict, transformer)
-
-        # 4) draw on cached base
-        board = self.BASE_PITCH.copy()
-
-        board = draw_points_on_pitch(
-            config=CONFIG,
-            xy=pitch_ball,
-            face_color=sv.Color.WHITE,
-            edge_color=sv.Color.BLACK,
-            radius=10,
-            thickness=2,
-            pitch=board,
-        )
-
-        player_colors = [info["team_color"] for info in player_dict.values()]
-        buckets = {}
-        for idx, color in enumerate(player_colors):
-            buckets.setdefault(tuple(color), []).append(idx)
-
-        for (b, g, r), indices in buckets.items():
-            pts = pitch_players[indices] if pitch_players.size else np.empty((0, 2), np.float32)
-            board = draw_points_on_pitch(
-                config=CONFIG,
-                xy=pts,
-                face_color=sv.Color(r=r, g=g, b=b),
-                edge_color=sv.Color.BLACK,
-                radius=16,
-                thickness=2,
-                pitch=board,
-            )
-
-        board = draw_points_on_pitch(
-            config=CONFIG,
-            xy=pitch_refs,
-            face_color=sv.Color.from_hex("FFD700"),
-            edge_color=sv.Color.BLACK,
-            radius=16,
-            thickness=2,
-            pitch=board,
-        )
-
-        return board
+        return self.annotate_products_from_result(
+            frame, tracks, frame_idx, CONFIG, result, ("tactical_board",), kp_thresh=kp_thresh
+        )["tactical_board"]
 
 
     def annotate_voronoi_from_result(
@@ -226,163 +171,162 @@ class PitchAnnotator:
         kp_thresh: float = 0.5,
         vor_step: int = 3,   # 2–4 is a good speed/quality tradeoff
     ) -> np.ndarray:
-        key_points = sv.KeyPoints.from_ultralytics(result)
-        if key_points.xy is None or len(key_points.xy) == 0 or key_points.xy[0] is None:
-            return self.BASE_PITCH.copy()
+        return self.annotate_products_from_result(
+            frame, tracks, frame_idx, CONFIG, result, ("voronoi",), kp_thresh=kp_thresh, vor_step=vor_step
+        )["voronoi"]
 
-        xy = key_points.xy[0]
-        if xy.size == 0:
-            return self.BASE_PITCH.copy()
 
-        conf = (
-            key_points.confidence[0].astype(np.float32)
-            if (key_points.confidence is not None and len(key_points.confidence) > 0 and key_points.confidence[0] is not None)
-            else np.ones((len(xy),), np.float32)
+    def annotate_all_from_result(
+        self,
+        frame: np.ndarray,
+        tracks: dict,
+        frame_idx: int,
+        CONFIG,
+        result,
+        kp_thresh: float = 0.5
+    ):
+        """Same as annotate_all, but uses a precomputed Ultralytics `result`."""
+        out = self.annotate_products_from_result(
+            frame, tracks, frame_idx, CONFIG, result,
+            ("pitch_edges", "tactical_board", "voronoi"), kp_thresh=kp_thresh,
         )
+        return out["pitch_edges"], out["tactical_board"], out["voronoi"]
 
-        mask = conf > kp_thresh
-        src_pts = xy[mask]
-        dst_pts = np.array(CONFIG.vertices, dtype=np.float32)[mask]
-        if src_pts.shape[0] < 4:
-            return self.BASE_PITCH.copy()
-
-        transformer = ViewTransformer(source=src_pts.astype(np.float32),
-                                    target=dst_pts.astype(np.float32))
-
-        player_dict  = tracks["players"][frame_idx]
-
-        pitch_players = self.tx(player_dict, transformer)
-        if pitch_players.size == 0:
-            return self.BASE_PITCH.copy()
 
-        teams = np.array([info["team"] for info in player_dict.values()], dtype=int) if len(player_dict) else np.array([], int)
-        team1_xy = pitch_players[teams == 0] if teams.size else np.empty((0, 2), np.float32)
-        team2_xy = pitch_players[teams == 1] if teams.size else np.empty((0, 2), np.float32)
-
-        # Use cached base pitch and optimized voronoi (with step)
-        board = draw_pitch_voronoi_diagram_2(
+    def voronoi_board(self, CONFIG, vor_step: int = 3, block_size: int = 8, incremental: bool = False) -> VoronoiBoard:
+        """Block renderer for the Voronoi product, same look as annotate_voronoi_from_result."""
+        return VoronoiBoard(
             config=CONFIG,
-            team_1_xy=team1_xy,
-            team_2_xy=team2_xy,
             team_1_color=sv.Color.from_hex("00BFFF"),
             team_2_color=sv.Color.from_hex("FF1493"),
             opacity=0.5,
             padding=50,
             scale=0.1,
-            pitch=self.BASE_PITCH.copy(),
-            
+            step=vor_step,
+            pitch=self.BASE_PITCH,
+            block_size=block_size,
+            incremental=incremental,
         )
-        return board
 
 
-    def annotate_all_from_result(
+    def annotate_products_from_result(
         self,
         frame: np.ndarray,
         tracks: dict,
         frame_idx: int,
         CONFIG,
         result,
-        kp_thresh: float = 0.5
-    ):
-        """Same as annotate_all, but uses a precomputed Ultralytics `result`."""
-        canvas = frame.copy()
-
-        # 1) keypoints once
-        kps = sv.KeyPoints.from_ultralytics(result)
-
-        # Defaults if no keypoints
-        frame_annotated = canvas
-        tactical_board = self.BASE_PITCH.copy()
-        voronoi_board = self.BASE_PITCH.copy()
-
-        if kps.xy is None or len(kps.xy) == 0 or kps.xy[0] is None or kps.xy[0].size == 0:
-            return frame_annotated, tactical_board, voronoi_board
-
-        xy = kps.xy[0]
-        conf = (
-            kps.confidence[0].astype(np.float32)
-            if (kps.confidence is not None and len(kps.confidence) > 0 and kps.confidence[0] is not None)
-            else np.ones((len(xy),), np.float32)
-        )
-
-        # 2) build correspondences & transformers
-        mask = conf > kp_thresh
-        src_img = xy[mask]                          # image-space
-        dst_pitch = np.array(CONFIG.vertices)[mask] # pitch model-space
-
-        have_H = src_img.shape[0] >= 4
-        if have_H:
-            T_i2p = ViewTransformer(source=src_img.astype(np.float32),
-                                    target=dst_pitch.astype(np.float32))   # image -> pitch
-            T_p2i = ViewTransformer(source=dst_pitch.astype(np.float32),
-                                    target=src_img.astype(np.float32))     # pitch -> image
-        else:
-            T_i2p = T_p2i = None
-
-        # 3) frame overlay (pitch->image)
-        if T_p2i is not None:
+        products,
+        kp_thresh: float = 0.5,
+        vor_step: int = 3,
+        dst: dict | None = None,
+    ) -> dict:
+        """
+        Fused per-frame render of the pitch products. Keypoints, homographies
+        and track projections are computed once and shared by the requested
+        `products` ("pitch_edges", "tactical_board", "voronoi"); nothing is
+        computed for products that were not asked for. `vor_step` is the
+        Voronoi grid downsample factor.
+        "voronoi_xy" instead of "voronoi" returns the players' pitch positions
+        and team ids, for rendering the boards block-wise with voronoi_board();
+        "ball_xy" returns the ball's pitch position(s).
+        `dst` optionally maps "pitch_edges" / "tactical_board" to reused
+        buffers the images are drawn into instead of fresh copies.
+        Returns {product: image}.
+        """
+        products = set(products)
+        want_edges = "pitch_edges" in products
+        want_boards = bool(products & {"tactical_board", "voronoi", "voronoi_xy", "ball_xy"})
+
+        # Defaults if no keypoints / no homography
+        dst = dst or {}
+        out = {}
+        if want_edges:
+            out["pitch_edges"] = self._start_image(frame, dst.get("pitch_edges"))
+        for product in ("tactical_board", "voronoi"):
+            if product in products:
+                out[product] = self._start_image(self.BASE_PITCH, dst.get(product))
+        if "voronoi_xy" in products:
+            out["voronoi_xy"] = (np.empty((0, 2), np.float32), np.empty((0,), int))
+        if "ball_xy" in products:
+            out["ball_xy"] = np.empty((0, 2), np.float32)
+
+        # 1) + 2) keypoints once, correspondences (pitch model <-> image)
+        pairs = self.correspondences(result, kp_thresh)
+        if pairs is None:
+            return out
+        src_img, dst_pitch = pairs
+
+        # 3) frame overlay (pitch -> image)
+        if want_edges:
+            T_p2i = ViewTransformer(source=dst_pitch, target=src_img)
             frame_all_points = T_p2i.transform_points(self.vertices.astype(np.float32))
             kp_all = sv.KeyPoints(xy=frame_all_points[np.newaxis, ...])
-            frame_annotated = self.edge_annotator.annotate(scene=canvas, key_points=kp_all)
-            frame_annotated = self.vertex_annotator.annotate(scene=frame_annotated, key_points=kp_all)
-
-        # 4) transform tracks (image->pitch)
+            canvas = self.edge_annotator.annotate(scene=out["pitch_edges"], key_points=kp_all)
+            out["pitch_edges"] = self.vertex_annotator.annotate(scene=canvas, key_points=kp_all)
 
-        ball_dict    = tracks["ball"][frame_idx]
-        player_dict  = tracks["players"][frame_idx]
-        referee_dict = tracks["referees"][frame_idx]
+        if not want_boards:
+            return out
 
-        pitch_ball    = self.tx(ball_dict, T_i2p)
+        # 4) transform tracks (image -> pitch)
+        T_i2p = ViewTransformer(source=src_img, target=dst_pitch)
+        player_dict = tracks["players"][frame_idx]
         pitch_players = self.tx(player_dict, T_i2p)
-        pitch_refs    = self.tx(referee_dict, T_i2p)
+        if products & {"tactical_board", "ball_xy"}:
+            pitch_ball = self.tx(tracks["ball"][frame_idx], T_i2p)
+        if "ball_xy" in products:
+            out["ball_xy"] = pitch_ball
 
         # 5) tactical board
-        tactical_board = draw_points_on_pitch(
-            config=CONFIG,
-            xy=pitch_ball,
-            face_color=sv.Color.WHITE,
-            edge_color=sv.Color.BLACK,
-            radius=10,
-            thickness=2,
-            pitch=tactical_board,
-        )
-
-        player_colors = [info["team_color"] for info in player_dict.values()]
-        seen = {}
-        for idx, color in enumerate(player_colors):
-            seen.setdefault(color, []).append(idx)
-        for team_color, indices in seen.items():
-            pts = pitch_players[indices] if pitch_players.size else np.empty((0, 2), np.float32)
-            b, g, r = team_color
-            col = sv.Color(r=r, g=g, b=b)
-            tactical_board = draw_points_on_pitch(
-                config=CONFIG,
-                xy=pts,
-                face_color=col,
-                edge_color=sv.Color.BLACK,
-                radius=16,
-                thickness=2,
-                pitch=tactical_board,          # <- keyword!
-            )
-
-        tactical_board = draw_points_on_pitch(
-            config=CONFIG,
-            xy=pitch_refs,
-            face_color=sv.Color.from_hex("FFD700"),
-            edge_color=sv.Color.BLACK,
-            radius=16,
-            thickness=2,
-            pitch=tactical_board,          # <- keyword!
-        )
+        if "tactical_board" in products:
+            pitch_refs = self.tx(tracks["referees"][frame_idx], T_i2p)
+
+            # markers in drawing order: ball, players per team colour, referees
+            layers = [(pitch_ball, sv.Color.WHITE, 10)]
+
+            buckets = {}
+            for idx, info in enumerate(player_dict.values()):
+                buckets.setdefault(tuple(info["team_color"]), []).append(idx)
+
+            for (b, g, r), indices in buckets.items():
+                pts = pitch_players[indices] if pitch_players.size else np.empty((0, 2), np.float32)
+                layers.append((pts, sv.Color(r=r, g=g, b=b), 16))
+
+            layers.append((pitch_refs, sv.Color.from_hex("FFD700"), 16))
+
+            cache_key = [(xy, (color.as_bgr(), radius)) for xy, color, radius in layers]
+            cached = self.tactical_cache.get(cache_key) if self.tactical_cache is not None else None
+            board = out["tactical_board"]
+            if cached is not None:
+                np.copyto(board, cached)  # the cache keeps its own copy, hand out ours
+            else:
+                for xy, color, radius in layers:
+                    board = draw_points_on_pitch(
+                        config=CONFIG,
+                        xy=xy,
+                        face_color=color,
+                        edge_color=sv.Color.BLACK,
+                        radius=radius,
+                        thickness=2,
+                        pitch=board,
+                    )
+                if self.tactical_cache is not None:
+                    self.tactical_cache.put(cache_key, board)
+            out["tactical_board"] = board
+
+        if not products & {"voronoi", "voronoi_xy"}:
+            return out
 
+        teams = np.array([info["team"] for info in player_dict.values()], dtype=int) if len(player_dict) else np.array([], int)
+        if "voronoi_xy" in products:
+            out["voronoi_xy"] = (pitch_players, teams)
 
         # 6) voronoi board (guard empty)
-        teams = np.array([info["team"] for info in player_dict.values()], dtype=int) if len(player_dict) else np.array([], int)
-        if pitch_players.size and teams.size:
+        if "voronoi" in products and pitch_players.size:
             team1_xy = pitch_players[teams == 0]
             team2_xy = pitch_players[teams == 1]
             if not (team1_xy.size == 0 and team2_xy.size == 0):
-                voronoi_board = draw_pitch_voronoi_diagram_2(
+                out["voronoi"] = draw_pitch_voronoi_diagram_2(
                     config=CONFIG,
                     team_1_xy=team1_xy,
                     team_2_xy=team2_xy,
@@ -391,7 +335,8 @@ class PitchAnnotator:
                     opacity=0.5,
                     padding=50,
                     scale=0.1,
-                    pitch=None
+                    pitch=out["voronoi"],
+                    step=vor_step,
                 )
 
-        return frame_annotated, tactical_board, voronoi_board
+        return out
@@ -0,0 +1,58 @@
+"""
+Frame-to-frame reuse for the tactical board.
+
+Players move a few centimetres between frames, so most tactical boards are a
+redraw of the previous one. MarkerBoardCache keeps the last drawn board with
+the marker positions it was drawn from and hands it back while every marker is
+still within `move_thresh` (pitch units, cm) of those positions. Markers on a
+reused board are therefore never more than `move_thresh` away from where they
+belong; with move_thresh=0 only identical layouts are reused.
+"""
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# (points (N, 2) in pitch coordinates, key identifying the marker style)
+Layer = Tuple[np.ndarray, tuple]
+
+
+class MarkerBoardCache:
+    def __init__(self, move_thresh: float = 10.0):
+        self.move_thresh = float(move_thresh)
+        self.stats = {"frames": 0, "frames_reused": 0}
+        self._board: Optional[np.ndarray] = None  # own copy of the last board, buffer kept across resets
+        self.reset()
+
+    def reset(self) -> None:
+        self._layers: Optional[List[Layer]] = None
+
+    def get(self, layers: List[Layer]) -> Optional[np.ndarray]:
+        """The cached board if `layers` matches the cached layout, else None. Read-only, valid until the next put()."""
+        self.stats["frames"] += 1
+        if self._layers is None or not self._same_layout(layers):
+            return None
+        self.stats["frames_reused"] += 1
+        return self._board
+
+    def put(self, layers: List[Layer], board: np.ndarray) -> None:
+        """Keeps a copy of `board` (the caller's buffer may be reused for later frames)."""
+        self._layers = [(np.asarray(xy, dtype=np.float32).reshape(-1, 2), key) for xy, key in layers]
+        if self._board is None or self._board.shape != board.shape:
+            self._board = np.empty_like(board)
+        np.copyto(self._board, board)
+
+    def _same_layout(self, layers: List[Layer]) -> bool:
+        if len(layers) != len(self._layers):
+            return False
+        for (xy, key), (ref, ref_key) in zip(layers, self._layers):
+            xy = np.asarray(xy, dtype=np.float32).reshape(-1, 2)
+            if key != ref_key or len(xy) != len(ref):
+                return False
+            if len(xy) == 0:
+                continue
+            # marker order may change between frames: match every marker to its nearest
+            # cached one, both ways (with equal counts this bounds every displacement)
+            d = np.sqrt(((xy[:, None, :] - ref[None, :, :]) ** 2).sum(-1))
+            if d.min(axis=1).max() > self.move_thresh or d.min(axis=0).max() > self.move_thresh:
+                return False
+        return True
@@ -1 +1,9 @@
-from .team_assigner import TeamAssigner
\ No newline at end of file
+import importlib
+
+# team_assigner imports torch, transformers, UMAP and scikit-learn; load them on first use
+def __getattr__(name: str):
+    if name == "TeamAssigner":
+        value = importlib.import_module(".team_assigner", __name__).TeamAssigner
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
\ No newline at end of file
@@ -0,0 +1,67 @@
+from typing import List, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+
+def crop_dhash(crop: np.ndarray, hash_size: int = 8):
+    """
+    Difference hash of a crop: grayscale, shrink to (hash_size+1, hash_size)
+    and compare horizontally adjacent pixels. Returns a 64-bit int (for the
+    default size) or None for an empty crop.
+    """
+    if crop is None or crop.size == 0:
+        return None
+
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+class CropDeduplicator:
+    """
+    Skips crops of near-static players before embedding.
+
+    Crops are grouped by track id. A crop is skipped when, compared with the last
+    crop that was actually embedded for the same track, its bbox moved less than
+    `move_thresh` pixels (largest corner shift) and its dHash differs by at most
+    `hash_tolerance` bits. Skipped crops reuse that embedding.
+    """
+    def __init__(self, move_thresh: float = 2.0, hash_tolerance: int = 2):
+        self.move_thresh = float(move_thresh)
+        self.hash_tolerance = int(hash_tolerance)
+
+    def dedup(
+        self,
+        crops: List[np.ndarray],
+        bboxes: Sequence[Sequence[float]],
+        track_ids: Sequence[int],
+    ) -> Tuple[List[int], np.ndarray]:
+        """
+        crops/bboxes/track_ids are aligned and in frame order.
+        Returns:
+            keep:    indices (into crops) of the crops that must be embedded
+            inverse: (N,) array mapping every crop to its row in the embedded set,
+                     i.e. features_all = features_kept[inverse]
+        """
+        keep: List[int] = []
+        inverse = np.empty(len(crops), dtype=np.int64)
+        last = {}  # track_id -> (bbox, hash, row in keep)
+
+        for i, (crop, bbox, tid) in enumerate(zip(crops, bboxes, track_ids)):
+            box = np.asarray(bbox, dtype=np.float32)
+            h = crop_dhash(crop)
+
+            prev = last.get(tid)
+            if prev is not None and h is not None and prev[1] is not None:
+                moved = float(np.abs(box - prev[0]).max())
+                if moved < self.move_thresh and bin(h ^ prev[1]).count("1") <= self.hash_tolerance:
+                    inverse[i] = prev[2]
+                    continue
+
+            inverse[i] = len(keep)
+            last[tid] = (box, h, len(keep))
+            keep.append(i)
+
+        return keep, inverse
@@ -54,6 +54,8 @@ class TeamClassifier:
         self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-base-patch32", use_fast=True)
         self.reducer = umap.UMAP(n_components=3)
         self.cluster_model = KMeans(n_clusters=2)
+        # number of projections behind each cluster centre (used by update())
+        self.cluster_counts = None
 
 
     def extract_features(self, crops: List[np.ndarray]) -> np.ndarray:
@@ -85,9 +87,73 @@ class TeamClassifier:
         """
         Fit the classifier model on a list of image crops.
         """
-        data = self.extract_features(crops)
+        self.fit_features(self.extract_features(crops))
+
+
+    def fit_features(self, data: np.ndarray) -> None:
+        """
+        Fit the reducer and clustering on precomputed (N, D) embeddings.
+        """
         projections = self.reducer.fit_transform(data)
         self.cluster_model.fit(projections)
+        self.cluster_counts = np.bincount(
+            self.cluster_model.labels_, minlength=self.cluster_model.n_clusters
+        ).astype(np.float64)
+
+
+    def update(self, crops: List[np.ndarray]) -> None:
+        """
+        Incrementally refine an already fitted model with new crops.
+        The reducer is kept frozen and each cluster centre moves to the running
+        mean of the projections assigned to it, so cluster ids (teams) stay stable.
+        """
+        if len(crops) == 0:
+            return
+        self.update_features(self.extract_features(crops))
+
+
+    def update_features(self, data: np.ndarray) -> None:
+        """
+        Same as update(), on precomputed (N, D) embeddings.
+        """
+        if len(data) == 0:
+            return
+
+        projections = self.reducer.transform(data)
+        labels = self.cluster_model.predict(projections)
+
+        centres = self.cluster_model.cluster_centers_
+        if self.cluster_counts is None:
+            self.cluster_counts = np.zeros(centres.shape[0], dtype=np.float64)
+
+        for k in range(centres.shape[0]):
+            pts = projections[labels == k]
+            if len(pts) == 0:
+                continue
+            n_old = self.cluster_counts[k]
+            centres[k] = (centres[k] * n_old + pts.sum(axis=0)) / (n_old + len(pts))
+            self.cluster_counts[k] = n_old + len(pts)
+
+
+    def get_state(self) -> dict:
+        """
+        Fitted parts of the classifier (reducer + clustering), without the
+        embedding model which is always loaded from pretrained weights.
+        """
+        return {
+            "reducer": self.reducer,
+            "cluster_model": self.cluster_model,
+            "cluster_counts": self.cluster_counts,
+        }
+
+
+    def set_state(self, state: dict) -> None:
+        """
+        Restore a state produced by get_state().
+        """
+        self.reducer = state["reducer"]
+        self.cluster_model = state["cluster_model"]
+        self.cluster_counts = state.get("cluster_counts")
 
 
     def predict(self, crops: List[np.ndarray]) -> np.ndarray:
@@ -98,6 +164,15 @@ class TeamClassifier:
         if len(crops) == 0:
             return np.array([])
 
-        data = self.extract_features(crops)
+        return self.predict_features(self.extract_features(crops))
+
+
+    def predict_features(self, data: np.ndarray) -> np.ndarray:
+        """
+        Predict cluster labels for precomputed (N, D) embeddings.
+        """
+        if len(data) == 0:
+            return np.array([])
+
         projections = self.reducer.transform(data)
         return self.cluster_model.predict(projections)
\ No newline at end of file
@@ -1,20 +1,84 @@
+import fcntl
+import os
+import pickle
 import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
 from sklearn.cluster import KMeans
 from .team import TeamClassifier
+from .dedup import CropDeduplicator
 from collections import deque, Counter
 from ..utils import get_center_of_bbox, measure_distance
+from ..utils.instrument import span
+
+TEAM_COLORS = {
+    0: (0, 191, 255),
+    1: (255, 20, 147)
+}
+
+
+@contextmanager
+def match_model_lock(path):
+    """
+    Exclusive lock of a match-level team model (a .lock file next to it),
+    held by one process at a time; released by the OS if its holder dies.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path.with_name(path.name + ".lock"), "w") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
 
 
 class TeamAssigner:
-    def __init__(self, device='cpu', batch_size=32):
+    FIT_EVERY_N_FRAMES = 30  # fitting crop sampling
+
+    def __init__(self, device='cpu', batch_size=32, team_colors=None,
+                 dedup_move_thresh=2.0, dedup_hash_tolerance=2):
         self.team_classifier = TeamClassifier(device=device, batch_size=batch_size)
+        self.team_colors = dict(team_colors or TEAM_COLORS)
+        self.deduplicator = CropDeduplicator(
+            move_thresh=dedup_move_thresh,
+            hash_tolerance=dedup_hash_tolerance,
+        )
+        # filled by assign_teams(), reported per job
+        self.stats = {}
 
 
-    def collect_crops_from_tracks(self, tracks, video_frames):
+    def save_team_model(self, path):
+        """
+        Persist the fitted team model (reducer, cluster centres, team colours)
+        so later clips of the same match can reuse it.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        state = self.team_classifier.get_state()
+        state["team_colors"] = self.team_colors
+
+        # write to a temp file first so a concurrent reader never sees half a pickle
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as fh:
+            pickle.dump(state, fh)
+        os.replace(tmp, path)
+
+
+    def load_team_model(self, path):
+        with open(path, "rb") as fh:
+            state = pickle.load(fh)
+        self.team_classifier.set_state(state)
+        self.team_colors = dict(state.get("team_colors") or TEAM_COLORS)
+
 
-        # Otherwise, compute crops fresh
+    def collect_crops_from_tracks(self, tracks, video_frames):
+        """
+        Every player crop of the clip, with its (frame, track id). The fitting
+        subset (every FIT_EVERY_N_FRAMES-th frame) is picked by assign_teams.
+        """
         all_crops = []
-        fitting_crops = []
         player_info = []
 
         for frame_num, player_track in enumerate(tracks['players']):
@@ -25,30 +89,66 @@ class TeamAssigner:
                 all_crops.append(crop)
                 player_info.append((frame_num, player_id))
 
-                if frame_num % 30 == 0:  # fitting crop sampling
-                    fitting_crops.append(crop)
-
-        return fitting_crops, all_crops, player_info
+        return all_crops, player_info
     
 
 
-    def assign_teams(self, tracks, video_frames):
+    def assign_teams(self, tracks, video_frames, model_path=None, update=False):
+        """
+        model_path: optional match-level team model. If it exists it is loaded
+                    instead of fitting (and refined with this clip when update=True),
+                    otherwise the model fitted here is saved there.
+        """
         # 1. Collect crops
-        fitting_crops, all_crops, player_info = self.collect_crops_from_tracks(tracks, video_frames)
-
-        # 2. Fit the team classifier using only fitting_crops
-        self.team_classifier.fit(fitting_crops)
+        with span("crops", frames=len(video_frames)) as counts:
+            all_crops, player_info = self.collect_crops_from_tracks(tracks, video_frames)
+            counts["items"] = len(all_crops)
+
+        # 2. Embed each distinct crop once; near-static players reuse the
+        #    last embedding of their track
+        keep, inverse = self.deduplicator.dedup(
+            all_crops,
+            [tracks['players'][f][pid]['bbox'] for f, pid in player_info],
+            [pid for _, pid in player_info],
+        )
+        with span("embed", items=len(keep)):
+            features = self.team_classifier.extract_features([all_crops[i] for i in keep])
+        self.stats = {
+            "crops_total": len(all_crops),
+            "crops_embedded": len(keep),
+            "crops_skipped": len(all_crops) - len(keep),
+        }
 
-        # 3. Predict on all crops
-        team_ids = self.team_classifier.predict(all_crops)
+        # fitting crops are a subset of all crops, so reuse their embeddings
+        fit_idx = [i for i, (f, _) in enumerate(player_info) if f % self.FIT_EVERY_N_FRAMES == 0]
+        fitting_features = features[inverse[fit_idx]]
 
-        team_colors = {
-            0: (0, 191, 255),
-            1: (255, 20, 147)  
-        }
+        # 3. Fit the team classifier using only fitting crops (or reuse the match model)
+        with span("cluster", items=len(fitting_features)):
+            if model_path is None:
+                self.team_classifier.fit_features(fitting_features)
+            else:
+                # clips and segments of a match run side by side: the first to get
+                # here fits and saves the model, the others wait and load it
+                with match_model_lock(model_path):
+                    if Path(model_path).exists():
+                        self.load_team_model(model_path)
+                        if update:
+                            self.team_classifier.update_features(fitting_features)
+                            self.save_team_model(model_path)
+                    else:
+                        self.team_classifier.fit_features(fitting_features)
+                        self.save_team_model(model_path)
+
+        # 4. Predict on the embedded crops and expand back to all crops
+        with span("predict", items=len(features)):
+            team_ids = self.team_classifier.predict_features(features)
+        team_ids = team_ids[inverse] if len(team_ids) else team_ids
+
+        team_colors = self.team_colors
         history = {}
 
-        # 4. Assign predicted teams back to all players
+        # 5. Assign predicted teams back to all players
         for (frame_num, player_id), raw_team in zip(player_info, team_ids):
             buf = history.setdefault(player_id, deque(maxlen=3))
             buf.append(raw_team)
@@ -1 +1,9 @@
-from .tracker import Tracker
+import importlib
+
+# tracker imports ultralytics and supervision; load them on first use
+def __getattr__(name: str):
+    if name == "Tracker":
+        value = importlib.import_module(".tracker", __name__).Tracker
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -4,17 +4,25 @@ import pickle
 import os
 import sys
 sys.path.append('../')
-from ..utils import get_center_of_bbox, get_foot_position, draw_ellipse, draw_triangle, measure_distance, draw_team_ball_control
+from ..utils import get_center_of_bbox, get_foot_position, measure_distance, ball_control_shares, draw_tracks
+from ..utils.instrument import span
 import cv2
 import numpy as np
-import pandas as pd
 
 class Tracker:
     def __init__(self, model_path: str = 'models/player_detection.pt'):
-        self.model = YOLO(model_path)
+        self.model_path = model_path
+        self._model = None
         self.tracker = sv.ByteTrack()
         self.max_player_ball_distance = 70
 
+    @property
+    def model(self):
+        # loaded on first detection: the ball / possession helpers do not need it
+        if self._model is None:
+            self._model = YOLO(self.model_path)
+        return self._model
+
 
 
     def add_position_to_track(self, tracks):
@@ -70,8 +78,15 @@ class Tracker:
             
 
     def get_object_tracks(self, frames):
-        detections = self.detect_frames(frames)
+        with span("detect", frames=len(frames)) as counts:
+            detections = self.detect_frames(frames)
+            counts["items"] = sum(len(d.boxes) if d.boxes is not None else 0 for d in detections)
+        with span("track", frames=len(detections)) as counts:
+            tracks = self._track_detections(detections)
+            counts["items"] = sum(len(frame) for name in ("players", "goalkeepers", "referees") for frame in tracks[name])
+        return tracks
 
+    def _track_detections(self, detections):
         tracks = {
             'players': [],
             'goalkeepers': [],
@@ -175,16 +190,15 @@ class Tracker:
         return None
 
 
-    def draw_annotations(self, video_frames, tracks):
-        output_video_frames = []
+    def assign_ball_possession(self, tracks):
+        """
+        Marks 'has_ball' on the player closest to the ball in every frame and
+        returns the team in control per frame (the last known team while the
+        ball is free or missing).
+        """
         team_ball_control = []
-        tracks['ball'] = self.interpolate_ball_positions(tracks['ball'])
-        for frame_num, frame in enumerate(video_frames):
-            frame = frame.copy()
-
-            player_dict = tracks['players'][frame_num]
+        for frame_num, player_dict in enumerate(tracks['players']):
             goalkeeper_dict = tracks['goalkeepers'][frame_num]
-            referee_dict = tracks['referees'][frame_num]
             ball_dict = tracks['ball'][frame_num]
 
             for p in player_dict.values():
@@ -192,10 +206,11 @@ class Tracker:
             for g in goalkeeper_dict.values():
                 g['has_ball'] = False
 
-            # --- 1) assign ball to player ---
             ball_info = ball_dict.get(1)
-            
-            assigned = self.assign_ball_to_player(player_dict, ball_info['bbox'])
+            assigned = None
+            if ball_info is not None:
+                assigned = self.assign_ball_to_player(player_dict, ball_info['bbox'])
+
             if assigned is not None:
                 # mark that player
                 player_dict[assigned]['has_ball'] = True
@@ -205,34 +220,16 @@ class Tracker:
                 last = team_ball_control[-1] if team_ball_control else None
                 team_ball_control.append(last)
 
+        return team_ball_control
 
+    def draw_annotations(self, video_frames, tracks, interpolate_ball=True):
+        if interpolate_ball:
+            tracks['ball'] = self.interpolate_ball_positions(tracks['ball'])
+        team_ball_control = self.assign_ball_possession(tracks)
+        shares = ball_control_shares(team_ball_control)
 
-            # --- 2) draw players ---
-            for track_id, player in player_dict.items():
-                color = player.get('team_color', (0, 0, 255))
-                frame = draw_ellipse(frame, player['bbox'], color, track_id)
-
-                if player.get('has_ball', False):
-                    frame = draw_triangle(frame, player['bbox'], (0, 0, 255))
-
-            # --- 3) draw goalkeepers ---
-            for track_id, goalkeeper in goalkeeper_dict.items():
-                color = goalkeeper.get('team_color', (0, 0, 255))
-                frame = draw_ellipse(frame, goalkeeper['bbox'], color, track_id)
-
-                if goalkeeper.get('has_ball', False):
-                    frame = draw_triangle(frame, goalkeeper['bbox'], (0, 0, 255))
-
-            # --- 4) draw referees ---
-            for track_id, referee in referee_dict.items():
-                frame = draw_ellipse(frame, referee['bbox'], (0, 255, 255))
-            
-            # --- 5) draw the raw ball if you like (optional) ---
-            for track_id, ball in ball_dict.items():
-                frame = draw_triangle(frame, ball['bbox'], (0, 255, 0))
-
-            frame = draw_team_ball_control(frame, frame_num, team_ball_control)
-            output_video_frames.append(frame)
-        
-        return output_video_frames
+        return [
+            draw_tracks(frame, frame_num, tracks, team_ball_control, shares=shares)
+            for frame_num, frame in enumerate(video_frames)
+        ]
 
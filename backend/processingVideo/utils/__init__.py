@@ -1,3 +1,4 @@
-from .video_utils import read_video, save_video
+from .video_utils import read_video, save_video, open_video_writer, video_fps
 from .bbox_utils import get_center_of_bbox, get_bbox_width, measure_distance, measure_xy_distance, get_foot_position
-from .draw_utils import draw_ellipse, draw_triangle, draw_team_ball_control
\ No newline at end of file
+from .draw_utils import draw_ellipse, draw_triangle, ball_control_shares, draw_team_ball_control, draw_tracks
+from .sprites import SPRITES, Sprite, SpriteCache
\ No newline at end of file
@@ -1,29 +1,36 @@
 from . import get_center_of_bbox, get_bbox_width
+from .sprites import SPRITES, color_key
 import numpy as np
 import cv2
 
 
-def draw_ellipse(frame, bbox, color, track_id=None):
-        y2 = int(bbox[3])
-
-        x_center, _ = get_center_of_bbox(bbox)
-        width = get_bbox_width(bbox)
+def _ellipse_sprite(width, color):
+    axes = (int(width), int(0.35 * width))
 
+    def paint(img, anchor, color_of):
         # Draw an ellipse on the frame to indicate the object's position
         cv2.ellipse(
-            frame, 
-            center=(x_center, y2),
-            axes=(int(width), int(0.35*width)),
+            img,
+            center=anchor,
+            axes=axes,
             angle=0.0,
             startAngle=-45,
             endAngle=235,
-            color=color,
+            color=color_of(color),
             thickness=2,
             lineType=cv2.LINE_4
         )
 
-        rectangle_width = 40
-        rectangle_height = 20
+    return SPRITES.get(("ellipse", axes, color_key(color)), paint, max(axes) + 4)
+
+
+def _label_sprite(track_id, color):
+    text = f"{track_id}"
+    rectangle_width = 40
+    rectangle_height = 20
+
+    def paint(img, anchor, color_of):
+        x_center, y2 = anchor
 
         # Calculate the rectangle coordinates centered above the ellipse
         x1_rect = x_center - rectangle_width // 2
@@ -31,54 +38,62 @@ def draw_ellipse(frame, bbox, color, track_id=None):
         y1_rect = (y2 - rectangle_height // 2) + 15
         y2_rect = (y2 + rectangle_height // 2) + 15
 
-        if track_id is not None: 
-            # Draw filled rectangle as background for the track ID
-            cv2.rectangle(frame,
-                          (int(x1_rect), int(y1_rect)),
-                          (int(x2_rect), int(y2_rect)),
-                          color,
-                          cv2.FILLED
-                          )
-            
-            x1_text = x1_rect + 6
-            if track_id > 99:
-                x1_text -= 10
-
-            # Draw the track ID number as text
-            cv2.putText(frame,
-                        f"{track_id}",
-                        (int(x1_text), int(y1_rect + 15)),
-                        cv2.FONT_HERSHEY_SIMPLEX,
-                        0.6,
-                        (0, 0, 0),
-                        2)
-
-        return frame
+        # Draw filled rectangle as background for the track ID
+        cv2.rectangle(img, (x1_rect, y1_rect), (x2_rect, y2_rect), color_of(color), cv2.FILLED)
 
+        x1_text = x1_rect + 6
+        if track_id > 99:
+            x1_text -= 10
 
-def draw_triangle(frame, bbox, color):
-        y = int(bbox[1])
-        x, _ = get_center_of_bbox(bbox)
+        # Draw the track ID number as text
+        cv2.putText(img, text, (x1_text, y1_rect + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color_of((0, 0, 0)), 2)
+
+    (text_width, _), _ = cv2.getTextSize(text, cv2.FONT_HERSHEY_SIMPLEX, 0.6, 2)
+    return SPRITES.get(
+        ("label", text, color_key(color)), paint, max(rectangle_width, text_width) + 32, fringe_color=(0, 0, 0)
+    )
 
+
+def _triangle_sprite(color):
+    def paint(img, anchor, color_of):
+        x, y = anchor
         triangle_points = np.array([
             [x, y],
             [x - 10, y - 20],
             [x + 10, y - 20]
         ])
 
-        cv2.drawContours(frame, [triangle_points], 0, color, cv2.FILLED)
-        cv2.drawContours(frame, [triangle_points], 0, (0, 0, 0), 2)
+        cv2.drawContours(img, [triangle_points], 0, color_of(color), cv2.FILLED)
+        cv2.drawContours(img, [triangle_points], 0, color_of((0, 0, 0)), 2)
+
+    return SPRITES.get(("triangle", color_key(color)), paint, 24)
 
-        return frame
 
+def ellipse_placements(bbox, color, track_id=None):
+    """(sprite, x, y) placements of draw_ellipse, for drawing many objects in one pass."""
+    y2 = int(bbox[3])
+    x_center, _ = get_center_of_bbox(bbox)
+    placements = [(_ellipse_sprite(get_bbox_width(bbox), color), x_center, y2)]
+    if track_id is not None:
+        placements.append((_label_sprite(track_id, color), x_center, y2))
+    return placements
 
-def draw_team_ball_control(frame, frame_num, team_ball_control):
 
-    overlay = frame.copy()
-    cv2.rectangle(overlay, (1350, 850), (1900, 970), (255, 255, 255), -1)
-    alpha = 0.4
-    cv2.addWeighted(overlay, alpha, frame, 1 - alpha, 0, frame)
+def triangle_placements(bbox, color):
+    x, _ = get_center_of_bbox(bbox)
+    return [(_triangle_sprite(color), x, int(bbox[1]))]
 
+
+def draw_ellipse(frame, bbox, color, track_id=None):
+    return SPRITES.draw_many(frame, ellipse_placements(bbox, color, track_id))
+
+
+def draw_triangle(frame, bbox, color):
+    return SPRITES.draw_many(frame, triangle_placements(bbox, color))
+
+
+def ball_control_shares(team_ball_control):
+    """(team 1, team 2) shares of the frames of the clip that either team had the ball."""
     vals = np.asarray(team_ball_control)
 
     team_1_num_frames = int((vals == 0).sum())
@@ -86,13 +101,76 @@ def draw_team_ball_control(frame, frame_num, team_ball_control):
     total = team_1_num_frames + team_2_num_frames
 
     if total == 0:
-        team_1 = 0.0
-        team_2 = 0.0
-    else:
-        team_1 = team_1_num_frames / total
-        team_2 = team_2_num_frames / total
+        return 0.0, 0.0
+    return team_1_num_frames / total, team_2_num_frames / total
+
+
+def draw_team_ball_control(frame, frame_num, team_ball_control, shares=None):
+    """
+    Ball control box of the whole clip. `shares` (ball_control_shares()) saves
+    counting the clip's list again on every frame.
+    """
+    # translucent white box; only its pixels change, so blend just that region
+    box = frame[850:971, 1350:1901]
+    if box.size:
+        overlay = np.full_like(box, 255)
+        alpha = 0.4
+        cv2.addWeighted(overlay, alpha, box, 1 - alpha, 0, box)
+
+    team_1, team_2 = shares if shares is not None else ball_control_shares(team_ball_control)
 
     cv2.putText(frame, f"Team 1 ball control: {team_1*100:.2f}%", (1400, 900), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
     cv2.putText(frame, f"Team 2 ball control: {team_2*100:.2f}%", (1400, 950), cv2.FONT_HERSHEY_SIMPLEX, 1, (0,0,0), 3)
 
     return frame
+
+
+def draw_tracks(frame, frame_num, tracks, team_ball_control, out=None, shares=None):
+    """
+    Detections overlay for a single frame: players, goalkeepers, referees, the
+    ball and the ball control box. `team_ball_control` is the per-frame list
+    returned by Tracker.assign_ball_possession, `shares` its
+    ball_control_shares() when the caller computed them once for the clip.
+    Draws on a copy of `frame`, made in `out` when a (reused) buffer is given.
+    """
+    if out is None:
+        frame = frame.copy()
+    else:
+        np.copyto(out, frame)
+        frame = out
+
+    player_dict = tracks['players'][frame_num]
+    goalkeeper_dict = tracks['goalkeepers'][frame_num]
+    referee_dict = tracks['referees'][frame_num]
+    ball_dict = tracks['ball'][frame_num]
+
+    # sprites are collected in drawing order and placed in one pass
+    placements = []
+
+    # --- 1) players ---
+    for track_id, player in player_dict.items():
+        color = player.get('team_color', (0, 0, 255))
+        placements += ellipse_placements(player['bbox'], color, track_id)
+
+        if player.get('has_ball', False):
+            placements += triangle_placements(player['bbox'], (0, 0, 255))
+
+    # --- 2) goalkeepers ---
+    for track_id, goalkeeper in goalkeeper_dict.items():
+        color = goalkeeper.get('team_color', (0, 0, 255))
+        placements += ellipse_placements(goalkeeper['bbox'], color, track_id)
+
+        if goalkeeper.get('has_ball', False):
+            placements += triangle_placements(goalkeeper['bbox'], (0, 0, 255))
+
+    # --- 3) referees ---
+    for track_id, referee in referee_dict.items():
+        placements += ellipse_placements(referee['bbox'], (0, 255, 255))
+
+    # --- 4) ball ---
+    for track_id, ball in ball_dict.items():
+        placements += triangle_placements(ball['bbox'], (0, 255, 0))
+
+    frame = SPRITES.draw_many(frame, placements)
+
+    return draw_team_ball_control(frame, frame_num, team_ball_control, shares)
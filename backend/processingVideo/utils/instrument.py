@@ -0,0 +1,182 @@
+"""
+Per-stage timing, throughput and memory of a pipeline run.
+
+Code marks its steps with span():
+
+    with span("detect", frames=len(frames)) as s:
+        ...
+        s["items"] = n_boxes
+
+which costs one context-variable lookup when nothing is recording. Inside
+`with recording(recorder):` (StageGraph.run opens one span per stage, and
+worker threads inherit the context) every span adds to the recorder:
+
+    wall_s        elapsed time
+    cpu_s         process CPU time over the span (includes concurrent stages)
+    frames, fps   frames handled and frames per wall second
+    items         what the step counts (boxes, crops, products ...)
+    peak_rss_mb   highest resident memory of the process seen during the span
+    calls         how often the span ran (per-block spans add up)
+
+Spans are named by their path ("track/detect"). Memory is sampled from a
+background thread; processes of the render pool are reported only as the
+largest child in the totals.
+"""
+import contextvars
+import os
+import resource
+import threading
+import time
+from contextlib import contextmanager
+
+_RECORDER = contextvars.ContextVar("pipeline_recorder", default=None)
+_PATH = contextvars.ContextVar("pipeline_span_path", default=())
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 2 ** 20 if hasattr(os, "sysconf") else 4096 / 2 ** 20
+
+
+def rss_mb() -> float:
+    """Resident memory of this process now (the lifetime peak where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Recorder:
+    def __init__(self, sample_interval: float = 0.02):
+        self.sample_interval = sample_interval
+        self.spans = {}  # path -> totals, in first-seen order
+        self._open = {}  # id -> peak rss of a running span
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+        self._started = None
+
+    # --- memory sampling -------------------------------------------------------
+
+    def _sample(self):
+        while not self._stop.wait(self.sample_interval):
+            rss = rss_mb()
+            with self._lock:
+                for key, peak in self._open.items():
+                    if rss > peak:
+                        self._open[key] = rss
+
+    def start(self):
+        if self._sampler is None:
+            if self._started is None:
+                self._started = (time.perf_counter(), time.process_time())
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample, name="rss-sampler", daemon=True)
+            self._sampler.start()
+        return self
+
+    def stop(self):
+        if self._sampler is not None:
+            self._stop.set()
+            self._sampler.join()
+            self._sampler = None
+
+    # --- spans -----------------------------------------------------------------
+
+    @contextmanager
+    def span(self, path: str, counts: dict):
+        key = object()
+        with self._lock:
+            self._open[key] = rss_mb()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            wall = time.perf_counter() - wall
+            cpu = time.process_time() - cpu
+            end_rss = rss_mb()
+            with self._lock:
+                peak = max(self._open.pop(key), end_rss)
+                total = self.spans.setdefault(path, {
+                    "name": path, "calls": 0, "wall_s": 0.0, "cpu_s": 0.0,
+                    "frames": 0, "items": 0, "peak_rss_mb": 0.0,
+                })
+                total["calls"] += 1
+                total["wall_s"] += wall
+                total["cpu_s"] += cpu
+                total["frames"] += int(counts.get("frames") or 0)
+                total["items"] += int(counts.get("items") or 0)
+                total["peak_rss_mb"] = max(total["peak_rss_mb"], peak)
+
+    def summary(self) -> dict:
+        """{"stages": [per span path], "totals": {...}} with rounded numbers, JSON-ready."""
+        stages = []
+        with self._lock:
+            for total in self.spans.values():
+                row = dict(total)
+                row["fps"] = round(row["frames"] / row["wall_s"], 2) if row["frames"] and row["wall_s"] > 0 else None
+                for name in ("wall_s", "cpu_s", "peak_rss_mb"):
+                    row[name] = round(row[name], 4 if name != "peak_rss_mb" else 1)
+                stages.append(row)
+
+        totals = {"peak_rss_mb": round(max((s["peak_rss_mb"] for s in stages), default=rss_mb()), 1)}
+        if self._started is not None:
+            totals["wall_s"] = round(time.perf_counter() - self._started[0], 4)
+            totals["cpu_s"] = round(time.process_time() - self._started[1], 4)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+        if children:
+            totals["children_peak_rss_mb"] = round(children / 1024.0, 1)
+        return {"stages": stages, "totals": totals}
+
+
+@contextmanager
+def recording(recorder: Recorder):
+    """Spans opened in this context (and the threads it starts) go to `recorder`."""
+    token = _RECORDER.set(recorder.start())
+    try:
+        yield recorder
+    finally:
+        _RECORDER.reset(token)
+        recorder.stop()
+
+
+@contextmanager
+def span(name: str, **counts):
+    """Times the block into the active recorder, if any; `counts` (frames, items) may be set inside."""
+    recorder = _RECORDER.get()
+    if recorder is None:
+        yield counts
+        return
+    path = _PATH.get() + (name,)
+    token = _PATH.set(path)
+    try:
+        with recorder.span("/".join(path), counts) as counts:
+            yield counts
+    finally:
+        _PATH.reset(token)
+
+
+def merge_summaries(summaries) -> dict:
+    """
+    One summary of several (the tasks of a job, each {"task": label, **summary}):
+    spans of the same name add up, peaks take the maximum, and every task's
+    totals are kept under "tasks".
+    """
+    stages, tasks = {}, []
+    for summary in summaries:
+        tasks.append({"task": summary.get("task"), **summary["totals"]})
+        for row in summary["stages"]:
+            total = stages.get(row["name"])
+            if total is None:
+                stages[row["name"]] = dict(row)
+                continue
+            for name in ("calls", "wall_s", "cpu_s", "frames", "items"):
+                total[name] += row[name]
+            total["peak_rss_mb"] = max(total["peak_rss_mb"], row["peak_rss_mb"])
+
+    for row in stages.values():
+        row["wall_s"], row["cpu_s"] = round(row["wall_s"], 4), round(row["cpu_s"], 4)
+        row["fps"] = round(row["frames"] / row["wall_s"], 2) if row["frames"] and row["wall_s"] > 0 else None
+    totals = {
+        "wall_s": round(sum(t.get("wall_s", 0.0) for t in tasks), 4),
+        "cpu_s": round(sum(t.get("cpu_s", 0.0) for t in tasks), 4),
+        "peak_rss_mb": max((t.get("peak_rss_mb", 0.0) for t in tasks), default=0.0),
+    }
+    return {"stages": list(stages.values()), "totals": totals, "tasks": tasks}
@@ -0,0 +1,158 @@
+"""
+Pre-rasterized drawing primitives.
+
+Markers, ellipses and track labels are drawn with integer coordinates, so
+OpenCV rasterizes them to the same pixels wherever they are placed. A Sprite
+holds one such drawing relative to its anchor point; SpriteCache rasterizes
+each distinct (shape, size, colour, label) once and later draws are masked
+copies into the frame. OpenCV clips shapes at the image border in its own
+way, so a sprite that would cross the border is drawn with cv2 instead.
+
+Text is anti-aliased by OpenCV: its edge pixels are blended with whatever is
+underneath as (bg * (255 - A) + color * A + 127) // 255, A being the coverage.
+Where the sprite's own shapes are underneath the result is stored as is;
+elsewhere (the "fringe") the coverage is kept and blended the same way at
+draw time, so the result is pixel-identical to calling cv2 directly.
+"""
+from typing import Callable, Hashable, Iterable, Tuple
+
+import cv2
+import numpy as np
+
+
+def _mask_color(color):
+    return 255
+
+
+def _same_color(color):
+    return color
+
+
+class Sprite:
+    __slots__ = ("image", "mask", "ox", "oy", "paint", "fringe", "fringe_alpha", "fringe_term")
+
+    # sprites closer than this to the border are drawn with cv2
+    MARGIN = 2
+
+    def __init__(self, image, mask, ox, oy, paint=None, fringe=None, fringe_alpha=None, fringe_term=None):
+        self.image = image               # (h, w, 3) uint8
+        self.mask = mask                 # (h, w) uint8, 1 where the sprite fully draws the pixel
+        self.ox = ox                     # anchor position inside the sprite
+        self.oy = oy
+        self.paint = paint               # the drawing itself, for placements across the border
+        self.fringe = fringe             # (h, w) bool, partly covered pixels (or None)
+        self.fringe_alpha = fringe_alpha # (k, 1) uint32, 255 - coverage of those pixels
+        self.fringe_term = fringe_term   # (k, 3) uint32, color * coverage + 127
+
+    @classmethod
+    def rasterize(cls, paint: Callable, extent: int, fringe_color=None) -> "Sprite":
+        """
+        paint(img, (x, y), color_of) draws around the anchor (x, y), passing
+        every colour through color_of; `extent` bounds the drawing's distance
+        from the anchor in pixels. `fringe_color` is the colour of the
+        anti-aliased text whose edges may fall outside the sprite's other shapes.
+        """
+        size = 2 * extent + 1
+        image = np.zeros((size, size, 3), dtype=np.uint8)
+        coverage = np.zeros((size, size), dtype=np.uint8)
+        paint(image, (extent, extent), _same_color)
+        paint(coverage, (extent, extent), _mask_color)
+
+        ys, xs = np.nonzero(coverage)
+        if ys.size == 0:
+            return cls(image[:0, :0], np.zeros((0, 0), dtype=np.uint8), 0, 0, paint)
+        y0, y1, x0, x1 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        image = np.ascontiguousarray(image[y0:y1, x0:x1])
+        coverage = coverage[y0:y1, x0:x1]
+        sprite = cls(image, (coverage == 255).astype(np.uint8), extent - x0, extent - y0, paint)
+
+        fringe = (coverage > 0) & (coverage < 255)
+        if fringe.any():
+            if fringe_color is None:
+                raise ValueError("sprite has partly covered pixels but no fringe_color")
+            a = coverage[fringe].astype(np.uint32)[:, None]
+            sprite.fringe = fringe
+            sprite.fringe_alpha = 255 - a
+            sprite.fringe_term = np.asarray(fringe_color, dtype=np.uint32) * a + 127
+        return sprite
+
+    def draw(self, frame: np.ndarray, x: int, y: int) -> None:
+        """Draws the sprite into `frame` with its anchor at (x, y)."""
+        h, w = self.mask.shape[:2]
+        if h == 0:
+            return
+        fx0, fy0 = x - self.ox, y - self.oy
+        m = self.MARGIN
+        if fx0 < m or fy0 < m or fx0 + w > frame.shape[1] - m or fy0 + h > frame.shape[0] - m:
+            if self.paint is not None:
+                self.paint(frame, (int(x), int(y)), _same_color)
+            return
+
+        region = frame[fy0:fy0 + h, fx0:fx0 + w]
+        cv2.copyTo(self.image, self.mask, region)
+
+        if self.fringe is not None:
+            bg = region[self.fringe].astype(np.uint32)
+            region[self.fringe] = (bg * self.fringe_alpha + self.fringe_term) // 255
+
+    def draw_points(self, frame: np.ndarray, points) -> None:
+        """Draws the sprite at every (x, y) of `points`, in order."""
+        for x, y in points:
+            self.draw(frame, x, y)
+
+
+class _Direct:
+    """Stand-in for a Sprite that draws with cv2 every time (SpriteCache.direct)."""
+    __slots__ = ("paint",)
+
+    def __init__(self, paint: Callable):
+        self.paint = paint
+
+    def draw(self, frame: np.ndarray, x: int, y: int) -> None:
+        self.paint(frame, (int(x), int(y)), _same_color)
+
+    def draw_points(self, frame: np.ndarray, points) -> None:
+        for x, y in points:
+            self.draw(frame, x, y)
+
+
+class SpriteCache:
+    """
+    Sprites by key; cleared when it grows past `max_items` (sizes vary with
+    the boxes). direct=True bypasses the cache and draws with cv2, as a
+    reference for tests and benchmarks.
+    """
+
+    def __init__(self, max_items: int = 4096, direct: bool = False):
+        self.max_items = max_items
+        self.direct = direct
+        self._sprites = {}
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key: Hashable, paint: Callable, extent: int, fringe_color=None) -> Sprite:
+        if self.direct:
+            return _Direct(paint)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self.stats["hits"] += 1
+            return sprite
+        self.stats["misses"] += 1
+        if len(self._sprites) >= self.max_items:
+            self._sprites.clear()
+        sprite = self._sprites[key] = Sprite.rasterize(paint, extent, fringe_color)
+        return sprite
+
+    @staticmethod
+    def draw_many(frame: np.ndarray, placements: Iterable[Tuple[Sprite, int, int]]) -> np.ndarray:
+        """Draws (sprite, x, y) placements in order (later ones on top)."""
+        for sprite, x, y in placements:
+            sprite.draw(frame, x, y)
+        return frame
+
+
+def color_key(color) -> tuple:
+    return tuple(float(c) for c in np.asarray(color, dtype=np.float64).ravel())
+
+
+# shared by the drawing helpers; every process has its own
+SPRITES = SpriteCache()
@@ -1,19 +1,34 @@
 import cv2
 
-def read_video(video_path):
+def read_video(video_path, start=0, stop=None):
+    # frames [start, stop) of the video, to the end when stop is None
     cap = cv2.VideoCapture(video_path)
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
     frames = []
-    while True:
+    while stop is None or start + len(frames) < stop:
         ret, frame = cap.read()
         if not ret:
             break
         frames.append(frame)
-    
+    cap.release()
+
     return frames
 
-def save_video(output_video_frames, output_video_path):
+def video_fps(video_path, default=24.0):
+    # frame rate from the container, `default` when it does not say
+    cap = cv2.VideoCapture(video_path)
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    return float(fps) if fps and fps > 0 else float(default)
+
+def open_video_writer(output_video_path, frame_shape, fps=24):
+    # streaming counterpart of save_video: same codec/fps, frames written one by one
     fourcc = cv2.VideoWriter_fourcc(*'XVID')
-    out = cv2.VideoWriter(output_video_path, fourcc, 24, (output_video_frames[0].shape[1], output_video_frames[0].shape[0]))
+    return cv2.VideoWriter(output_video_path, fourcc, fps, (frame_shape[1], frame_shape[0]))
+
+def save_video(output_video_frames, output_video_path):
+    out = open_video_writer(output_video_path, output_video_frames[0].shape)
     for frame in output_video_frames:
         out.write(frame)
     out.release()
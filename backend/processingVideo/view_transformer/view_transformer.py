@@ -1,16 +1,44 @@
-import numpy as np 
+import numpy as np
 import cv2
 
+
+def points_in_polygon(points, polygon):
+    """
+    Vectorized cv2.pointPolygonTest(polygon, p, False) >= 0 for (N, 2) points:
+    True inside the polygon or on its boundary.
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    polygon = np.asarray(polygon, dtype=np.float64).reshape(-1, 2)
+    x, y = points[:, 0:1], points[:, 1:2]                     # (N, 1)
+    x1, y1 = polygon[:, 0], polygon[:, 1]                     # (V,)
+    x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+
+    # on an edge: collinear with it and within its bounding box
+    cross = (x2 - x1) * (y - y1) - (y2 - y1) * (x - x1)
+    on_edge = (
+        (cross == 0)
+        & (x >= np.minimum(x1, x2)) & (x <= np.maximum(x1, x2))
+        & (y >= np.minimum(y1, y2)) & (y <= np.maximum(y1, y2))
+    ).any(axis=1)
+
+    # even-odd rule: count the edges crossing the horizontal ray to the right
+    straddles = (y1 > y) != (y2 > y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_cross = x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+    crossings = (straddles & (x < x_cross)).sum(axis=1)
+    return on_edge | (crossings % 2 == 1)
+
+
 class ViewTransformer():
     def __init__(self):
         court_width = 68
         court_length = 23.32
 
-        self.pixel_vertices = np.array([[110, 1035], 
-                               [265, 275], 
-                               [910, 260], 
+        self.pixel_vertices = np.array([[110, 1035],
+                               [265, 275],
+                               [910, 260],
                                [1640, 915]])
-        
+
         self.target_vertices = np.array([
             [0,court_width],
             [0, 0],
@@ -24,22 +52,62 @@ class ViewTransformer():
         self.persepctive_trasnformer = cv2.getPerspectiveTransform(self.pixel_vertices, self.target_vertices)
 
     def transform_point(self,point):
-        p = (int(point[0]),int(point[1]))
-        is_inside = cv2.pointPolygonTest(self.pixel_vertices,p,False) >= 0 
-        if not is_inside:
+        transformed = self.transform_points(np.asarray(point).reshape(1, 2))
+        if np.isnan(transformed[0, 0]):
             return None
+        return transformed
+
+    def transform_points(self, points):
+        """
+        Court coordinates of (N, 2) pixel positions in one pass; rows are NaN
+        for positions outside the court polygon (tested at integer pixels,
+        like transform_point).
+        """
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        out = np.full(points.shape, np.nan, dtype=np.float32)
+        if len(points) == 0:
+            return out
 
-        reshaped_point = point.reshape(-1,1,2).astype(np.float32)
-        tranform_point = cv2.perspectiveTransform(reshaped_point,self.persepctive_trasnformer)
-        return tranform_point.reshape(-1,2)
+        inside = points_in_polygon(np.trunc(points), self.pixel_vertices)
+        if inside.any():
+            projected = cv2.perspectiveTransform(points[inside].reshape(-1, 1, 2), self.persepctive_trasnformer)
+            out[inside] = projected.reshape(-1, 2)
+        return out
 
     def add_transformed_position_to_tracks(self,tracks):
+        """
+        Writes 'position_transformed' ([x, y] or None) into every track entry,
+        projecting every position of the clip at once. Returns the same data as
+        array columns: {object: {"frame": (M,), "track_id": (M,),
+        "position_transformed": (M, 2), NaN outside the court}}.
+        """
+        # 1) gather every position of the clip
+        entries, positions = [], []
         for object, object_tracks in tracks.items():
             for frame_num, track in enumerate(object_tracks):
                 for track_id, track_info in track.items():
-                    position = track_info['position_adjusted']
-                    position = np.array(position)
-                    position_trasnformed = self.transform_point(position)
-                    if position_trasnformed is not None:
-                        position_trasnformed = position_trasnformed.squeeze().tolist()
-                    tracks[object][frame_num][track_id]['position_transformed'] = position_trasnformed
\ No newline at end of file
+                    entries.append((object, frame_num, track_id))
+                    positions.append(track_info['position_adjusted'])
+
+        # 2) one point-in-polygon test and one projection for all of them
+        transformed = self.transform_points(np.array(positions, dtype=np.float32).reshape(-1, 2))
+
+        # 3) scatter back, and build the columns
+        valid = ~np.isnan(transformed[:, 0])
+        as_lists = transformed.tolist()
+        columns = {}
+        for row, (object, frame_num, track_id) in enumerate(entries):
+            tracks[object][frame_num][track_id]['position_transformed'] = as_lists[row] if valid[row] else None
+            column = columns.setdefault(object, {"rows": [], "frame": [], "track_id": []})
+            column["rows"].append(row)
+            column["frame"].append(frame_num)
+            column["track_id"].append(track_id)
+
+        return {
+            object: {
+                "frame": np.array(column["frame"], dtype=np.int64),
+                "track_id": np.array(column["track_id"]),
+                "position_transformed": transformed[column["rows"]],
+            }
+            for object, column in columns.items()
+        }